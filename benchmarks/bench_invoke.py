@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark of HmClient.invoke overhead with the network stubbed out,
+per JSON codec, with debug logging off / on (written to os.devnull) and with metrics on.
+
+Usage:
+    python benchmarks/bench_invoke.py [-n 20000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hmAutomator import _codec, logger, formatter, metrics
+from hmAutomator._client import HmClient
+
+
+class _StubSocket:
+    """Swallows requests and answers every recv with a canned reply."""
+    def __init__(self, reply: bytes):
+        self.reply = reply
+
+    def sendall(self, data: bytes):
+        pass
+
+    def recv(self, buff_size: int) -> bytes:
+        return self.reply
+
+
+class _BenchClient(HmClient):
+    # the stub socket answers synchronously, there is no reader thread to dispatch replies
+    MULTIPLEXED = False
+
+    def __init__(self, reply: bytes):
+        # skip HmClient.__init__, HdcWrapper needs a device
+        self.serial = "bench"
+        self.sock = _StubSocket(reply)
+        self._write_lock = threading.RLock()
+
+
+def make_client(reply: bytes) -> HmClient:
+    return _BenchClient(reply)
+
+
+def bench(client: HmClient, api: str, args: list, n: int) -> float:
+    invoke = client.invoke
+    start = time.perf_counter()
+    for _ in range(n):
+        invoke(api, args=args)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=20000)
+    opts = parser.parse_args()
+
+    devnull = logging.StreamHandler(open(os.devnull, "w"))
+    devnull.setFormatter(formatter)
+    logger.addHandler(devnull)
+
+    small = b'{"result":null}'
+    large = ('{"result":[%s]}' % ",".join(f'"Component#{i}"' for i in range(300))).encode()
+    cases = [
+        ("Driver.click", [630, 1360], small),
+        ("Driver.findComponents", ["On#1"], large),
+    ]
+
+    for name in ("json", "orjson", "ujson"):
+        try:
+            _codec.set_codec(name)
+        except ImportError:
+            print(f"{name:>8}: not installed")
+            continue
+        for api, args, reply in cases:
+            logger.setLevel(logging.WARNING)
+            off = bench(make_client(reply), api, args, opts.n)
+            logger.setLevel(logging.DEBUG)
+            on = bench(make_client(reply), api, args, opts.n)
+            logger.setLevel(logging.WARNING)
+            metrics.enable()
+            measured = bench(make_client(reply), api, args, opts.n)
+            metrics.enable(False)
+            print(f"{name:>8} {api:<24} log off {off:8.2f} us/invoke   log on {on:8.2f} us/invoke   "
+                  f"metrics on {measured:8.2f} us/invoke")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark cases of the host side hot paths, run by benchmarks/run.py.
+
+Every case is a setup function returning the zero argument callable that is timed. Fixtures:
+    docs/hierarchy.json       a real dumpLayout, repeated 20 times under one root (~1500 nodes,
+                              the size of a typical app page)
+    --frames <session.jsonl>  frames recorded with `hmAutomator.testing.record`, synthetic JPEG
+                              sized frames when not given
+"""
+
+import os
+import sys
+import copy
+import json
+import random
+import importlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from hmAutomator import _codec  # noqa: E402
+from hmAutomator.proto import HypiumResponse, Point  # noqa: E402
+from hmAutomator.utils import parse_bounds, split_jpeg_frames  # noqa: E402
+from hmAutomator.testing import Session, blank_frame  # noqa: E402
+
+HIERARCHY_PATH = os.path.join(ROOT, "docs", "hierarchy.json")
+HIERARCHY_COPIES = 20
+FRAME_SIZE = 150 * 1024
+FRAMES_PER_READ = 8
+
+# name -> (setup, modules required)
+CASES: Dict[str, Tuple[Callable[[], Callable[[], object]], Tuple[str, ...]]] = {}
+
+_options = {"frames": None}
+
+
+def case(name: str, requires: Tuple[str, ...] = ()):
+    def register(setup):
+        CASES[name] = (setup, requires)
+        return setup
+    return register
+
+
+def configure(frames: Optional[str] = None):
+    _options["frames"] = frames
+
+
+def missing(requires: Tuple[str, ...]) -> List[str]:
+    result = []
+    for module in requires:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            result.append(module)
+    return result
+
+
+def load_hierarchy() -> Dict:
+    with open(HIERARCHY_PATH, encoding="utf-8") as f:
+        page = json.load(f)
+    root = copy.deepcopy(page)
+    root["children"] = [copy.deepcopy(page) for _ in range(HIERARCHY_COPIES)]
+    return root
+
+
+def _iter_bounds(node: Dict):
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        bounds = current.get("attributes", {}).get("bounds")
+        if bounds:
+            yield bounds
+        stack.extend(current.get("children", []))
+
+
+def load_frames() -> List[bytes]:
+    if _options["frames"]:
+        frames = Session.load(_options["frames"]).frames
+        if frames:
+            return frames
+    rng = random.Random(0)
+    frames = []
+    for _ in range(FRAMES_PER_READ):
+        # entropy coded data never holds a bare 0xFF, like a real frame
+        body = rng.getrandbits(8 * FRAME_SIZE).to_bytes(FRAME_SIZE, "little").replace(b"\xff", b"\xfe")
+        header = blank_frame(1260, 2720)[:-2]
+        frames.append(header + body + b"\xff\xd9")
+    return frames
+
+
+def load_jpeg() -> bytes:
+    """A real, decodable 1260x2720 screen sized JPEG."""
+    if _options["frames"]:
+        frames = Session.load(_options["frames"]).frames
+        if frames:
+            return frames[-1]
+    import numpy as np
+    import cv2
+    rng = np.random.default_rng(0)
+    img = np.zeros((2720, 1260, 3), np.uint8)
+    for _ in range(40):
+        x, y = int(rng.integers(0, 1100)), int(rng.integers(0, 2600))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(img, (x, y), (x + 160, y + 120), color, -1)
+        cv2.putText(img, "hmAutomator", (x, y + 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    ok, data = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+    return data.tobytes()
+
+
+# -- hierarchy and selectors --
+
+@case("xpath.json2xml", requires=("lxml",))
+def _json2xml():
+    from hmAutomator._xpath import _XPath
+    hierarchy = load_hierarchy()
+    return lambda: _XPath._json2xml(hierarchy)
+
+
+@case("xpath.evaluate", requires=("lxml",))
+def _xpath_evaluate():
+    from hmAutomator._xpath import _XPath
+    xml = _XPath._json2xml(load_hierarchy())
+    return lambda: xml.xpath("//*[@text='showDialog']")
+
+
+@case("ctx.find_control.text")
+def _find_control_text():
+    from hmAutomator.ctx import hm_ctx
+    ctx, hierarchy = hm_ctx(None), load_hierarchy()
+    return lambda: ctx._find_control(data=hierarchy, text="showDialog")
+
+
+@case("ctx.find_control.regex")
+def _find_control_regex():
+    from hmAutomator.ctx import hm_ctx
+    ctx, hierarchy = hm_ctx(None), load_hierarchy()
+    return lambda: ctx._find_control(data=hierarchy, textMatches="^check.*2$")
+
+
+@case("hierarchy.snapshot_query")
+def _snapshot_query():
+    from hmAutomator._hierarchy import LayoutSnapshot
+    hierarchy = load_hierarchy()
+    return lambda: LayoutSnapshot(hierarchy).query(text="showDialog")
+
+
+@case("utils.parse_bounds")
+def _parse_bounds():
+    bounds = list(_iter_bounds(load_hierarchy()))
+
+    def run():
+        for value in bounds:
+            parse_bounds(value)
+    return run
+
+
+# -- capture stream --
+
+@case("frames.split")
+def _split_frames():
+    stream = b"".join(load_frames())
+    return lambda: split_jpeg_frames(bytearray(stream))
+
+
+@case("video_writer.frame", requires=("numpy", "cv2"))
+def _video_writer_frame():
+    from hmAutomator._image import resize_frame
+    data = load_jpeg()
+    # the recorder scales by 1 / 3.15 at quality 60
+    return lambda: resize_frame(data, (400, 863), 60)
+
+
+# -- gestures --
+
+class _StubDriver:
+    """Answers the PointerMatrix calls of a gesture without a device."""
+    def __init__(self):
+        self._client = self
+
+    def _to_abs_pos(self, x, y) -> Point:
+        return Point(int(x), int(y))
+
+    def invoke(self, api: str, this: Optional[str] = "Driver#0", args: List = []) -> HypiumResponse:
+        return HypiumResponse("PointerMatrix#0")
+
+
+@case("gesture.points")
+def _gesture_points():
+    from hmAutomator._gesture import _Gesture
+
+    def run():
+        gesture = _Gesture(_StubDriver())
+        gesture._add_step(100, 200, "start", 0.5)
+        gesture._add_step(600, 1800, "move", 1.5)
+        gesture._add_step(600, 1800, "pause", 1)
+        gesture._add_step(1000, 400, "move", 1.5)
+        total = gesture._calculate_total_points()
+        gesture._generate_points("PointerMatrix#0", total)
+    return run
+
+
+# -- RPC encode / decode --
+
+@case("invoke.encode")
+def _invoke_encode():
+    encode, next_id = _codec.encode_hypium, _codec.next_request_id
+    return lambda: encode("Driver.click", "Driver#0", [630, 1360], next_id())
+
+
+@case("invoke.decode")
+def _invoke_decode():
+    reply = b'{"result":[%s]}\n' % ",".join(f'"Component#{i}"' for i in range(300)).encode()
+
+    def run():
+        frames = _codec.FrameReader().feed(reply)
+        _codec.to_response(frames[0])
+    return run
+
+
+@case("invoke.roundtrip")
+def _invoke_roundtrip():
+    from bench_invoke import make_client
+    invoke = make_client(b'{"result":null}').invoke
+    return lambda: invoke("Driver.click", args=[630, 1360])
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Run the hot path benchmarks (benchmarks/cases.py) and compare them to the stored baselines.
+
+Baselines are machine specific: record them on the CI runner with --save, later runs fail
+(exit code 1) when a case gets slower than baseline * (1 + threshold).
+
+Usage:
+    python benchmarks/run.py                       # compare to benchmarks/baseline.json
+    python benchmarks/run.py --save                # (re)write the baselines
+    python benchmarks/run.py -k xpath -k frames    # only the cases whose name contains one of these
+    python benchmarks/run.py --frames login.session.jsonl --threshold 0.2 --json result.json
+"""
+
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cases  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+THRESHOLD = 0.3
+REPEAT = 5
+MIN_TIME = 0.2  # seconds of one repeat
+
+
+def measure(func, repeat: int = REPEAT, min_time: float = MIN_TIME) -> float:
+    """Best of `repeat` runs, in microseconds per call."""
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+    best = elapsed
+    for _ in range(repeat - 1):
+        best = min(best, timer.timeit(number))
+    return best / number * 1e6
+
+
+def load_baseline(path: str) -> Dict:
+    if not os.path.isfile(path):
+        return {"cases": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def machine() -> Dict[str, str]:
+    return {"python": platform.python_version(), "machine": platform.machine(),
+            "system": platform.system(), "processor": platform.processor()}
+
+
+def run(selected: List[str], baseline: Dict, threshold: float) -> List[Dict]:
+    results = []
+    for name in selected:
+        setup, requires = cases.CASES[name]
+        missing = cases.missing(requires)
+        if missing:
+            results.append({"name": name, "status": "skipped", "reason": f"{', '.join(missing)} not installed"})
+            continue
+        us = measure(setup())
+        base = baseline["cases"].get(name)
+        result = {"name": name, "us": us, "baseline": base}
+        if base is None:
+            result["status"] = "new"
+        else:
+            result["ratio"] = us / base
+            result["status"] = "regressed" if us > base * (1 + threshold) else "ok"
+        results.append(result)
+        print(format_result(result), flush=True)
+    return results
+
+
+def format_result(result: Dict) -> str:
+    if result["status"] == "skipped":
+        return f"{result['name']:<28} {'skipped':>12}   {result['reason']}"
+    line = f"{result['name']:<28} {result['us']:>10.2f}us"
+    if result.get("baseline") is not None:
+        line += f"   baseline {result['baseline']:>10.2f}us   {result['ratio'] - 1:+7.1%}"
+    return f"{line}   {result['status']}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="keywords", action="append", default=[], help="only run cases containing this")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="allowed relative slowdown before failing, default %(default)s")
+    parser.add_argument("--save", action="store_true", help="write the measured times as the new baselines")
+    parser.add_argument("--frames", help="session file with recorded capture frames")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    opts = parser.parse_args(argv)
+
+    cases.configure(frames=opts.frames)
+    selected = [name for name in cases.CASES if not opts.keywords or any(k in name for k in opts.keywords)]
+    baseline = load_baseline(opts.baseline)
+    results = run(selected, baseline, opts.threshold)
+    for result in results:
+        if result["status"] == "skipped":
+            print(format_result(result))
+
+    if opts.json_path:
+        with open(opts.json_path, "w", encoding="utf-8") as f:
+            json.dump({"machine": machine(), "time": time.time(), "results": results}, f, indent=2)
+
+    if opts.save:
+        measured = {r["name"]: round(r["us"], 3) for r in results if "us" in r}
+        baseline["cases"].update(measured)
+        baseline["machine"] = machine()
+        with open(opts.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved {len(measured)} baselines to {opts.baseline}")
+        return 0
+
+    regressed = [r["name"] for r in results if r["status"] == "regressed"]
+    if regressed:
+        print(f"FAILED: {len(regressed)} case(s) slower than baseline +{opts.threshold:.0%}: {', '.join(regressed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
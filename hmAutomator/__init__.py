@@ -1,19 +1,69 @@
 # -*- coding: utf-8 -*-
 
+import os
 import logging
+from typing import Union
 
 formatter = logging.Formatter('[%(asctime)s] %(filename)15s[line:%(lineno)4d] \
                               [%(levelname)s] %(message)s',
                               datefmt='%Y-%m-%d %H:%M:%S')
 
 logger = logging.getLogger('hmdriver2')
-logger.setLevel(logging.DEBUG)
+# Library default: no output unless the application configures logging or calls enable_logging().
+logger.addHandler(logging.NullHandler())
 
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-console_handler.setFormatter(formatter)
+# Max characters of a RPC/hdc payload written to the debug log, None for no limit.
+payload_limit: Union[int, None] = 512
 
-logger.addHandler(console_handler)
+_console_handler: Union[logging.Handler, None] = None
 
 
-__all__ = ['logger']
+def set_log_level(level: Union[int, str]):
+    logger.setLevel(level)
+
+
+def enable_logging(level: Union[int, str] = logging.DEBUG, limit: Union[int, None] = 512):
+    """
+    Print the hmAutomator log to the console.
+
+    Args:
+        level: Log level, e.g. logging.DEBUG or "INFO".
+        limit: Max characters of a payload (sendMsg/recvMsg/hdc output) in the log, None for no limit.
+    """
+    global _console_handler, payload_limit
+    payload_limit = limit
+    if _console_handler is None:
+        _console_handler = logging.StreamHandler()
+        _console_handler.setFormatter(formatter)
+        logger.addHandler(_console_handler)
+    _console_handler.setLevel(level)
+    logger.setLevel(level)
+
+
+class _Payload:
+    """Formats a (possibly huge) payload only when the log record is actually emitted."""
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self) -> str:
+        data = self.data
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode('utf-8', errors='replace')
+        else:
+            data = str(data)
+        if payload_limit is not None and len(data) > payload_limit:
+            return f"{data[:payload_limit]}...<{len(data) - payload_limit} more chars>"
+        return data
+
+
+def payload(data) -> _Payload:
+    return _Payload(data)
+
+
+if os.getenv("HMAT_LOG_LEVEL"):
+    enable_logging(os.getenv("HMAT_LOG_LEVEL").upper())
+
+
+__all__ = ['logger', 'set_log_level', 'enable_logging']
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+"""
+Command line entry point:
+
+    python -m hmAutomator doctor [--serial X] [--json]
+"""
+
+import sys
+from typing import List, Optional
+
+
+def _doctor(argv: List[str]) -> int:
+    from .doctor import main as doctor_main
+    return doctor_main(argv)
+
+
+COMMANDS = {"doctor": _doctor}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] not in COMMANDS:
+        print(f"usage: python -m hmAutomator {{{','.join(COMMANDS)}}} [options]", file=sys.stderr)
+        return 0 if argv[:1] in (["-h"], ["--help"]) else 2
+    return COMMANDS[argv[0]](argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import math
+import time
+from typing import TYPE_CHECKING, List, Tuple, Union
+
+from . import logger, trace
+from .proto import ActionReport
+from ._client import SOCKET_TIMEOUT
+
+if TYPE_CHECKING:
+    from .driver import Driver
+    from .proto import KeyCode
+
+
+# settle policy: wait until the UI has been idle this long (ms), at most IDLE_TIMEOUT (ms), on the device
+IDLE = "idle"
+IDLE_TIME = 300
+IDLE_TIMEOUT = 3000
+
+# seconds uitest holds a long click
+LONG_CLICK_TIME = 1.5
+
+Settle = Union[float, str, None]
+
+
+class _Step:
+    __slots__ = ("desc", "calls", "settle", "duration")
+
+    def __init__(self, desc: str, calls: List[Tuple[str, str, List]], settle: Settle, duration: float = 0):
+        self.desc = desc
+        self.calls = calls
+        self.settle = settle
+        self.duration = duration  # seconds the calls run on the device, not counting the settle
+
+
+class ActionScript:
+    """
+    A sequence of UI actions executed in as few uitest round trips as possible.
+
+    d.actions().click(0.5, 0.2).input_text("hello").click(0.9, 0.9).key(KeyCode.BACK).run()
+
+    Coordinates are validated and converted with `Driver._to_abs_pos` while the script is built, so a bad
+    argument fails before anything is sent. Steps are pipelined (`HmClient.invoke_many`); after a step:
+        settle=None or 0    no wait, the next step is sent in the same round trip
+        settle=IDLE         Driver.waitForIdle runs on the device, still in the same round trip
+        settle=<seconds>    the round trip ends and the host sleeps, like `@delay` does for single calls
+    """
+    def __init__(self, d: "Driver", settle: Settle = None):
+        self._d = d
+        self._settle = settle
+        self._steps: List[_Step] = []
+
+    def _add(self, desc: str, calls: List[Tuple[str, str, List]], settle: Settle,
+             duration: float = 0) -> "ActionScript":
+        settle = self._settle if settle is None else settle
+        if not (settle is None or settle == IDLE or (isinstance(settle, (int, float)) and settle >= 0)):
+            raise ValueError(f"Invalid settle policy: {settle!r}")
+        self._steps.append(_Step(desc, calls, settle, duration))
+        return self
+
+    def click(self, x: Union[int, float], y: Union[int, float], settle: Settle = None) -> "ActionScript":
+        point = self._d._to_abs_pos(x, y)
+        return self._add(f"click({point.x}, {point.y})", [("Driver.click", "Driver#0", [point.x, point.y])], settle)
+
+    def double_click(self, x: Union[int, float], y: Union[int, float], settle: Settle = None) -> "ActionScript":
+        point = self._d._to_abs_pos(x, y)
+        return self._add(f"double_click({point.x}, {point.y})",
+                         [("Driver.doubleClick", "Driver#0", [point.x, point.y])], settle)
+
+    def long_click(self, x: Union[int, float], y: Union[int, float], settle: Settle = None) -> "ActionScript":
+        point = self._d._to_abs_pos(x, y)
+        return self._add(f"long_click({point.x}, {point.y})",
+                         [("Driver.longClick", "Driver#0", [point.x, point.y])], settle, LONG_CLICK_TIME)
+
+    def swipe(self, x1, y1, x2, y2, speed: int = 2000, settle: Settle = None) -> "ActionScript":
+        point1 = self._d._to_abs_pos(x1, y1)
+        point2 = self._d._to_abs_pos(x2, y2)
+        if speed < 200 or speed > 40000:
+            speed = 2000
+        duration = math.hypot(point2.x - point1.x, point2.y - point1.y) / speed
+        return self._add(f"swipe({point1.x}, {point1.y}, {point2.x}, {point2.y})",
+                         [("Driver.swipe", "Driver#0", [point1.x, point1.y, point2.x, point2.y, speed])],
+                         settle, duration)
+
+    def input_text(self, text: str, settle: Settle = None) -> "ActionScript":
+        if not isinstance(text, str):
+            raise TypeError(f"text must be str, got {type(text).__name__}")
+        return self._add(f"input_text({text!r})", [("Driver.inputText", "Driver#0", [{"x": 1, "y": 1}, text])], settle)
+
+    def key(self, key_code: Union["KeyCode", int], settle: Settle = None) -> "ActionScript":
+        from .proto import KeyCode
+        code = key_code.value if isinstance(key_code, KeyCode) else int(key_code)
+        return self._add(f"key({code})", [("Driver.triggerKey", "Driver#0", [code])], settle)
+
+    def sleep(self, seconds: float) -> "ActionScript":
+        return self._add(f"sleep({seconds})", [], seconds)
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    def _batches(self) -> List[Tuple[List[_Step], float]]:
+        """Group the steps into round trips, each followed by a host side sleep."""
+        batches, current = [], []
+        for step in self._steps:
+            current.append(step)
+            if isinstance(step.settle, (int, float)) and step.settle > 0:
+                batches.append((current, float(step.settle)))
+                current = []
+        if current:
+            batches.append((current, 0.0))
+        return batches
+
+    def run(self) -> ActionReport:
+        """
+        Execute the script.
+
+        Returns:
+            ActionReport: Timing of the whole sequence.
+
+        Raises:
+            InvokeHypiumError: A step failed on the device, the steps after it in the same round trip were still executed.
+        """
+        steps, step_times, round_trips = [], [], 0
+        start = time.time()
+        for batch, sleep_time in self._batches():
+            calls, duration = [], 0.0
+            for step in batch:
+                calls.extend(step.calls)
+                duration += step.duration
+                if step.settle == IDLE:
+                    calls.append(("Driver.waitForIdle", "Driver#0", [IDLE_TIME, IDLE_TIMEOUT]))
+                    duration += IDLE_TIMEOUT / 1000
+            if calls:
+                # the replies come back only once the device has run the whole batch
+                self._d._client.invoke_many(calls, timeout=SOCKET_TIMEOUT + duration)
+                round_trips += 1
+            done = time.time() - start
+            for step in batch:
+                steps.append(step.desc)
+                step_times.append(done)
+            if sleep_time:
+                with trace.span("settle", "settle", serial=getattr(self._d, "serial", None), seconds=sleep_time):
+                    time.sleep(sleep_time)
+        report = ActionReport(steps, step_times, round_trips, time.time() - start)
+        logger.debug(f"action script: {report}")
+        return report
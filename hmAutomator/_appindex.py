@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import json
+import weakref
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import logger
+from .hdc import HdcWrapper
+from .proto import CommandResult
+
+
+def read_hap_info(hap_path: str) -> Dict:
+    """
+    Read the `app` section of module.json inside a HAP, e.g. {"bundleName": ..., "versionCode": ...}.
+    Returns an empty dict if the file is not a readable HAP.
+    """
+    import zipfile  # only needed when installing, keep it off the import path
+
+    try:
+        with zipfile.ZipFile(hap_path) as hap:
+            with hap.open("module.json") as f:
+                return json.load(f).get("app", {})
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        logger.debug(f"Fail to read module.json of {hap_path}: {e}")
+        return {}
+
+
+def parse_app_info(output: str) -> Dict:
+    """Extract the JSON document from the output of `bm dump -n <bundle>`."""
+    app_info = {}
+    try:
+        json_start = output.find("{")
+        json_end = output.rfind("}") + 1
+        json_output = output[json_start:json_end]
+
+        app_info = json.loads(json_output)
+    except Exception as e:
+        logger.error(f"An error occurred:{e}")
+    return app_info
+
+
+def parse_abilities(app_info: Dict) -> List[Dict]:
+    """List the abilities described by an app info dict, see `Driver.get_app_abilities`."""
+    result = []
+    hap_module_infos = app_info.get("hapModuleInfos") or []
+    main_entry = app_info.get("mainEntry")
+    for hap_module_info in hap_module_infos:
+        # 尝试读取moduleInfo
+        try:
+            ability_infos = hap_module_info.get("abilityInfos")
+            module_main = hap_module_info["mainAbility"]
+        except Exception as e:
+            logger.warning(f"Fail to parse moduleInfo item, {repr(e)}")
+            continue
+        # 尝试读取abilityInfo
+        for ability_info in ability_infos:
+            try:
+                is_launcher_ability = False
+                skills = ability_info['skills']
+                if len(skills) > 0 or "action.system.home" in skills[0]["actions"]:
+                    is_launcher_ability = True
+                icon_ability_info = {
+                    "name": ability_info["name"],
+                    "moduleName": ability_info["moduleName"],
+                    "moduleMainAbility": module_main,
+                    "mainModule": main_entry,
+                    "isLauncherAbility": is_launcher_ability
+                }
+                result.append(icon_ability_info)
+            except Exception as e:
+                logger.warning(f"Fail to parse ability_info item, {repr(e)}")
+                continue
+    logger.debug(f"all abilities: {result}")
+    return result
+
+
+def pick_main_ability(abilities: List[Dict]) -> Dict:
+    """Score abilities and return the most likely entry, see `Driver.get_app_main_ability`."""
+    if not abilities:
+        return {}
+    for item in abilities:
+        score = 0
+        if (name := item["name"]) and name == item["moduleMainAbility"]:
+            score += 1
+        if (module_name := item["moduleName"]) and module_name == item["mainModule"]:
+            score += 1
+        item["score"] = score
+    abilities.sort(key=lambda x: (not x["isLauncherAbility"], -x["score"]))
+    logger.debug(f"main ability: {abilities[0]}")
+    return abilities[0]
+
+
+# every live AppIndex, so installs that bypass the driver (e.g. `distribute.install_many`) can invalidate them
+_indexes: "weakref.WeakSet[AppIndex]" = weakref.WeakSet()
+
+
+def invalidate_device(serial: str, bundle_name: Optional[str] = None):
+    """Invalidate the indexes of a device, see `AppIndex.invalidate`."""
+    for index in list(_indexes):
+        if index.hdc.serial == serial:
+            index.invalidate(bundle_name)
+
+
+class AppIndex:
+    """
+    Per-device index of installed apps.
+
+    The bundle list comes from one `bm dump -a` and answers `has_app` by set membership. App infos are
+    dumped lazily per bundle, and main abilities are resolved once per (bundle, versionCode).
+    The index is invalidated by install/uninstall through the driver and by `distribute.install_many`;
+    call `invalidate` after changing apps behind its back.
+    """
+    def __init__(self, hdc: HdcWrapper):
+        self.hdc = hdc
+        self._lock = threading.RLock()
+        self._bundles: Optional[Set[str]] = None
+        self._infos: Dict[str, Dict] = {}
+        self._main_abilities: Dict[Tuple[str, int], Dict] = {}
+        _indexes.add(self)
+
+    def bundles(self, refresh: bool = False) -> Set[str]:
+        with self._lock:
+            if self._bundles is None or refresh:
+                output = self.hdc.shell("bm dump -a").output
+                # output: "ID: 100:\n\tcom.example.a\n\tcom.example.b"
+                self._bundles = {line.strip() for line in output.splitlines()
+                                 if line.strip() and not line.strip().endswith(":")}
+            return self._bundles
+
+    def has_app(self, bundle_name: str) -> bool:
+        return bundle_name in self.bundles()
+
+    def app_info(self, bundle_name: str, refresh: bool = False) -> Dict:
+        """The `bm dump -n` info of a bundle, a copy callers may change."""
+        return copy.deepcopy(self._app_info(bundle_name, refresh))
+
+    def _app_info(self, bundle_name: str, refresh: bool = False) -> Dict:
+        with self._lock:
+            if bundle_name not in self._infos or refresh:
+                data: CommandResult = self.hdc.shell(f"bm dump -n {bundle_name}")
+                info = parse_app_info(data.output)
+                if not info:
+                    return info  # do not cache failures
+                self._infos[bundle_name] = info
+            return self._infos[bundle_name]
+
+    def main_ability(self, bundle_name: str) -> Dict:
+        with self._lock:
+            info = self._app_info(bundle_name)
+            version = info.get("versionCode") or info.get("applicationInfo", {}).get("versionCode", 0)
+            key = (bundle_name, version)
+            if key not in self._main_abilities:
+                ability = pick_main_ability(parse_abilities(info))
+                if not ability:
+                    return {}
+                self._main_abilities[key] = ability
+            return dict(self._main_abilities[key])
+
+    def invalidate(self, bundle_name: Optional[str] = None):
+        """Forget one bundle, or everything if `bundle_name` is None."""
+        with self._lock:
+            self._bundles = None
+            if bundle_name is None:
+                self._infos.clear()
+                self._main_abilities.clear()
+                return
+            self._infos.pop(bundle_name, None)
+            for key in [k for k in self._main_abilities if k[0] == bundle_name]:
+                del self._main_abilities[key]
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import asyncio
+import logging
+import shlex
+import typing
+from collections import deque
+from typing import Optional, List
+
+from . import logger, payload, metrics
+from . import _codec, _runner
+from .utils import port_allocator
+from .hdc import _build_hdc_prefix, _md5sum_command, _parse_md5sums
+from .proto import CommandResult, HypiumResponse
+from .exception import HdcError, DeviceNotFoundError, InvokeHypiumError, InvokeCaptures, RpcConnectionError
+from ._client import UITEST_SERVICE_PORT, SOCKET_TIMEOUT, _UITestService
+
+
+async def _acquire(slot, until: Optional[float]) -> bool:
+    """Take a `_runner` concurrency slot without blocking the event loop; slots are shared with sync callers."""
+    while not slot.acquire(blocking=False):
+        left = _runner.remaining(until)
+        if left == 0:
+            return False
+        await asyncio.sleep(0.01 if left is None else min(0.01, left))
+    return True
+
+
+async def _execute_command(cmdargs: typing.Union[str, List[str]],
+                           timeout: Optional[float] = _runner.DEFAULT_TIMEOUT) -> CommandResult:
+    """
+    asyncio counterpart of `hdc._execute_command`: runs the hdc binary without a shell, with the deadline,
+    process group kill and per-server concurrency limit of `_runner.run`.
+    """
+    if isinstance(cmdargs, str):
+        cmdargs = shlex.split(cmdargs)
+    until = _runner.deadline(timeout)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s", payload(' '.join(map(shlex.quote, cmdargs))))
+    slot = _runner.slot_of(cmdargs)
+    if slot is not None and not await _acquire(slot, until):
+        metrics.incr("hdc.timeouts")
+        return CommandResult("", f"no free hdc slot within {timeout}s", -1)
+    try:
+        try:
+            process = await asyncio.create_subprocess_exec(*cmdargs,
+                                                           stdin=asyncio.subprocess.DEVNULL,
+                                                           stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.PIPE,
+                                                           **_runner.session_kwargs())
+        except OSError as e:
+            return CommandResult("", str(e), -1)
+        try:
+            output, error = await asyncio.wait_for(process.communicate(), _runner.remaining(until))
+        except asyncio.TimeoutError:
+            _runner.kill_group(process)
+            await process.wait()
+            metrics.incr("hdc.timeouts")
+            return CommandResult("", f"timed out after {timeout}s", -1)
+        output = output.decode("utf-8", errors="replace")
+        error = error.decode("utf-8", errors="replace")
+        exit_code = process.returncode
+
+        if 'error:' in output.lower() or '[fail]' in output.lower():
+            return CommandResult("", output, -1)
+
+        return CommandResult(output, error, exit_code)
+    finally:
+        if slot is not None:
+            slot.release()
+
+
+async def list_devices() -> List[str]:
+    devices = []
+    result = await _execute_command(shlex.split(_build_hdc_prefix()) + ["list", "targets"])
+    if result.exit_code == 0 and result.output:
+        for line in result.output.strip().split('\n'):
+            if line.__contains__('Empty'):
+                continue
+            devices.append(line.strip())
+
+    if result.exit_code != 0:
+        raise HdcError("HDC error", result.error)
+
+    return devices
+
+
+class AsyncHdcWrapper:
+    """The subset of HdcWrapper needed to bring up and drive a uitest session from an event loop."""
+    def __init__(self, serial: str) -> None:
+        self.serial = serial
+        self.hdc_prefix: List[str] = shlex.split(_build_hdc_prefix())
+
+    def _args(self, *args) -> List[str]:
+        return self.hdc_prefix + ["-t", self.serial] + list(args)
+
+    async def is_online(self) -> bool:
+        return self.serial in await list_devices()
+
+    async def forward_port(self, rport: int) -> int:
+        """
+        Forward a local port to `rport` on the device.
+        An existing forward of this device to `rport` is reused instead of creating a new one.
+        """
+        for lport, _rport in await self._list_forwards():
+            if _rport == rport:
+                logger.debug(f"Reuse fport tcp:{lport} tcp:{rport}")
+                return port_allocator.acquire(lport)
+
+        error = ""
+        for _ in range(3):
+            # another process may grab the port between allocation and `fport`, so retry with a new one
+            lport: int = port_allocator.allocate()
+            result = await _execute_command(self._args("fport", f"tcp:{lport}", f"tcp:{rport}"))
+            if result.exit_code == 0:
+                return lport
+            port_allocator.release(lport)
+            error = result.error
+        raise HdcError("HDC forward port error", error)
+
+    async def _list_forwards(self) -> List[typing.Tuple[int, int]]:
+        """Forwards of this device as (local port, remote port), see `HdcWrapper._list_forwards`."""
+        result = await _execute_command(self._args("fport", "ls"))
+        if result.exit_code != 0:
+            return []
+        forwards = []
+        for line in result.output.splitlines():
+            match = re.search(r"tcp:(\d+) tcp:(\d+)", line)
+            if match and self.serial in line and "reverse" not in line.lower():
+                forwards.append((int(match.group(1)), int(match.group(2))))
+        return forwards
+
+    async def release_forward(self, lport: int, rport: int):
+        """Drop the lease taken by `forward_port`, the forward is removed once nobody in this process uses it."""
+        if port_allocator.release(lport):
+            await self.rm_forward(lport, rport)
+
+    async def rm_forward(self, lport: int, rport: int) -> int:
+        result = await _execute_command(self._args("fport", "rm", f"tcp:{lport}", f"tcp:{rport}"))
+        if result.exit_code != 0:
+            raise HdcError("HDC rm forward error", result.error)
+        return lport
+
+    async def send_file(self, lpath: str, rpath: str, timeout: Optional[float] = None) -> CommandResult:
+        result = await _execute_command(self._args("file", "send", os.path.expanduser(lpath), rpath), timeout)
+        if result.exit_code != 0:
+            raise HdcError("HDC send file error", result.error)
+        return result
+
+    async def recv_file(self, rpath: str, lpath: str, timeout: Optional[float] = None) -> CommandResult:
+        result = await _execute_command(self._args("file", "recv", rpath, os.path.expanduser(lpath)), timeout)
+        if result.exit_code != 0:
+            raise HdcError("HDC receive file error", result.error)
+        return result
+
+    async def shell(self, cmd: str, error_raise=True,
+                    timeout: Optional[float] = _runner.DEFAULT_TIMEOUT) -> CommandResult:
+        result = await _execute_command(self._args("shell", cmd), timeout)
+        if result.exit_code != 0 and error_raise:
+            raise HdcError("HDC shell error", f"{cmd}\n{result.output}\n{result.error}")
+        return result
+
+
+class _AsyncUITestService:
+    """asyncio counterpart of `_client._UITestService`."""
+    def __init__(self, hdc: AsyncHdcWrapper):
+        self.hdc = hdc
+
+    async def init(self):
+        logger.debug("Initializing UITest service")
+        local_path = _UITestService._get_local_agent_path()
+        remote_path = "/data/local/tmp/agent.so"
+
+        await self._kill_uitest_service()
+        await self._setup_device_agent(local_path, remote_path)
+        await self.hdc.shell("uitest start-daemon singleness")
+        logger.debug("Started UITest daemon")
+        await asyncio.sleep(0.5)
+
+    async def _setup_device_agent(self, local_path: str, remote_path: str):
+        output = (await self.hdc.shell(_md5sum_command([remote_path]), error_raise=False)).output
+        if _UITestService._agent_is_current(local_path, _parse_md5sums(output).get(remote_path)):
+            logger.debug("Remote agent file is up-to-date")
+        else:
+            await self.hdc.shell(f"rm -f {remote_path}")
+            await self.hdc.send_file(local_path, remote_path)
+            logger.debug("Updated remote agent file")
+        await self.hdc.shell(f"chmod +x {remote_path}")
+
+    async def _kill_uitest_service(self):
+        result = (await self.hdc.shell("ps -ef")).output.strip()
+        for line in result.splitlines():
+            if 'uitest start-daemon singleness' not in line:
+                continue
+            pid = line.split()[1]
+            await self.hdc.shell(f"kill -9 {pid}")
+            logger.debug(f"Killed uitest process with PID {pid}")
+
+
+class AsyncHmClient:
+    """
+    harmony uitest client on asyncio streams.
+
+    Many calls can be in flight on the one connection. Replies are matched to requests by
+    `request_id` when the daemon echoes it, otherwise in send order (uitest answers in order).
+    """
+    def __init__(self, serial: str):
+        self.serial = serial
+        self.hdc = AsyncHdcWrapper(serial)
+        self.local_port: Optional[int] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: typing.Deque[typing.Tuple[str, asyncio.Future]] = deque()
+        self._write_lock: Optional[asyncio.Lock] = None
+        # why the stream is unusable, set when the reader fails; cleared by `connect`
+        self._error: Optional[RpcConnectionError] = None
+
+    async def start(self):
+        logger.info("Start AsyncHmClient connection")
+        if not await self.hdc.is_online():
+            raise DeviceNotFoundError(f"Device [{self.serial}] not found")
+        await _AsyncUITestService(self.hdc).init()
+        await self.connect()
+        await self.invoke("Driver.create")
+
+    async def connect(self):
+        """Forward the uitest port and open the stream, without touching the daemon."""
+        if self.local_port is None:
+            self.local_port = await self.hdc.forward_port(UITEST_SERVICE_PORT)
+        if self._writer is not None:
+            self._writer.close()
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection("127.0.0.1", self.local_port), SOCKET_TIMEOUT)
+        self._write_lock = asyncio.Lock()  # created here so it binds to the running loop on py3.8/3.9
+        self._error = None
+        self._reader_task = asyncio.ensure_future(self._read_loop())
+
+    async def release(self):
+        logger.info(f"Release {self.__class__.__name__} connection")
+        if self._reader_task:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        self._fail_pending(RpcConnectionError("AsyncHmClient released"))
+        if self.local_port is not None:
+            try:
+                await self.hdc.release_forward(self.local_port, UITEST_SERVICE_PORT)
+            except HdcError as e:
+                logger.debug(f"Ignore fport rm error: {e}")
+            self.local_port = None
+
+    async def __aenter__(self) -> "AsyncHmClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.release()
+
+    def _fail_pending(self, exc: Exception):
+        while self._pending:
+            _, future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(exc)
+
+    def _dispatch(self, reply: typing.Dict):
+        future = None
+        request_id = reply.get("request_id") if isinstance(reply, dict) else None
+        if request_id is not None:
+            for item in self._pending:
+                if item[0] == request_id:
+                    self._pending.remove(item)
+                    future = item[1]
+                    break
+        if future is None:
+            if not self._pending:
+                logger.warning(f"Drop unsolicited uitest reply: {reply}")
+                return
+            _, future = self._pending.popleft()
+        if not future.done():
+            future.set_result(reply)
+
+    async def _read_loop(self):
+        reader = _codec.FrameReader()
+        try:
+            while True:
+                chunk = await self._reader.read(65536)
+                if not chunk:
+                    raise RpcConnectionError("uitest connection closed by peer")
+                for reply in reader.feed(chunk):
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("recvMsg: %s", payload(reply))
+                    self._dispatch(reply)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._error = e if isinstance(e, RpcConnectionError) else RpcConnectionError(repr(e))
+            self._fail_pending(self._error)
+
+    async def _request(self, request_id: str, data: bytes, timeout: float) -> typing.Dict:
+        if self._writer is None:
+            raise RpcConnectionError("uitest stream is not connected")
+        future = asyncio.get_running_loop().create_future()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("sendMsg: %s", payload(data))
+        async with self._write_lock:
+            # a dead stream would take the request and leave it waiting until its timeout
+            if self._error is not None:
+                raise self._error
+            # register before writing so the order of `_pending` matches the order on the wire
+            self._pending.append((request_id, future))
+            self._writer.write(data)
+            await self._writer.drain()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise RpcConnectionError(f"uitest reply timed out after {timeout}s")
+
+    async def invoke(self, api: str, this: str = "Driver#0", args: typing.List = [],
+                     timeout: float = SOCKET_TIMEOUT) -> HypiumResponse:
+        request_id = _codec.next_request_id()
+        reply = await self._request(request_id, _codec.encode_hypium(api, this, args, request_id), timeout)
+        data = _codec.to_response(reply)
+        if data.exception:
+            raise InvokeHypiumError(data.exception)
+        return data
+
+    async def invoke_captures(self, api: str, args: typing.List = [],
+                              timeout: float = SOCKET_TIMEOUT) -> HypiumResponse:
+        request_id = _codec.next_request_id()
+        reply = await self._request(request_id, _codec.encode_captures(api, args, request_id), timeout)
+        data = _codec.to_response(reply)
+        if data.exception:
+            raise InvokeCaptures(data.exception)
+        return data
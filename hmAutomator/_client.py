@@ -1,18 +1,24 @@
 # -*- coding: utf-8 -*-
 import socket
-import json
+import logging
 import time
 import os
-import hashlib
 import typing
-from typing import Optional
-from datetime import datetime
+import threading
+import collections
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from functools import cached_property
 
-from . import logger
-from .hdc import HdcWrapper
+from . import logger, payload
+from . import _codec
+from . import metrics
+from . import trace
+from . import _record
+from .hdc import HdcWrapper, _execute_command
+from .utils import port_allocator
+from ._pushcache import push_cache
 from .proto import HypiumResponse, DriverData
-from .exception import InvokeHypiumError, InvokeCaptures
+from .exception import InvokeHypiumError, InvokeCaptures, RpcConnectionError, HdcError
 
 
 UITEST_SERVICE_PORT = 8012
@@ -20,28 +26,118 @@ SOCKET_TIMEOUT = 20
 
 
 class HmClient:
-    """harmony uitest client"""
+    """
+    harmony uitest client
+
+    Safe for concurrent callers: requests are written under a lock and a reader thread hands every reply
+    to the waiting caller, matched by the echoed request_id or, as uitest answers in order, FIFO.
+    Subclasses that read the raw socket themselves (RecordClient) set MULTIPLEXED = False.
+    """
+    MULTIPLEXED = True
+
     def __init__(self, serial: str):
         self.hdc = HdcWrapper(serial)
         self.sock = None
         self.serial = serial
+        self._write_lock = threading.RLock()
+        self._pending_lock = threading.Lock()
+        # (request_id, future) of the requests sent on the current socket, oldest first
+        self._pending: typing.Deque[typing.Tuple[str, Future]] = collections.deque()
 
     @cached_property
     def local_port(self):
-        fports = self.hdc.list_fport()
-        logger.debug(fports) if fports else None
-
         return self.hdc.forward_port(UITEST_SERVICE_PORT)
 
     def _rm_local_port(self):
         logger.debug("rm fport local port")
-        self.hdc.rm_forward(self.local_port, UITEST_SERVICE_PORT)
+        self.hdc.release_forward(self.local_port, UITEST_SERVICE_PORT)
+
+    def _close_sock(self):
+        sock, self.sock = self.sock, None
+        if sock:
+            try:
+                # shutdown wakes up the reader thread blocked in recv
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _drop_connection(self):
+        """Close the socket and forget the forwarded port, so the next connect re-forwards it."""
+        self._close_sock()
+        if "local_port" in self.__dict__:
+            try:
+                self._rm_local_port()
+            except HdcError as e:
+                logger.debug(f"Ignore fport rm error: {e}")
+            del self.__dict__["local_port"]
 
     def _connect_sock(self):
         """Create socket and connect to the uiTEST server."""
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.settimeout(SOCKET_TIMEOUT)
-        self.sock.connect((("127.0.0.1", self.local_port)))
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(SOCKET_TIMEOUT)
+        sock.connect((("127.0.0.1", self.local_port)))
+        self.sock = sock
+        if self.MULTIPLEXED:
+            # replies are read by the reader thread only, callers time out on their futures
+            sock.settimeout(None)
+            pending = self._pending = collections.deque()
+            reader = threading.Thread(target=self._read_loop, args=(sock, pending),
+                                      name=f"hmat-reader-{self.serial}", daemon=True)
+            reader.start()
+
+    def _read_loop(self, sock: socket.socket, pending: typing.Deque[typing.Tuple[str, Future]]):
+        reader = _codec.FrameReader()
+        error: Exception = RpcConnectionError("uitest connection closed by peer")
+        try:
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                if metrics.enabled:
+                    start = time.perf_counter()
+                    frames = reader.feed(chunk)
+                    metrics.observe("rpc.decode", time.perf_counter() - start)
+                    metrics.incr("rpc.bytes_received", len(chunk))
+                else:
+                    frames = reader.feed(chunk)
+                for reply in frames:
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("recvMsg: %s", payload(reply))
+                    self._dispatch(pending, reply)
+        except (OSError, ValueError) as e:
+            error = RpcConnectionError(f"uitest connection lost: {e!r}")
+        # the stream is closed or corrupt, close the socket so that no new request waits on it
+        with self._write_lock:
+            if self.sock is sock:
+                self._close_sock()
+        # everything still waiting on this socket will never get a reply
+        with self._pending_lock:
+            waiting = list(pending)
+            pending.clear()
+        for _, future in waiting:
+            if not future.done():
+                future.set_exception(error)
+
+    def _dispatch(self, pending: typing.Deque[typing.Tuple[str, Future]], reply: typing.Any):
+        future = None
+        with self._pending_lock:
+            request_id = reply.get("request_id") if isinstance(reply, dict) else None
+            if request_id:
+                for item in pending:
+                    if item[0] == request_id:
+                        pending.remove(item)
+                        future = item[1]
+                        break
+            if future is None and pending:
+                future = pending.popleft()[1]
+        if future is None:
+            logger.debug(f"Drop unsolicited uitest reply: {reply!r}")
+            return
+        future.set_result(reply)
 
     def _send_msg(self, msg: typing.Dict):
         """Send an message to the server.
@@ -59,9 +155,15 @@ class HmClient:
                 "client": "127.0.0.1"
             }
         """
-        msg = json.dumps(msg, ensure_ascii=False, separators=(',', ':'))
-        logger.debug(f"sendMsg: {msg}")
-        self.sock.sendall(msg.encode('utf-8') + b'\n')
+        self._send_raw(_codec.get_codec().dumps(msg) + b'\n')
+
+    def _send_raw(self, data: bytes):
+        """Send an already serialised, newline terminated message."""
+        if self.sock is None:
+            raise RpcConnectionError("uitest socket is not connected")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("sendMsg: %s", payload(data))
+        self.sock.sendall(data)
 
     def _recv_msg(self, buff_size: int = 4096, decode=False, print=True) -> typing.Union[bytearray, str]:
         full_msg = bytearray()
@@ -70,8 +172,8 @@ class HmClient:
             relay = self.sock.recv(buff_size)
             if decode:
                 relay = relay.decode()
-            if print:
-                logger.debug(f"recvMsg: {relay}")
+            if print and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("recvMsg: %s", payload(relay))
             full_msg = relay
 
         except (socket.timeout, UnicodeDecodeError) as e:
@@ -81,6 +183,87 @@ class HmClient:
 
         return full_msg
 
+    def _recv_replies(self, count: int, buff_size: int = 65536) -> typing.List[typing.Dict]:
+        """
+        Read `count` replies of pipelined requests, in order (non multiplexed clients only).
+
+        Raises:
+            RpcConnectionError: If the peer closed the connection or a reply timed out.
+        """
+        reader, replies = _codec.FrameReader(), []
+        while len(replies) < count:
+            try:
+                chunk = self.sock.recv(buff_size)
+            except socket.timeout as e:
+                raise RpcConnectionError(f"uitest reply timed out after {len(replies)}/{count} replies: {e}")
+            if not chunk:
+                raise RpcConnectionError("uitest connection closed by peer")
+            try:
+                replies.extend(reader.feed(chunk))
+            except ValueError as e:
+                # the replies left on the socket can no longer be matched to their requests
+                self._close_sock()
+                raise RpcConnectionError(f"uitest connection lost: {e!r}") from e
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("recvMsg: %s", payload(replies))
+        return replies[:count]
+
+    def _request(self, requests: typing.List[typing.Tuple[str, bytes]],
+                 timeout: float = SOCKET_TIMEOUT) -> typing.List[typing.Dict]:
+        """
+        Send (request_id, data) messages in one write and wait for their replies, in order.
+
+        Raises:
+            RpcConnectionError: If the uitest connection is lost or a reply timed out.
+        """
+        data = b"".join(item[1] for item in requests)
+        with self._write_lock:
+            if self.sock is None:
+                raise RpcConnectionError("uitest socket is not connected")
+            if not self.MULTIPLEXED:
+                self._send_raw(data)
+                return self._recorded(requests, self._recv_replies(len(requests)))
+            futures = [Future() for _ in requests]
+            with self._pending_lock:
+                self._pending.extend((request_id, future) for (request_id, _), future in zip(requests, futures))
+            try:
+                self._send_raw(data)
+            except OSError as e:
+                self._close_sock()
+                raise RpcConnectionError(f"uitest send failed: {e!r}") from e
+
+        replies = []
+        deadline = time.time() + timeout
+        for future in futures:
+            try:
+                replies.append(future.result(max(deadline - time.time(), 0)))
+            except FutureTimeoutError:
+                # the reply order is unknown from now on, drop the connection and let the caller reconnect
+                self._close_sock()
+                raise RpcConnectionError(f"uitest reply timed out after {timeout}s")
+        return self._recorded(requests, replies)
+
+    @staticmethod
+    def _recorded(requests: typing.List[typing.Tuple[str, bytes]], replies: typing.List[typing.Dict]):
+        if _record.active is not None:
+            for (_, data), reply in zip(requests, replies):
+                _record.active.rpc(data, reply)
+        return replies
+
+    def _request_instrumented(self, api: str, request_id: str, message: bytes) -> typing.Dict:
+        start = time.perf_counter()
+        try:
+            with trace.span(api, "rpc", serial=self.serial):
+                return self._request([(request_id, message)])[0]
+        except RpcConnectionError:
+            if metrics.enabled:
+                metrics.incr("rpc.errors", api=api)
+            raise
+        finally:
+            if metrics.enabled:
+                metrics.observe("rpc.invoke", time.perf_counter() - start, api=api)
+                metrics.incr("rpc.bytes_sent", len(message))
+
     def invoke(self, api: str, this: str = "Driver#0", args: typing.List = []) -> HypiumResponse:
         """
         Hypium invokes given API method with the specified arguments and handles exceptions.
@@ -94,47 +277,53 @@ class HmClient:
 
         Raises:
         InvokeHypiumError: If the API call returns an exception in the response.
+        RpcConnectionError: If the uitest connection is lost.
         """
-
-        request_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
-        params = {
-            "api": api,
-            "this": this,
-            "args": args,
-            "message_type": "hypium"
-        }
-
-        msg = {
-            "module": "com.ohos.devicetest.hypiumApiHelper",
-            "method": "callHypiumApi",
-            "params": params,
-            "request_id": request_id
-        }
-
-        self._send_msg(msg)
-        raw_data = self._recv_msg(decode=True)
-        data = HypiumResponse(**(json.loads(raw_data)))
+        request_id = _codec.next_request_id()
+        message = _codec.encode_hypium(api, this, args, request_id)
+        if metrics.enabled or trace.enabled:
+            reply = self._request_instrumented(api, request_id, message)
+        else:
+            reply = self._request([(request_id, message)])[0]
+        data = _codec.to_response(reply)
         if data.exception:
             raise InvokeHypiumError(data.exception)
         return data
 
+    def invoke_many(self, calls: typing.List[typing.Tuple[str, str, typing.List]],
+                    timeout: float = SOCKET_TIMEOUT) -> typing.List[HypiumResponse]:
+        """
+        Pipeline several Hypium calls: all requests are written at once, then the replies are read in order.
+        uitest runs them one after another, so the sequence costs one round trip instead of one per call.
+
+        Args:
+            calls (List[Tuple[str, str, List]]): (api, this, args) of each call.
+            timeout (float): Seconds to wait for all the replies, raise it for calls that run long on the device.
+
+        Returns:
+            List[HypiumResponse]: One response per call.
+
+        Raises:
+            InvokeHypiumError: For the first call that returned an exception, the later calls were still executed.
+            RpcConnectionError: If the uitest connection is lost.
+        """
+        if not calls:
+            return []
+        requests = []
+        for api, this, args in calls:
+            request_id = _codec.next_request_id()
+            requests.append((request_id, _codec.encode_hypium(api, this, args, request_id)))
+        with trace.span("invoke_many", "rpc", serial=self.serial, apis=[call[0] for call in calls]):
+            replies = self._request(requests, timeout)
+        responses = [_codec.to_response(reply) for reply in replies]
+        for (api, _, _), data in zip(calls, responses):
+            if data.exception:
+                raise InvokeHypiumError(f"{api}: {data.exception}")
+        return responses
+
     def invoke_captures(self, api: str, args: typing.List = []) -> HypiumResponse:
-        request_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
-        params = {
-            "api": api,
-            "args": args
-        }
-
-        msg = {
-            "module": "com.ohos.devicetest.hypiumApiHelper",
-            "method": "Captures",
-            "params": params,
-            "request_id": request_id
-        }
-
-        self._send_msg(msg)
-        raw_data = self._recv_msg(decode=True)
-        data = HypiumResponse(**(json.loads(raw_data)))
+        request_id = _codec.next_request_id()
+        data = _codec.to_response(self._request([(request_id, _codec.encode_captures(api, args, request_id))])[0])
         if data.exception:
             raise InvokeCaptures(data.exception)
         return data
@@ -150,16 +339,16 @@ class HmClient:
     def release(self):
         logger.info(f"Release {self.__class__.__name__} connection")
         try:
-            if self.sock:
-                self.sock.close()
-                self.sock = None
-            os.popen(f"hdc -t {self.serial} fport rm tcp:{self.local_port} tcp:{UITEST_SERVICE_PORT}").readlines()
-            # 使用这个会导致线程未正确释放无法结束
-            # self._rm_local_port()
+            self._close_sock()
         except Exception as e:
-            os.popen(f"hdc -t {self.serial} fport rm tcp:{self.local_port} tcp:{UITEST_SERVICE_PORT}").readlines()
             logger.info(f"尝试停止: {e}")
             # logger.error(f"An error occurred: {e}")
+        # Only remove the forward once no other client of this process (e.g. RecordClient) shares it
+        if "local_port" in self.__dict__ and port_allocator.release(self.local_port):
+            # best effort, unlike `rm_forward` a failure is not raised
+            _execute_command(self.hdc._args("fport", "rm", f"tcp:{self.local_port}", f"tcp:{UITEST_SERVICE_PORT}"))
+            # 使用这个会导致线程未正确释放无法结束
+            # self._rm_local_port()
 
     def _create_hdriver(self) -> DriverData:
         logger.debug("Create uitest driver")
@@ -194,45 +383,27 @@ class _UITestService:
         self._start_uitest_daemon()
         time.sleep(0.5)
 
-    def _get_local_agent_path(self) -> str:
+    @staticmethod
+    def _get_local_agent_path() -> str:
         """Return the local path of the agent file."""
         target_agent = "uitest_agent_v1.1.0.so"
         return os.path.join(os.path.dirname(os.path.realpath(__file__)), "assets", target_agent)
 
-    def _get_remote_md5sum(self, file_path: str) -> Optional[str]:
-        """Get the MD5 checksum of a remote file."""
-        command = f"md5sum {file_path}"
-        output = self.hdc.shell(command).output.strip()
-        return output.split()[0] if output else None
-
-    def _get_local_md5sum(self, file_path: str) -> str:
-        """Get the MD5 checksum of a local file."""
-        hash_md5 = hashlib.md5()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
-
-    def _is_remote_file_exists(self, file_path: str) -> bool:
-        """Check if a file exists on the device."""
-        command = f"[ -f {file_path} ] && echo 'exists' || echo 'not exists'"
-        result = self.hdc.shell(command).output.strip()
-        return "exists" in result
+    @staticmethod
+    def _agent_is_current(local_path: str, remote_md5: typing.Optional[str]) -> bool:
+        """Whether the agent on the device (its MD5, None if missing) is the local one."""
+        return remote_md5 is not None and remote_md5 == push_cache.local_digest(local_path)
 
     def _setup_device_agent(self, local_path: str, remote_path: str):
         """Ensure the remote agent file is correctly set up."""
-        if self._is_remote_file_exists(remote_path):
-            local_md5 = self._get_local_md5sum(local_path)
-            remote_md5 = self._get_remote_md5sum(remote_path)
-            if local_md5 == remote_md5:
-                logger.debug("Remote agent file is up-to-date")
-                self.hdc.shell(f"chmod +x {remote_path}")
-                return
-            self.hdc.shell(f"rm {remote_path}")
-
-        self.hdc.send_file(local_path, remote_path)
+        if self._agent_is_current(local_path, self.hdc.md5sum(remote_path)):
+            logger.debug("Remote agent file is up-to-date")
+        else:
+            # remove the outdated agent first so that the new one replaces it
+            self.hdc.shell(f"rm -f {remote_path}")
+            push_cache.push(self.hdc, [(local_path, remote_path)], force=True)
+            logger.debug("Updated remote agent file")
         self.hdc.shell(f"chmod +x {remote_path}")
-        logger.debug("Updated remote agent file")
 
     def _get_uitest_pid(self) -> typing.List[str]:
         proc_pids = []
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import itertools
+import typing
+from typing import Any, List, Optional
+
+from .proto import HypiumResponse
+from .utils import split_json_frames
+
+
+class _StdlibCodec:
+    name = "json"
+
+    @staticmethod
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    @staticmethod
+    def loads(data: typing.Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+class _OrjsonCodec:
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self.dumps = orjson.dumps  # compact and utf-8 by default
+        self.loads = orjson.loads
+
+
+class _UjsonCodec:
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+        self.loads = ujson.loads
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+
+_CODECS = {
+    "orjson": _OrjsonCodec,
+    "ujson": _UjsonCodec,
+    "json": _StdlibCodec,
+}
+
+_codec = None
+
+
+def set_codec(name: Optional[str] = None):
+    """
+    Select the JSON codec used on the RPC path.
+
+    Args:
+        name (Optional[str]): "orjson", "ujson" or "json". None picks the fastest installed one,
+                              the HMAT_JSON_CODEC environment variable overrides the default choice.
+
+    Raises:
+        ValueError: If the codec is unknown.
+        ImportError: If the requested codec is not installed.
+    """
+    global _codec
+    name = name or os.getenv("HMAT_JSON_CODEC")
+    if name:
+        if name not in _CODECS:
+            raise ValueError(f"Unknown json codec: {name}, choose from {list(_CODECS)}")
+        _codec = _CODECS[name]()
+        return _codec
+
+    for factory in _CODECS.values():
+        try:
+            _codec = factory()
+            return _codec
+        except ImportError:
+            continue
+
+
+def get_codec():
+    return _codec or set_codec()
+
+
+# Monotonic, process-unique request ids. They start at the current time in microseconds so they keep
+# the look of the old "%Y%m%d%H%M%S%f" ids, and next() on itertools.count is atomic under the GIL.
+_request_ids = itertools.count(int(time.time() * 1000000))
+
+
+def next_request_id() -> str:
+    return str(next(_request_ids))
+
+
+# The constant parts of the uitest envelopes, serialised once. Key order matches the documented protocol.
+_HYPIUM_HEAD = b'{"module":"com.ohos.devicetest.hypiumApiHelper","method":"callHypiumApi","params":{"api":'
+_CAPTURES_HEAD = b'{"module":"com.ohos.devicetest.hypiumApiHelper","method":"Captures","params":{"api":'
+
+
+def encode_hypium(api: str, this: Optional[str], args: typing.List, request_id: str) -> bytes:
+    """Serialise a callHypiumApi request, newline terminated."""
+    dumps = get_codec().dumps
+    return b''.join((_HYPIUM_HEAD, dumps(api),
+                     b',"this":', dumps(this),
+                     b',"args":', dumps(args),
+                     b',"message_type":"hypium"},"request_id":"', request_id.encode('ascii'), b'"}\n'))
+
+
+def encode_captures(api: str, args: typing.List, request_id: str) -> bytes:
+    """Serialise a Captures request, newline terminated."""
+    dumps = get_codec().dumps
+    return b''.join((_CAPTURES_HEAD, dumps(api),
+                     b',"args":', dumps(args),
+                     b'},"request_id":"', request_id.encode('ascii'), b'"}\n'))
+
+
+def decode(data: typing.Union[bytes, str]) -> Any:
+    """
+    Raises:
+        ValueError: If `data` is not a complete JSON document.
+    """
+    return get_codec().loads(data)
+
+
+def to_response(data: typing.Dict) -> HypiumResponse:
+    """Build a HypiumResponse, ignoring keys it does not know (e.g. an echoed request_id)."""
+    return HypiumResponse(data.get("result"), data.get("exception"))
+
+
+class FrameReader:
+    """
+    Splits the uitest reply stream into decoded replies.
+
+    Replies are newline terminated: only the newly received bytes are scanned for the delimiter and each
+    complete frame is decoded once, so a large reply costs one parse however many reads it spans.
+    For peers that never send the delimiter the buffer is parsed whenever a read ends like a JSON document.
+
+    A frame that cannot be decoded raises ValueError: replies are matched to requests by their order, so
+    after a lost reply the stream can no longer be trusted.
+    """
+    def __init__(self):
+        self._buffer = bytearray()
+        self._delimited = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        buffer = self._buffer
+        scanned = len(buffer)
+        buffer += chunk
+        end = buffer.find(b"\n", scanned)
+        if end != -1:
+            self._delimited = True
+            return self._split_lines(end)
+        if not self._delimited and chunk.rstrip()[-1:] in (b"}", b"]"):
+            return self._split_documents()
+        return []
+
+    def _split_lines(self, end: int) -> List[Any]:
+        buffer, frames, start = self._buffer, [], 0
+        while end != -1:
+            line = bytes(buffer[start:end])
+            if line.strip():
+                try:
+                    frames.append(decode(line))
+                except ValueError as e:
+                    raise ValueError(f"undecodable uitest reply ({len(line)} bytes): {e}") from e
+            start = end + 1
+            end = buffer.find(b"\n", start)
+        del buffer[:start]
+        return frames
+
+    def _split_documents(self) -> List[Any]:
+        try:
+            text = self._buffer.decode("utf-8")
+        except UnicodeDecodeError:
+            return []
+        frames, rest = split_json_frames(text)
+        if frames:
+            self._buffer = bytearray(rest.encode("utf-8"))
+        return frames
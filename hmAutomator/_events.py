@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+import collections
+from typing import Callable, Deque, List, Optional, Sequence
+
+from . import logger, trace
+from ._client import HmClient
+from .proto import HypiumResponse, UiEvent
+from .exception import RpcConnectionError
+
+
+class _EventClient(HmClient):
+    """
+    Second uitest connection used only for event observers, so that the blocking
+    `getRecentUiEvent` never holds the connection of the test thread.
+    """
+    def connect(self) -> str:
+        # the daemon is managed by the Driver connection, only connect here
+        self._connect_sock()
+        resp: HypiumResponse = self.invoke("Driver.create", this=None)
+        return resp.result
+
+
+class UiEventStream:
+    """
+    Persistent UI event subscriber.
+
+    A background thread keeps the `uiEventObserverOnce` observers armed and collects every event into a
+    bounded, timestamped ring buffer. Queries never block the device connection of the test:
+
+        events = d.ui_events          # started on first access
+        t = time.time()
+        d(text="提交").click()
+        toast = events.wait_for(lambda e: e.type == "Toast", timeout=3, since=t)
+        events.since(t)               # everything seen after t
+        events.close()                # stop and free the observers on the device
+    """
+    EVENTS = ("toastShow", "dialogShow")
+    # UiEvent.type -> the observer that reported it
+    OBSERVERS = {"Toast": "toastShow", "Dialog": "dialogShow"}
+    CAPACITY = 256
+    POLL_TIMEOUT = 1  # seconds of each getRecentUiEvent, bounds how long `close` takes
+
+    def __init__(self, serial: str, events: Sequence[str] = EVENTS, capacity: int = CAPACITY):
+        self.serial = serial
+        self.events = tuple(events)
+        self._buffer: Deque[UiEvent] = collections.deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[_EventClient] = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "UiEventStream":
+        if self.running:
+            return self
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f"hmat-events-{self.serial}", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Stop the background thread and drop the observers it armed on the device."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(self.POLL_TIMEOUT + 5)
+            self._thread = None
+
+    stop = close
+
+    def _connect(self) -> str:
+        self._release_client()
+        self._client = _EventClient(self.serial)
+        return self._client.connect()
+
+    def _release_client(self):
+        if self._client is not None:
+            self._client.release()
+            self._client = None
+
+    def _arm(self, driver: str, events: Sequence[str]):
+        self._client.invoke_many([("Driver.uiEventObserverOnce", driver, [event]) for event in events])
+
+    def _fired(self, event: UiEvent) -> Sequence[str]:
+        """The observers consumed by `event`, all of them if its type is unknown."""
+        observer = self.OBSERVERS.get(event.type)
+        return (observer,) if observer in self.events else self.events
+
+    def _teardown(self, driver: str):
+        # the observers still armed belong to this connection's Driver object, free it on the device
+        try:
+            self._client.invoke("BackendObjectsCleaner", this=None, args=[driver])
+        except Exception as e:
+            logger.debug(f"ui event stream of {self.serial}: teardown failed: {e!r}")
+
+    def _run(self):
+        backoff = 0.5
+        driver = None
+        while not self._stop_event.is_set():
+            try:
+                if driver is None:
+                    driver = self._connect()
+                    self._arm(driver, self.events)
+                    backoff = 0.5
+                resp: HypiumResponse = self._client.invoke("Driver.getRecentUiEvent", this=driver,
+                                                           args=[self.POLL_TIMEOUT])
+                if resp.result:
+                    event = UiEvent(time.time(), resp.result)
+                    self._push(event)
+                    # an observer fires once, arm the one that fired again right away
+                    self._arm(driver, self._fired(event))
+            except (OSError, RpcConnectionError) as e:
+                logger.debug(f"ui event stream of {self.serial} disconnected: {e!r}")
+                driver = None
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 8.0)
+            except Exception as e:
+                logger.warning(f"ui event stream of {self.serial}: {e!r}")
+                self._stop_event.wait(backoff)
+        if driver is not None:
+            self._teardown(driver)
+        self._release_client()
+
+    def _push(self, event: UiEvent):
+        logger.debug(f"ui event: {event}")
+        trace.instant("ui_event", "watcher", serial=self.serial, type=event.type, text=event.text)
+        with self._cond:
+            self._buffer.append(event)
+            self._cond.notify_all()
+
+    def since(self, t: float = 0) -> List[UiEvent]:
+        """Events received after `t` (time.time()), oldest first. Never blocks."""
+        with self._cond:
+            return [e for e in self._buffer if e.time > t]
+
+    def latest(self, predicate: Optional[Callable[[UiEvent], bool]] = None) -> Optional[UiEvent]:
+        """The newest buffered event matching `predicate`, None if there is none. Never blocks."""
+        with self._cond:
+            for event in reversed(self._buffer):
+                if predicate is None or predicate(event):
+                    return event
+        return None
+
+    def wait_for(self, predicate: Callable[[UiEvent], bool], timeout: float = 3,
+                 since: float = 0) -> Optional[UiEvent]:
+        """
+        Wait for an event matching `predicate` received after `since`, including the buffered ones.
+
+        Args:
+            predicate: Called with every UiEvent.
+            timeout (float): Max seconds to wait.
+            since (float): Only consider events received after this time.time(), 0 for the whole buffer.
+
+        Returns:
+            Optional[UiEvent]: The first matching event, None on timeout.
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                for event in self._buffer:
+                    if event.time > since and predicate(event):
+                        return event
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                # only look at events pushed from now on
+                since = max(since, self._buffer[-1].time if self._buffer else since)
+                self._cond.wait(remaining)
+
+    def clear(self):
+        with self._cond:
+            self._buffer.clear()
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from . import logger
+from .utils import parse_bounds
+from .exception import ElementNotFoundError
+from .proto import Bounds, Point
+from ._uiobject import ByType
+
+if TYPE_CHECKING:
+    from .driver import Driver
+
+
+# selector fields with a value index, the others are filtered on the candidates
+_INDEXED = ("id", "key", "text", "type", "description")
+_BOOL_FIELDS = ("clickable", "longClickable", "scrollable", "enabled", "focused", "selected", "checked", "checkable")
+
+
+class LayoutNode:
+    """One component of a layout snapshot, all properties are read from the snapshot."""
+    __slots__ = ("attributes", "parent", "order", "_bounds")
+
+    def __init__(self, attributes: Dict[str, Any], parent: Optional["LayoutNode"], order: int):
+        self.attributes = attributes
+        self.parent = parent
+        self.order = order  # position in document (depth first) order
+        self._bounds: Optional[Bounds] = None
+
+    def __repr__(self) -> str:
+        return f"LayoutNode(type={self.type!r}, text={self.text!r}, bounds={self.attributes.get('bounds')})"
+
+    def get(self, name: str, default: str = "") -> str:
+        value = self.attributes.get(name, default)
+        return default if value is None else str(value)
+
+    def _flag(self, name: str) -> bool:
+        return self.get(name).lower() == "true"
+
+    @property
+    def id(self) -> str:
+        return self.get("id")
+
+    @property
+    def key(self) -> str:
+        return self.get("key") or self.get("id")
+
+    @property
+    def type(self) -> str:
+        return self.get("type")
+
+    @property
+    def text(self) -> str:
+        return self.get("text")
+
+    @property
+    def description(self) -> str:
+        return self.get("description")
+
+    @property
+    def isSelected(self) -> bool:
+        return self._flag("selected")
+
+    @property
+    def isChecked(self) -> bool:
+        return self._flag("checked")
+
+    @property
+    def isEnabled(self) -> bool:
+        return self._flag("enabled")
+
+    @property
+    def isFocused(self) -> bool:
+        return self._flag("focused")
+
+    @property
+    def isCheckable(self) -> bool:
+        return self._flag("checkable")
+
+    @property
+    def isClickable(self) -> bool:
+        return self._flag("clickable")
+
+    @property
+    def isLongClickable(self) -> bool:
+        return self._flag("longClickable")
+
+    @property
+    def isScrollable(self) -> bool:
+        return self._flag("scrollable")
+
+    @property
+    def bounds(self) -> Optional[Bounds]:
+        if self._bounds is None:
+            self._bounds = parse_bounds(self.get("bounds"))
+        return self._bounds
+
+    @property
+    def boundsCenter(self) -> Optional[Point]:
+        bounds = self.bounds
+        return bounds.get_center() if bounds else None
+
+    @property
+    def info(self) -> Dict:
+        return {
+            "id": self.id,
+            "key": self.key,
+            "type": self.type,
+            "text": self.text,
+            "description": self.description,
+            "isSelected": self.isSelected,
+            "isChecked": self.isChecked,
+            "isEnabled": self.isEnabled,
+            "isFocused": self.isFocused,
+            "isCheckable": self.isCheckable,
+            "isClickable": self.isClickable,
+            "isLongClickable": self.isLongClickable,
+            "isScrollable": self.isScrollable,
+            "bounds": self.bounds,
+            "center": self.boundsCenter,
+        }
+
+
+class LayoutSnapshot:
+    """
+    Offline selector engine over one `uitest dumpLayout` result.
+
+    snapshot = d.snapshot()
+    snapshot(text="设置").click()
+    snapshot(type="Button", clickable=True, index=1).info
+
+    Selectors take the same fields as `d(...)` (ByType plus index/isBefore/isAfter) and are resolved
+    in memory without any RPC; only actions (click, input...) go to the device, at the node's bounds center.
+    The snapshot does not follow the screen, take a new one after the UI changed.
+    """
+    def __init__(self, hierarchy: Dict, d: Optional["Driver"] = None):
+        self._d = d
+        self.nodes: List[LayoutNode] = []
+        self._index: Dict[str, Dict[str, List[LayoutNode]]] = {field: {} for field in _INDEXED}
+        self._build(hierarchy)
+
+    def _build(self, hierarchy: Dict):
+        stack = [(hierarchy, None)] if hierarchy else []
+        while stack:
+            item, parent = stack.pop()
+            node = LayoutNode(item.get("attributes", {}), parent, len(self.nodes))
+            self.nodes.append(node)
+            for field in _INDEXED:
+                value = node.get(field)
+                if value:
+                    self._index[field].setdefault(value, []).append(node)
+            # reversed, so that children are visited in document order
+            for child in reversed(item.get("children", [])):
+                stack.append((child, node))
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __call__(self, **kwargs) -> "LocalUiObject":
+        return LocalUiObject(self, **kwargs)
+
+    def query(self, **kwargs) -> List[LayoutNode]:
+        """
+        All nodes matching the selector, in document order. `index` is ignored here, see `LocalUiObject`.
+
+        isBefore=True/isAfter=True select the nodes before/after the first node matching the other fields,
+        like `On.isBefore`/`On.isAfter` do on the device.
+        """
+        kwargs = dict(kwargs)
+        kwargs.pop("index", None)
+        is_before = kwargs.pop("isBefore", False)
+        is_after = kwargs.pop("isAfter", False)
+        for k in kwargs:
+            if not ByType.verify(k):
+                raise ReferenceError(f"{k} is not allowed.")
+
+        indexed = [k for k in _INDEXED if k in kwargs]
+        if indexed:
+            # start from the smallest posting list, then filter
+            field = min(indexed, key=lambda k: len(self._index[k].get(str(kwargs[k]), ())))
+            candidates = self._index[field].get(str(kwargs[field]), [])
+        else:
+            candidates = self.nodes
+        matched = [node for node in candidates if self._match(node, kwargs)]
+
+        if is_before or is_after:
+            if not matched:
+                return []
+            anchor = matched[0].order
+            matched = self.nodes[:anchor] if is_before else self.nodes[anchor + 1:]
+        return matched
+
+    @staticmethod
+    def _match(node: LayoutNode, kwargs: Dict[str, Any]) -> bool:
+        for k, v in kwargs.items():
+            if k in _BOOL_FIELDS:
+                if node._flag(k) != bool(v):
+                    return False
+            elif node.get(k) != str(v):
+                return False
+        return True
+
+
+class LocalUiObject:
+    """A selector on a LayoutSnapshot, mirroring the read API of UiObject."""
+    def __init__(self, snapshot: LayoutSnapshot, **kwargs):
+        self._snapshot = snapshot
+        self._raw_kwargs = kwargs
+        self._index = kwargs.get("index", 0)
+        self._nodes = snapshot.query(**kwargs)
+
+    def __str__(self) -> str:
+        return f"LocalUiObject [{self._raw_kwargs}"
+
+    @property
+    def count(self) -> int:
+        return len(self._nodes)
+
+    def __len__(self):
+        return self.count
+
+    def exists(self) -> bool:
+        return self._index < len(self._nodes)
+
+    @property
+    def node(self) -> LayoutNode:
+        if not self.exists():
+            raise ElementNotFoundError(f"Element({self}) not found in the layout snapshot")
+        return self._nodes[self._index]
+
+    def __getattr__(self, name: str):
+        # id, text, bounds, isClickable, info ... come from the snapshot node
+        if name.startswith("_") or not hasattr(LayoutNode, name):
+            raise AttributeError(name)
+        return getattr(self.node, name)
+
+    def _center(self) -> Point:
+        if self._snapshot._d is None:
+            raise RuntimeError("The layout snapshot is not bound to a Driver")
+        center = self.node.boundsCenter
+        if center is None:
+            raise ElementNotFoundError(f"Element({self}) has no bounds")
+        logger.debug(f"{self} center: {center}")
+        return center
+
+    def click(self):
+        center = self._center()
+        return self._snapshot._d.click(center.x, center.y)
+
+    def click_if_exists(self):
+        if self.exists():
+            return self.click()
+
+    def double_click(self):
+        center = self._center()
+        return self._snapshot._d.double_click(center.x, center.y)
+
+    def long_click(self):
+        center = self._center()
+        return self._snapshot._d.long_click(center.x, center.y)
+
+    def input_text(self, text: str):
+        self.click()
+        return self._snapshot._d.input_text(text)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""JPEG decoding helpers. numpy/cv2 are imported on first use so that `import hmAutomator` does not need them."""
+
+from typing import Optional, Tuple, Union
+
+from .proto import Bounds
+
+# libjpeg can decode at 1/2, 1/4 and 1/8 of the size directly, which skips most of the IDCT work
+_REDUCTIONS = (8, 4, 2)
+
+
+def reduction_for(scale: float) -> int:
+    """The largest libjpeg reduction factor that does not go below `scale`, 1 for none."""
+    for factor in _REDUCTIONS:
+        if scale <= 1 / factor:
+            return factor
+    return 1
+
+
+def _region_tuple(region: Union[Bounds, Tuple[int, int, int, int]]) -> Tuple[int, int, int, int]:
+    if isinstance(region, Bounds):
+        return region.left, region.top, region.right, region.bottom
+    return tuple(region)
+
+
+def decode_jpeg(data: bytes, region: Optional[Union[Bounds, Tuple[int, int, int, int]]] = None,
+                scale: float = 1.0):
+    """
+    Decode JPEG bytes to a BGR numpy array.
+
+    Args:
+        data (bytes): The JPEG data.
+        region: Crop box in full resolution pixels, a Bounds or (left, top, right, bottom). None for the whole image.
+        scale (float): Output scale in (0, 1]. Small scales are decoded with IMREAD_REDUCED_COLOR_2/4/8.
+
+    Returns:
+        The image. Without scaling the crop is a view on the decoded frame, not a copy.
+
+    Raises:
+        ValueError: The data is not a decodable image.
+    """
+    import numpy as np
+    import cv2
+
+    if not 0 < scale <= 1:
+        raise ValueError(f"scale must be in (0, 1], got {scale}")
+    factor = reduction_for(scale)
+    flag = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+            4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}[factor]
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if img is None or img.size == 0:
+        raise ValueError("Fail to decode screenshot")
+
+    if region is not None:
+        left, top, right, bottom = (v // factor for v in _region_tuple(region))
+        img = img[max(top, 0):bottom, max(left, 0):right]
+
+    rest = scale * factor
+    if abs(rest - 1) > 1e-3 and img.size:
+        size = (max(1, round(img.shape[1] * rest)), max(1, round(img.shape[0] * rest)))
+        img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    return img
+
+
+def resize_frame(data: bytes, size: Tuple[int, int], quality: int = 60):
+    """
+    Decode a capture frame, scale it to `size` (width, height) and round-trip it through JPEG at `quality`,
+    the per-frame work of the screen recorder.
+
+    Returns:
+        The BGR image, None if the frame can not be decoded.
+    """
+    import numpy as np
+    import cv2
+
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None or img.size == 0:
+        return None
+    img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)  # INTER_AREA: 推荐用于缩小图像
+    ok, compressed = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not ok:
+        return None
+    img = cv2.imdecode(np.frombuffer(compressed, np.uint8), cv2.IMREAD_COLOR)
+    if img is None or img.size == 0:
+        return None
+    return img
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+from typing import Dict, Optional
+
+from . import logger
+from .hdc import HdcWrapper
+from .utils import cache_dir
+
+
+# DeviceInfo field -> system parameter. All of them are read-only `const.*` params, so they
+# only change with a system update and can be cached on disk.
+IMMUTABLE_PARAMS = {
+    "productName": "const.product.name",
+    "model": "const.product.model",
+    "brand": "const.product.brand",
+    "sdkVersion": "const.ohos.apiversion",
+    "sysVersion": "const.product.software.version",
+    "cpuAbi": "const.product.cpu.abilist",
+}
+
+
+class DeviceProperties:
+    """
+    Immutable device properties, loaded with one `param get` and cached per serial on disk.
+
+    Volatile values (wlan ip, display size/rotation) are never cached here, read them from the device on demand.
+    """
+    TTL = 24 * 3600
+
+    def __init__(self, hdc: HdcWrapper, ttl: float = TTL):
+        self.hdc = hdc
+        self.ttl = ttl
+        self._params: Optional[Dict[str, str]] = None
+
+    @property
+    def _cache_path(self) -> str:
+        return os.path.join(cache_dir("device_props"), f"{self.hdc.serial}.json")
+
+    def _load_disk_cache(self) -> Optional[Dict[str, str]]:
+        try:
+            with open(self._cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - data.get("time", 0) > self.ttl:
+            return None
+        return data.get("params")
+
+    def _save_disk_cache(self, params: Dict[str, str]):
+        path = self._cache_path
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"time": time.time(), "params": params}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Fail to write device properties cache: {e}")
+
+    def _fetch(self) -> Dict[str, str]:
+        params = {k: v for k, v in self.hdc.get_params().items() if k.startswith("const.")}
+        if not params:
+            # `param get` without a key is not supported, read the known keys instead
+            params = self.hdc.get_params(list(IMMUTABLE_PARAMS.values()))
+        return params
+
+    def params(self, refresh: bool = False) -> Dict[str, str]:
+        """
+        All `const.*` system parameters of the device.
+
+        Args:
+            refresh (bool): Ignore both the in-memory and the disk cache.
+        """
+        if self._params is None or refresh:
+            params = None if refresh else self._load_disk_cache()
+            if params is None:
+                params = self._fetch()
+                if params:
+                    self._save_disk_cache(params)
+            self._params = params
+        return self._params
+
+    def get(self, name: str) -> Optional[str]:
+        """
+        Args:
+            name (str): A DeviceInfo field name (e.g. "model") or a raw parameter name (e.g. "const.product.model").
+        """
+        key = IMMUTABLE_PARAMS.get(name, name)
+        return self.params().get(key)
+
+    def invalidate(self):
+        self._params = None
+        try:
+            os.remove(self._cache_path)
+        except OSError:
+            pass
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from . import logger
+from .hdc import HdcWrapper
+from .utils import file_md5
+
+
+class PushCache:
+    """
+    Content-addressed push: a file is only sent when the device does not already hold the same bytes.
+
+    Local digests are cached by (path, mtime, size), so an unchanged file is hashed once per process.
+    Remote digests of a whole batch are read with one `md5sum` call, and `(serial, remote_path) -> digest`
+    is recorded after every check/push. With `verify=False` a recorded digest is trusted and no device call
+    is made at all, use it only when nothing else writes the remote paths.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local: Dict[str, Tuple[int, int, str]] = {}
+        self._remote: Dict[Tuple[str, str], str] = {}
+
+    def local_digest(self, path: str) -> str:
+        path = os.path.expanduser(path)
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            cached = self._local.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        digest = file_md5(path)
+        with self._lock:
+            self._local[key] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def remote_digest(self, serial: str, rpath: str) -> Optional[str]:
+        """The last digest recorded for a remote path, None if unknown."""
+        with self._lock:
+            return self._remote.get((serial, rpath))
+
+    def _record(self, serial: str, digests: Dict[str, Optional[str]]):
+        with self._lock:
+            for rpath, digest in digests.items():
+                if digest:
+                    self._remote[(serial, rpath)] = digest
+                else:
+                    self._remote.pop((serial, rpath), None)
+
+    def pending(self, hdc: HdcWrapper, files: Iterable[Tuple[str, str]],
+                verify: bool = True) -> List[Tuple[str, str]]:
+        """Return the (local_path, remote_path) pairs whose remote content differs from the local file."""
+        files = list(files)
+        local = {lpath: self.local_digest(lpath) for lpath, _ in files}
+        if verify:
+            remote = hdc.md5sums([rpath for _, rpath in files])
+            self._record(hdc.serial, {rpath: remote.get(rpath) for _, rpath in files})
+        else:
+            remote = {rpath: self.remote_digest(hdc.serial, rpath) for _, rpath in files}
+        return [(lpath, rpath) for lpath, rpath in files if remote.get(rpath) != local[lpath]]
+
+    def push(self, hdc: HdcWrapper, files: Union[Dict[str, str], Iterable[Tuple[str, str]]],
+             verify: bool = True, force: bool = False) -> List[Tuple[str, str]]:
+        """
+        Push files to the device, skipping the ones already there.
+
+        Args:
+            hdc (HdcWrapper): The device.
+            files: {local_path: remote_path} or an iterable of (local_path, remote_path).
+            verify (bool): Check the remote digests on the device (one shell call), else trust the record.
+            force (bool): Push everything.
+
+        Returns:
+            List[Tuple[str, str]]: The pairs that were actually sent, with `~` expanded in the local paths.
+        """
+        files = list(files.items()) if isinstance(files, dict) else list(files)
+        files = [(os.path.expanduser(lpath), rpath) for lpath, rpath in files]
+        todo = files if force else self.pending(hdc, files, verify)
+        for lpath, rpath in todo:
+            hdc.send_file(lpath, rpath)
+            self._record(hdc.serial, {rpath: self.local_digest(lpath)})
+        logger.debug(f"push {len(todo)}/{len(files)} file(s) to {hdc.serial}, {len(files) - len(todo)} unchanged")
+        return todo
+
+    def forget(self, serial: Optional[str] = None):
+        """Drop the remote records of one device, or all of them."""
+        with self._lock:
+            if serial is None:
+                self._remote.clear()
+                return
+            for key in [k for k in self._remote if k[0] == serial]:
+                del self._remote[key]
+
+
+# process-wide cache shared by Driver.push_file, distribute and the uitest agent setup
+push_cache = PushCache()
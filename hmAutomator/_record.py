@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+Session recorder: while active, every RPC request/reply, hdc command, hierarchy dump and capture-stream
+frame is appended to a JSON lines session file. `hmAutomator.testing` replays such files offline.
+"""
+
+import json
+import base64
+import threading
+from typing import Dict, List, Optional
+
+from . import logger
+from .proto import CommandResult
+
+
+class SessionRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _write(self, entry: Dict):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def rpc(self, request: bytes, reply: Dict):
+        try:
+            message = json.loads(request)
+        except ValueError:
+            logger.debug("Skip recording an undecodable request")
+            return
+        params = message.get("params", {})
+        self._write({"kind": "rpc", "method": message.get("method"), "api": params.get("api"),
+                     "this": params.get("this"), "args": params.get("args", []), "reply": reply})
+
+    def hdc(self, argv: List[str], result: CommandResult):
+        self._write({"kind": "hdc", "cmd": command_key(argv), "output": result.output,
+                     "error": result.error, "exit_code": result.exit_code})
+
+    def hierarchy(self, data: Dict):
+        self._write({"kind": "hierarchy", "data": data})
+
+    def frame(self, data: bytes):
+        self._write({"kind": "frame", "data": base64.b64encode(bytes(data)).decode("ascii")})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def command_key(argv: List[str]) -> str:
+    """The arguments of an hdc command after the target serial, e.g. 'shell param get const.product.model'."""
+    for i, token in enumerate(argv[:-1]):
+        if token == "-t":
+            return " ".join(argv[i + 2:])
+    return " ".join(argv[1:])
+
+
+# the recorder in use, None while not recording
+active: Optional[SessionRecorder] = None
+
+
+def start(path: str) -> SessionRecorder:
+    global active
+    stop()
+    active = SessionRecorder(path)
+    logger.info(f"Recording session to {path}")
+    return active
+
+
+def stop():
+    global active
+    recorder, active = active, None
+    if recorder is not None:
+        recorder.close()
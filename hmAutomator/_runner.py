@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+"""
+Runs hdc without a shell: argv is exec'd directly, every command has a deadline after which its whole
+process group is killed, stdout can be streamed while the command runs, and the number of hdc processes
+talking to the same hdc server at once can be capped:
+
+    HMAT_HDC_TIMEOUT=60         default deadline of a command, seconds
+    HMAT_HDC_CONCURRENCY=8      max concurrent hdc commands per hdc server, unlimited by default
+
+File transfers and installs pass `timeout=None` (no deadline): their duration depends on the size and the link.
+"""
+
+import os
+import sys
+import time
+import signal
+import threading
+import subprocess
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import logger, metrics
+
+DEFAULT_TIMEOUT: float = float(os.getenv("HMAT_HDC_TIMEOUT", "60"))
+
+_limit: Optional[int] = int(os.getenv("HMAT_HDC_CONCURRENCY", "0")) or None
+_slots_lock = threading.Lock()
+_slots: Dict[str, threading.BoundedSemaphore] = {}
+
+_POSIX = sys.platform != "win32"
+
+
+def set_concurrency(limit: Optional[int]) -> None:
+    """Cap the concurrent hdc commands per hdc server (None for no cap). Applies to commands started afterwards."""
+    global _limit
+    with _slots_lock:
+        _limit = limit or None
+        _slots.clear()
+
+
+def _slot(server: str) -> Optional[threading.BoundedSemaphore]:
+    if _limit is None:
+        return None
+    with _slots_lock:
+        slot = _slots.get(server)
+        if slot is None:
+            slot = _slots[server] = threading.BoundedSemaphore(_limit)
+        return slot
+
+
+def server_of(argv: List[str]) -> str:
+    """The hdc server a command talks to: the `-s host:port` argument, "local" by default."""
+    for i, arg in enumerate(argv[:-1]):
+        if arg == "-s":
+            return argv[i + 1]
+    return "local"
+
+
+def slot_of(argv) -> Optional[threading.BoundedSemaphore]:
+    """The concurrency slot of the hdc server of `argv`, None when there is no limit."""
+    return _slot(server_of(argv) if isinstance(argv, list) else "local")
+
+
+def deadline(timeout: Optional[float]) -> Optional[float]:
+    """`time.monotonic()` value at which a command started now times out, None for no deadline."""
+    return None if timeout is None else time.monotonic() + timeout
+
+
+def remaining(until: Optional[float]) -> Optional[float]:
+    """Seconds left until a `deadline`, None for no deadline."""
+    return None if until is None else max(0.0, until - time.monotonic())
+
+
+def kill_group(process):
+    """Kill the command and everything it started."""
+    try:
+        if _POSIX:
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+
+def session_kwargs() -> Dict:
+    """Popen arguments starting the command in its own process group, so `kill_group` reaches its children."""
+    if _POSIX:
+        return {"start_new_session": True}
+    return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+
+
+def _popen(argv) -> subprocess.Popen:
+    return subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            **session_kwargs())
+
+
+def _communicate(process: subprocess.Popen, timeout: Optional[float],
+                 on_output: Optional[Callable[[bytes], None]]) -> Tuple[bytes, bytes, bool]:
+    """(stdout, stderr, timed out)"""
+    if on_output is None:
+        try:
+            output, error = process.communicate(timeout=timeout)
+            return output, error, False
+        except subprocess.TimeoutExpired:
+            kill_group(process)
+            output, error = process.communicate()
+            return output, error, True
+
+    chunks: List[bytes] = []
+    errors: List[bytes] = []
+
+    def pump_stdout():
+        for chunk in iter(lambda: process.stdout.read1(65536), b""):
+            chunks.append(chunk)
+            try:
+                on_output(chunk)
+            except Exception as e:
+                logger.warning(f"hdc output callback failed: {e!r}")
+
+    def pump_stderr():
+        errors.append(process.stderr.read())
+
+    readers = [threading.Thread(target=pump_stdout, daemon=True), threading.Thread(target=pump_stderr, daemon=True)]
+    for reader in readers:
+        reader.start()
+    timed_out = False
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        kill_group(process)
+        process.wait()
+        timed_out = True
+    for reader in readers:
+        reader.join()
+    process.stdout.close()
+    process.stderr.close()
+    return b"".join(chunks), b"".join(errors), timed_out
+
+
+def run(argv, timeout: Optional[float] = DEFAULT_TIMEOUT,
+        on_output: Optional[Callable[[bytes], None]] = None) -> Tuple[str, str, int]:
+    """
+    Run a command without a shell.
+
+    Args:
+        argv: The program and its arguments; a plain string is only accepted on Windows,
+              where it is the CreateProcess command line.
+        timeout (Optional[float]): Deadline in seconds, waiting for a concurrency slot included.
+                                   None for no deadline.
+        on_output (Optional[Callable[[bytes], None]]): Called with every stdout chunk as it arrives.
+
+    Returns:
+        Tuple[str, str, int]: (stdout, stderr, exit code). The exit code is -1 if the command could not be
+                              started or was killed at the deadline, stderr then tells why.
+    """
+    until = deadline(timeout)
+    slot = slot_of(argv)
+    if slot is not None and not slot.acquire(timeout=timeout):
+        metrics.incr("hdc.timeouts")
+        return "", f"no free hdc slot within {timeout}s", -1
+    try:
+        try:
+            process = _popen(argv)
+        except OSError as e:
+            return "", str(e), -1
+        output, error, timed_out = _communicate(process, remaining(until), on_output)
+    finally:
+        if slot is not None:
+            slot.release()
+    output = output.decode("utf-8", errors="replace")
+    error = error.decode("utf-8", errors="replace")
+    if timed_out:
+        metrics.incr("hdc.timeouts")
+        logger.warning(f"hdc command killed after {timeout}s: {argv!r}")
+        return output, f"timed out after {timeout}s\n{error}", -1
+    return output, error, process.returncode
@@ -4,20 +4,24 @@ import os
 import time
 import typing
 import threading
-import numpy as np
 import queue
-from datetime import datetime
 import subprocess
 
-import cv2
-
 from . import logger
+from . import _codec
+from . import trace
+from . import _record
 from ._client import HmClient
+from .utils import jpeg_size, split_jpeg_frames
+from ._image import resize_frame
 from .driver import Driver
 from .exception import ScreenRecordError
 
 
 class RecordClient(HmClient):
+    # the capture stream is read from the raw socket, not as JSON replies
+    MULTIPLEXED = False
+
     def __init__(self, serial: str, d: Driver):
         super().__init__(serial)
         self.d = d
@@ -44,8 +48,9 @@ class RecordClient(HmClient):
         self.target_width, self.target_height = self.d.display_size
         self.display_rotation = 0 if self.target_width < self.target_height else 1  # 获取一个当前的状态
 
-        # 截图图片数据
+        # 截图图片数据, 以及收到这一帧的时间(time.monotonic)
         self.screenshot_data = bytearray()
+        self.frame_time = 0.0
 
         # 录屏名称列表
         self.video_path_list = []
@@ -57,35 +62,38 @@ class RecordClient(HmClient):
         self.stop_screen_server()
 
     def _send_msg(self, api: str, args: list):
-        _msg = {
-            "module": "com.ohos.devicetest.hypiumApiHelper",
-            "method": "Captures",
-            "params": {
-                "api": api,
-                "args": args
-            },
-            "request_id": datetime.now().strftime("%Y%m%d%H%M%S%f")
-        }
-        super()._send_msg(_msg)
+        self._send_raw(_codec.encode_captures(api, args, _codec.next_request_id()))
     
-    # 屏幕旋转状态
+    # 屏幕旋转状态: 从屏幕流的帧头读取宽高判断横竖屏, 不用轮询设备
     def _get_display_rotation(self):
         _tmp_display_rotation = self.display_rotation
         while not self._stop_event.is_set():
-            x, y = self.d.display_size  # 这个可以实时返回当前屏幕的宽高 0.1秒左右 所以可以用做状态监控
-            if x < y:
-                self.display_rotation = 0
-            else:
-                self.display_rotation = 1
-            if self.display_rotation != _tmp_display_rotation:
-                _tmp_display_rotation = self.display_rotation
-                self.target_width, self.target_height = self.d.display_size
+            size = jpeg_size(self.screenshot_data)
+            if size:
+                x, y = size
+                self.display_rotation = 0 if x < y else 1
+                if self.display_rotation != _tmp_display_rotation:
+                    _tmp_display_rotation = self.display_rotation
+                    self.target_width, self.target_height = self.target_height, self.target_width
+                    self.d.state.invalidate()  # 让Driver的坐标换算重新获取分辨率
             time.sleep(0.5)
 
+    def latest_frame(self, max_age: float = 1.0) -> typing.Optional[bytes]:
+        """
+        The latest JPEG frame of the capture stream.
+
+        Args:
+            max_age (float): Max age of the frame in seconds.
+
+        Returns:
+            Optional[bytes]: None if the stream is not running or the frame is older than `max_age`.
+        """
+        data, frame_time = self.screenshot_data, self.frame_time
+        if not self.screen_server_status or not data or time.monotonic() - frame_time > max_age:
+            return None
+        return bytes(data)
+
     def _get_data(self, api: str, args: list):
-        # JPEG start and end markers.
-        start_flag = b'\xff\xd8'
-        end_flag = b'\xff\xd9'
         buffer = bytearray()
         while not self._stop_event.is_set():
             try:
@@ -95,15 +103,13 @@ class RecordClient(HmClient):
                 self._stop_event.set()
                 break
 
-            start_idx = buffer.find(start_flag)
-            end_idx = buffer.find(end_flag)
-            while start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                # Extract one JPEG image
-                self.screenshot_data = buffer[start_idx:end_idx + 2]
-                buffer = buffer[end_idx + 2:]
-                # Search for the next JPEG image in the buffer
-                start_idx = buffer.find(start_flag)
-                end_idx = buffer.find(end_flag)
+            frames, buffer = split_jpeg_frames(buffer)
+            for frame in frames:
+                self.screenshot_data = frame
+                self.frame_time = time.monotonic()
+                trace.instant("frame", "frame", serial=self.serial, size=len(frame))
+                if _record.active is not None:
+                    _record.active.frame(frame)
         self.screen_server_status = False
 
     def start_screen_server(self):
@@ -156,6 +162,7 @@ class RecordClient(HmClient):
 
     def _video_writer(self):
         """Write frames to video file."""
+        import cv2  # numpy/cv2 are only needed to record or show the screen
         
         img = None
 
@@ -224,27 +231,9 @@ class RecordClient(HmClient):
                     time.sleep(0.1)
                     continue
                     
-                img = cv2.imdecode(np.frombuffer(self.screenshot_data, np.uint8), cv2.IMREAD_COLOR)
-                if img is None or img.size == 0:
-                    continue
-
-                # === 新增：分辨率调整 ===
-                scaled_img = cv2.resize(
-                    img, 
-                    (target_width, target_height),  # 目标尺寸
-                    interpolation=cv2.INTER_AREA  # 推荐用于缩小图像
-                )
-
-                # === 继续压缩流程 ===
-                _, compressed_jpeg = cv2.imencode(
-                    '.jpg', 
-                    scaled_img,  # 使用缩放后的图像
-                    [int(cv2.IMWRITE_JPEG_QUALITY), quality]
-                )
-                
-                # 解码压缩后的JPEG数据
-                img = cv2.imdecode(np.frombuffer(compressed_jpeg, np.uint8), cv2.IMREAD_COLOR)
-                if img is None or img.size == 0:
+                # 缩放并按quality重新压缩
+                img = resize_frame(self.screenshot_data, (target_width, target_height), quality)
+                if img is None:
                     continue
                     
                 # 写入视频帧
@@ -280,6 +269,7 @@ class RecordClient(HmClient):
         if not self.screen_server_status:
             raise ScreenRecordError("Screen server is not running.")
 
+        import cv2  # noqa: F401  fail here, not silently in the writer thread, if opencv is missing
         self.video_path = video_path
         self._record_event.clear()
         self._record_status = True
@@ -318,6 +308,9 @@ class RecordClient(HmClient):
         }
     
     def _shwo_phone_screen(self):
+        import numpy as np
+        import cv2
+
         if self.screen_server_status:
             assert False, "Screen server is running."
 
@@ -363,6 +356,7 @@ class RecordClient(HmClient):
         if not self.screen_server_status:
             raise ScreenRecordError("Screen server is not running.")
         
+        import cv2  # noqa: F401  fail here, not silently in the display thread, if opencv is missing
         self._show_phone_event.clear()
         self._show_phone_status = True
         t = threading.Thread(target=self._shwo_phone_screen)
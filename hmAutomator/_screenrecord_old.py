@@ -15,6 +15,8 @@ from .exception import ScreenRecordError
 
 
 class RecordClient(HmClient):
+    MULTIPLEXED = False
+
     def __init__(self, serial: str, d: Driver):
         super().__init__(serial)
         self.d = d
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import threading
+import typing
+
+from . import logger
+from . import metrics
+from ._client import HmClient, SOCKET_TIMEOUT
+from .proto import HypiumResponse
+from .exception import RpcConnectionError, HdcError
+
+
+# Errors that mean the socket to the uitest daemon is gone (daemon killed, fport dropped, usb reset...)
+_CONNECTION_ERRORS = (OSError, RpcConnectionError)
+
+# Object handles that stay valid across a daemon restart.
+_STABLE_HANDLES = (None, "Driver#0", "On#seed")
+
+# Method name prefixes of side-effect free APIs, e.g. Driver.getDisplaySize, Driver.findComponents
+_READ_ONLY_PREFIXES = ("get", "is", "find", "waitFor", "capture")
+
+# An object handle of the uitest daemon, e.g. On#3, Component#12
+_HANDLE = re.compile(r"^[A-Za-z]+#\w+$")
+
+
+def _holds_stale_handle(value) -> bool:
+    """True if `value` is, or contains, a handle that does not survive a daemon restart."""
+    if isinstance(value, str):
+        return value not in _STABLE_HANDLES and _HANDLE.match(value) is not None
+    if isinstance(value, (list, tuple)):
+        return any(_holds_stale_handle(v) for v in value)
+    if isinstance(value, dict):
+        return any(_holds_stale_handle(v) for v in value.values())
+    return False
+
+
+class HmSession:
+    """
+    Reconnecting session around HmClient.
+
+    When the uitest daemon dies or the forwarded port drops, the session restarts the daemon,
+    re-forwards the port, re-creates Driver#0 and replays the interrupted call if it is idempotent.
+    Every successful recovery bumps `generation`, so callers holding object handles
+    (Component#N, On#N) know they must look them up again.
+    """
+    MAX_RETRIES = 5
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 8.0
+
+    def __init__(self, serial: str, max_retries: int = MAX_RETRIES):
+        self._client = HmClient(serial)
+        self.serial = serial
+        self.hdc = self._client.hdc
+        self.max_retries = max_retries
+        self.generation = 0
+        self._recover_lock = threading.Lock()
+
+    def start(self):
+        self._client.start()
+
+    def release(self):
+        self._client.release()
+
+    def invoke(self, api: str, this: str = "Driver#0", args: typing.List = []) -> HypiumResponse:
+        return self._call(api, this, lambda: self._client.invoke(api, this=this, args=args), args)
+
+    def invoke_many(self, calls: typing.List[typing.Tuple[str, str, typing.List]],
+                    timeout: float = SOCKET_TIMEOUT) -> typing.List[HypiumResponse]:
+        # a partly executed sequence can not be replayed safely
+        return self._call("invoke_many", None, lambda: self._client.invoke_many(calls, timeout))
+
+    def invoke_captures(self, api: str, args: typing.List = []) -> HypiumResponse:
+        return self._call(api, None, lambda: self._client.invoke_captures(api, args=args))
+
+    @staticmethod
+    def _is_replayable(api: str, this: typing.Optional[str], args: typing.List = ()) -> bool:
+        """
+        A call can be replayed after a reconnect if it does not reference an object created
+        before the restart, neither as `this` nor in its arguments, and has no side effect on the device.
+        """
+        if this not in _STABLE_HANDLES or _holds_stale_handle(args):
+            return False
+        method = api.split(".")[-1]
+        return method.startswith(_READ_ONLY_PREFIXES)
+
+    def _call(self, api: str, this: typing.Optional[str], func: typing.Callable[[], HypiumResponse],
+              args: typing.List = ()) -> HypiumResponse:
+        generation = self.generation
+        try:
+            return func()
+        except _CONNECTION_ERRORS as e:
+            logger.warning(f"uitest connection lost during {api}: {e!r}")
+            with self._recover_lock:
+                # concurrent callers lose the connection together, only the first one reconnects
+                if self.generation == generation:
+                    self._recover()
+            if not self._is_replayable(api, this, args):
+                raise RpcConnectionError(f"{api} was interrupted by a uitest reconnect and is not safe to replay") from e
+            metrics.incr("session.replays")
+            logger.info(f"Replay {api} after reconnect")
+            return func()
+
+    def _recover(self):
+        """
+        Restart the uitest service with bounded exponential backoff.
+
+        Raises:
+            RpcConnectionError: If the session could not be restored after `max_retries` attempts.
+        """
+        backoff = self.BACKOFF_BASE
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self._client._drop_connection()
+                self._client.start()
+            except _CONNECTION_ERRORS + (HdcError,) as e:
+                metrics.incr("session.recovery_failures")
+                logger.warning(f"Reconnect attempt {attempt}/{self.max_retries} failed: {e!r}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.BACKOFF_MAX)
+                continue
+
+            self.generation += 1
+            metrics.incr("session.recoveries")
+            logger.info(f"uitest session on {self.serial} recovered after {attempt} attempt(s)")
+            return
+
+        raise RpcConnectionError(f"Unable to reconnect to uitest on {self.serial} after {self.max_retries} attempts")
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from .proto import DisplayRotation
+
+
+class DeviceState:
+    """
+    Cached display state (size and rotation) of a device.
+
+    Values are loaded lazily with the given loaders and kept until something that may change them
+    happens: `update` is called by code that knows the new state (e.g. set_display_rotation),
+    `invalidate` by code that only knows it may have changed (app switch, orientation change seen on
+    the screen stream). Listeners are called after every change.
+    """
+    def __init__(self,
+                 size_loader: Callable[[], Tuple[int, int]],
+                 rotation_loader: Callable[[], DisplayRotation]):
+        self._size_loader = size_loader
+        self._rotation_loader = rotation_loader
+        self._lock = threading.Lock()
+        self._size: Optional[Tuple[int, int]] = None
+        self._rotation: Optional[DisplayRotation] = None
+        # bumped by every change, a load that started before a change must not overwrite it
+        self._generation = 0
+        self._listeners: List[Callable[["DeviceState"], None]] = []
+
+    @property
+    def display_size(self) -> Tuple[int, int]:
+        size, generation = self._size, self._generation
+        if size is None:
+            size = self._size_loader()
+            with self._lock:
+                if self._generation == generation:
+                    self._size = size
+        return size
+
+    @property
+    def display_rotation(self) -> DisplayRotation:
+        rotation, generation = self._rotation, self._generation
+        if rotation is None:
+            rotation = self._rotation_loader()
+            with self._lock:
+                if self._generation == generation:
+                    self._rotation = rotation
+        return rotation
+
+    def add_listener(self, callback: Callable[["DeviceState"], None]):
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[["DeviceState"], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self):
+        for callback in list(self._listeners):
+            callback(self)
+
+    def update(self, size: Optional[Tuple[int, int]] = None, rotation: Optional[DisplayRotation] = None):
+        """
+        Record a known new state.
+        When only the rotation is given, a cached size is swapped if the orientation flipped.
+        """
+        with self._lock:
+            if rotation is not None:
+                old = self._rotation
+                if size is None and self._size and old is not None and old.value % 2 != rotation.value % 2:
+                    size = self._size[1], self._size[0]
+                elif size is None and old is None:
+                    self._size = None  # orientation unknown before, can not derive the size
+                self._rotation = rotation
+            if size is not None:
+                self._size = size
+            self._generation += 1
+        self._notify()
+
+    def invalidate(self):
+        """Forget the cached state, the next access queries the device again."""
+        with self._lock:
+            self._size = None
+            self._rotation = None
+            self._generation += 1
+        self._notify()
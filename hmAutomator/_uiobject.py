@@ -4,7 +4,7 @@ import enum
 import time
 from typing import List, Union
 
-from . import logger
+from . import logger, metrics
 from .utils import delay
 from ._client import HmClient
 from .exception import ElementNotFoundError
@@ -35,6 +35,7 @@ class ByType(enum.Enum):
 
 class UiObject:
     DEFAULT_TIMEOUT = 2
+    MAX_DEVICE_WAIT = 10  # seconds per Driver.waitForComponent call, below the socket timeout
 
     def __init__(self, client: HmClient, **kwargs) -> None:
         self._client = client
@@ -48,6 +49,9 @@ class UiObject:
         self.__verify()
 
         self._component: Union[ComponentData, None] = None  # cache
+        self._generation = getattr(client, "generation", 0)  # session generation the cached component belongs to
+        self._by: Union[ByData, None] = None  # cached selector (On#N), valid for `_by_generation`
+        self._by_generation = self._generation
 
     def __str__(self) -> str:
         return f"UiObject [{self._raw_kwargs}"
@@ -71,19 +75,91 @@ class UiObject:
 
     def __set_component(self, component: ComponentData):
         self._component = component
+        self._generation = getattr(self._client, "generation", 0)
 
     def find_component(self, retries: int = 1, wait_time=1) -> ComponentData:
-        for attempt in range(retries):
-            components = self.__find_components()
-            if components and self._index < len(components):
-                self.__set_component(components[self._index])
-                return self._component
-
-            if attempt < retries:
+        with metrics.timer("uiobject.find"):
+            for attempt in range(retries):
+                components = self.__find_components()
+                if components and self._index < len(components):
+                    self.__set_component(components[self._index])
+                    return self._component
+
+                if attempt + 1 >= retries:
+                    break
+                metrics.incr("uiobject.find_retries")
                 time.sleep(wait_time)
                 logger.info(f"Retry found element {self}")
 
-        return None
+            return None
+
+    def wait(self, timeout: float = DEFAULT_TIMEOUT) -> bool:
+        """
+        Wait until the element appears, returning as soon as it does.
+
+        The wait runs on the device (`Driver.waitForComponent`); with `index` > 0 the selector is polled
+        with a short adaptive interval instead.
+
+        Args:
+            timeout (float): Max seconds to wait.
+
+        Returns:
+            bool: True if the element exists.
+        """
+        start = time.time()
+        found = False
+        if self._index == 0:
+            deadline = start + timeout
+            while True:
+                # keep every call well below the socket timeout
+                remaining = min(deadline - time.time(), self.MAX_DEVICE_WAIT)
+                resp: HypiumResponse = self._client.invoke("Driver.waitForComponent",
+                                                           args=[self.__get_by().value, max(int(remaining * 1000), 0)])
+                if resp.result:
+                    self.__set_component(ComponentData(resp.result))
+                    found = True
+                    break
+                if time.time() >= deadline:
+                    break
+        else:
+            found = self.__poll(lambda: self.find_component(retries=1, wait_time=0) is not None, timeout)
+        self.__record_wait("uiobject.wait", start, found)
+        return found
+
+    def wait_gone(self, timeout: float = DEFAULT_TIMEOUT) -> bool:
+        """
+        Wait until the element disappears, polling the cached selector with a short adaptive interval.
+
+        Args:
+            timeout (float): Max seconds to wait.
+
+        Returns:
+            bool: True if the element is gone.
+        """
+        start = time.time()
+        gone = self.__poll(lambda: self.count <= self._index, timeout)
+        if gone:
+            self._component = None
+        self.__record_wait("uiobject.wait_gone", start, gone)
+        return gone
+
+    @staticmethod
+    def __poll(condition, timeout: float) -> bool:
+        interval = 0.05
+        deadline = time.time() + timeout
+        while True:
+            if condition():
+                return True
+            if time.time() + interval > deadline:
+                return False
+            time.sleep(interval)
+            interval = min(interval * 1.5, 0.5)
+
+    @staticmethod
+    def __record_wait(name: str, start: float, success: bool):
+        metrics.observe(name, time.time() - start)
+        if not success:
+            metrics.incr(f"{name}.timeouts")
 
     # useless
     def __find_component(self) -> Union[ComponentData, None]:
@@ -105,6 +181,14 @@ class UiObject:
         return components
 
     def __get_by(self) -> ByData:
+        generation = getattr(self._client, "generation", 0)
+        if self._by is not None and self._by_generation == generation:
+            return self._by
+        self._by = self.__build_by()
+        self._by_generation = generation
+        return self._by
+
+    def __build_by(self) -> ByData:
         for k, v in self._kwargs.items():
             api = f"On.{k}"
             this = "On#seed"
@@ -120,6 +204,9 @@ class UiObject:
         return ByData(resp.result)
 
     def __operate(self, api, args=[], retries: int = 2):
+        if self._generation != getattr(self._client, "generation", 0):
+            # the uitest daemon was restarted, the cached Component#N handle is gone
+            self._component = None
         if not self._component:
             if not self.find_component(retries):
                 raise ElementNotFoundError(f"Element({self}) not found after {retries} retries")
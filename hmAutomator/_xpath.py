@@ -1,8 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import re
-from typing import Dict
-from lxml import etree
+from typing import Any, Dict
 from functools import cached_property
 
 from . import logger
@@ -40,8 +39,13 @@ class _XPath:
         return re.sub(r'[\x00-\x1F\x7F]', '', text)
 
     @staticmethod
-    def _json2xml(hierarchy: Dict) -> etree.Element:
-        """Convert JSON-like hierarchy to XML."""
+    def _json2xml(hierarchy: Dict) -> Any:
+        """Convert JSON-like hierarchy to XML (an lxml Element), lxml is imported on first use."""
+        from lxml import etree
+        return _XPath._build_xml(etree, hierarchy)
+
+    @staticmethod
+    def _build_xml(etree, hierarchy: Dict) -> Any:
         attributes = hierarchy.get("attributes", {})
 
         # 过滤所有属性的值，确保无非法字符
@@ -52,7 +56,7 @@ class _XPath:
 
         children = hierarchy.get("children", [])
         for item in children:
-            xml.append(_XPath._json2xml(item))
+            xml.append(_XPath._build_xml(etree, item))
 
         return xml
 
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+import uuid
+from typing import TYPE_CHECKING, List, Tuple, Union, Optional
+
+from . import logger
+from .utils import async_delay
+from ._async_client import AsyncHmClient, list_devices
+from .exception import DeviceNotFoundError
+from .proto import HypiumResponse, Point, DisplayRotation, CommandResult
+
+if TYPE_CHECKING:
+    from .proto import KeyCode
+
+
+class AsyncDriver:
+    """
+    asyncio counterpart of `Driver`, so many devices can be driven from one event loop.
+
+    Example:
+        async def run(serial):
+            async with AsyncDriver(serial) as d:
+                await d.click(0.5, 0.5)
+
+        await asyncio.gather(*(run(s) for s in await list_devices()))
+    """
+    def __init__(self, serial: str):
+        self.serial = serial
+        self._client = AsyncHmClient(serial)
+        self.hdc = self._client.hdc
+        self._display_size: Optional[Tuple[int, int]] = None
+
+    @classmethod
+    async def connect(cls, serial: Optional[str] = None) -> "AsyncDriver":
+        """
+        Create a driver and start its uitest session.
+        If serial is None, use the first serial from list_devices().
+        """
+        devices = await list_devices()
+        if not devices:
+            raise DeviceNotFoundError("No devices found. Please connect a device.")
+        if serial is None:
+            logger.info(f"No serial provided, using the first device: {devices[0]}")
+            serial = devices[0]
+        elif serial not in devices:
+            raise DeviceNotFoundError(f"Device [{serial}] not found")
+
+        d = cls(serial)
+        await d._client.start()
+        return d
+
+    async def close(self):
+        await self._client.release()
+
+    async def __aenter__(self) -> "AsyncDriver":
+        await self._client.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _invoke(self, api: str, args: List = []) -> HypiumResponse:
+        return await self._client.invoke(api, this="Driver#0", args=args)
+
+    async def shell(self, cmd: str) -> CommandResult:
+        return await self.hdc.shell(cmd)
+
+    @async_delay
+    async def start_app(self, package_name: str, page_name: str):
+        await self.hdc.shell(f"aa start -a {page_name} -b {package_name}")
+
+    async def stop_app(self, package_name: str):
+        await self.hdc.shell(f"aa force-stop {package_name}")
+
+    @async_delay
+    async def press_key(self, key_code: Union["KeyCode", int]):
+        from .proto import KeyCode
+        if isinstance(key_code, KeyCode):
+            key_code = key_code.value
+        await self.hdc.shell(f"uitest uiInput keyEvent {key_code}")
+
+    async def go_back(self):
+        from .proto import KeyCode
+        await self.press_key(KeyCode.BACK)
+
+    async def go_home(self):
+        from .proto import KeyCode
+        await self.press_key(KeyCode.HOME)
+
+    async def display_size(self) -> Tuple[int, int]:
+        if self._display_size is None:
+            resp: HypiumResponse = await self._invoke("Driver.getDisplaySize")
+            self._display_size = resp.result.get("x"), resp.result.get("y")
+        return self._display_size
+
+    async def display_rotation(self) -> DisplayRotation:
+        value = (await self._invoke("Driver.getDisplayRotation")).result
+        return DisplayRotation.from_value(value)
+
+    async def set_display_rotation(self, rotation: DisplayRotation):
+        await self._invoke("Driver.setDisplayRotation", args=[rotation.value])
+        self._display_size = None
+
+    async def _to_abs_pos(self, x: Union[int, float], y: Union[int, float]) -> Point:
+        """Convert percentages to absolute screen coordinates, see `Driver._to_abs_pos`."""
+        assert x >= 0
+        assert y >= 0
+
+        w, h = await self.display_size()
+
+        if x < 1:
+            x = int(w * x)
+        if y < 1:
+            y = int(h * y)
+        return Point(int(x), int(y))
+
+    @async_delay
+    async def click(self, x: Union[int, float], y: Union[int, float]):
+        point = await self._to_abs_pos(x, y)
+        await self._invoke("Driver.click", args=[point.x, point.y])
+
+    @async_delay
+    async def double_click(self, x: Union[int, float], y: Union[int, float]):
+        point = await self._to_abs_pos(x, y)
+        await self._invoke("Driver.doubleClick", args=[point.x, point.y])
+
+    @async_delay
+    async def long_click(self, x: Union[int, float], y: Union[int, float]):
+        point = await self._to_abs_pos(x, y)
+        await self._invoke("Driver.longClick", args=[point.x, point.y])
+
+    @async_delay
+    async def swipe(self, x1, y1, x2, y2, speed=2000):
+        point1 = await self._to_abs_pos(x1, y1)
+        point2 = await self._to_abs_pos(x2, y2)
+
+        if speed < 200 or speed > 40000:
+            logger.warning("`speed` is not in the range[200-40000], Set to default value of 2000.")
+            speed = 2000
+
+        await self._invoke("Driver.swipe", args=[point1.x, point1.y, point2.x, point2.y, speed])
+
+    @async_delay
+    async def input_text(self, text: str):
+        return await self._invoke("Driver.inputText", args=[{"x": 1, "y": 1}, text])
+
+    async def _get_by(self, **kwargs) -> str:
+        by = "On#seed"
+        for k, v in kwargs.items():
+            by = (await self._client.invoke(f"On.{k}", this=by, args=[v])).result
+        return by
+
+    async def find_components(self, **kwargs) -> List[str]:
+        """
+        Find components matching the `On.*` selectors given as kwargs, e.g. text="OK", type="Button".
+
+        Returns:
+            List[str]: Component handles such as "Component#3".
+        """
+        by = await self._get_by(**kwargs)
+        resp: HypiumResponse = await self._invoke("Driver.findComponents", args=[by])
+        return resp.result or []
+
+    async def wait_for_component(self, timeout: float = 3, **kwargs) -> Optional[str]:
+        by = await self._get_by(**kwargs)
+        resp: HypiumResponse = await self._client.invoke("Driver.waitForComponent", args=[by, int(timeout * 1000)],
+                                                         timeout=timeout + 5)
+        return resp.result
+
+    async def screenshot(self, path: str) -> str:
+        _tmp_path = f"/data/local/tmp/_tmp_{uuid.uuid4().hex}.jpeg"
+        await self.hdc.shell(f"snapshot_display -f {_tmp_path}")
+        await self.hdc.recv_file(_tmp_path, path)
+        await self.hdc.shell(f"rm -rf {_tmp_path}")
+        return path
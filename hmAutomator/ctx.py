@@ -1,10 +1,8 @@
-import os
-import json
-import uuid
 import re
 import time
 import threading
-import subprocess
+
+from . import trace
 
 class hm_ctx:
 
@@ -34,24 +32,8 @@ class hm_ctx:
         return self
 
     def _get_ui_json(self):
-        _tmp_path = f"/data/local/tmp/{uuid.uuid4().hex}.json"
-        cmd = f"hdc -t {self.d.serial} shell uitest dumpLayout -p {_tmp_path}"
-        os.popen(cmd).readlines()  # 获取当前xml
-        cmd = f'hdc -t {self.d.serial} shell cat {_tmp_path}' 
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE, shell=True)
-        output, error = process.communicate()
-        output = output.decode('utf-8')
-        error = error.decode('utf-8')
-        if output:
-            self.d.shell(f"rm -rf {_tmp_path}")
-            try:
-                return json.loads(output)
-            except Exception as e:
-                return {}
-        else:
-            self.d.shell(f"rm -rf {_tmp_path}")
-            return {}  # 当解析失败时返回空字典，避免json解析异常
+        # 获取当前布局，失败时返回空字典
+        return self.d.hdc.dump_hierarchy()
     
     def _find_control(self, data, label="text", **kwargs):
         """
@@ -144,8 +126,9 @@ class hm_ctx:
     def _loop_find_and_click_control(self, time_sleep=0.1):
         while self.loop_sig:
             try:
-                self.ui_json = self._get_ui_json()
-                self._find_and_click_control()
+                with trace.span("ctx.poll", "watcher", serial=self.d.serial):
+                    self.ui_json = self._get_ui_json()
+                    self._find_and_click_control()
             except Exception as e:
                 print('ctx loop error',e)
                 time.sleep(time_sleep)
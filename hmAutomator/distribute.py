@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from . import logger
+from .hdc import HdcWrapper
+from .proto import TransferResult
+from ._pushcache import push_cache
+from ._appindex import read_hap_info, invalidate_device
+
+
+# HAPs are staged here before `bm install`, the staged copy is kept so that the next
+# distribution of the same HAP can be skipped by comparing checksums.
+STAGING_DIR = "/data/local/tmp/hmat_dist"
+
+MAX_WORKERS = 8
+
+
+def _run_all(serials: List[str], task: Callable[[str], TransferResult],
+             max_workers: int) -> List[TransferResult]:
+    if not serials:
+        return []
+    workers = max(1, min(max_workers, len(serials)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hmat-dist") as pool:
+        return list(pool.map(task, serials))
+
+
+def _install_one(serial: str, hap_path: str, local_md5: str, bundle_name: Optional[str],
+                 force: bool) -> TransferResult:
+    result = TransferResult(serial, "install")
+    start = time.time()
+    try:
+        hdc = HdcWrapper(serial)
+        staged = posixpath.join(STAGING_DIR, os.path.basename(hap_path))
+        if not force and hdc.md5sum(staged) == local_md5 and \
+                (bundle_name is None or bundle_name in hdc.list_apps()):
+            result.skipped = True
+            return result
+        hdc.shell(f"mkdir -p {STAGING_DIR}")
+        hdc.send_file(hap_path, staged)
+        result.size = os.path.getsize(hap_path)
+        ret = hdc.shell(f"bm install -p {staged}", error_raise=False, timeout=None)
+        # the bundle may have changed version, drop what the drivers of this device know about it
+        invalidate_device(serial, bundle_name)
+        if "successfully" not in ret.output:
+            # do not keep a staged copy of a failed install, otherwise the next run would skip it
+            hdc.shell(f"rm -f {staged}", error_raise=False)
+            result.error = ret.output.strip() or ret.error.strip()
+    except Exception as e:
+        result.error = repr(e)
+    finally:
+        result.duration = time.time() - start
+    return result
+
+
+def _push_one(serial: str, files: List[Tuple[str, str]], force: bool) -> TransferResult:
+    result = TransferResult(serial, "push")
+    start = time.time()
+    try:
+        sent = push_cache.push(HdcWrapper(serial), files, force=force)
+        result.size = sum(os.path.getsize(lpath) for lpath, _ in sent)
+        result.skipped = not sent
+    except Exception as e:
+        result.error = repr(e)
+    finally:
+        result.duration = time.time() - start
+    return result
+
+
+def install_many(serials: List[str], hap_path: str,
+                 max_workers: int = MAX_WORKERS, force: bool = False) -> List[TransferResult]:
+    """
+    Install a HAP on many devices concurrently.
+
+    A device is skipped when the HAP staged there by a previous run has the same MD5 and the
+    bundle is still installed.
+
+    Args:
+        serials (List[str]): Device serials.
+        hap_path (str): Local path of the HAP.
+        max_workers (int): Max number of devices handled at the same time.
+        force (bool): Install even if the checksum matches.
+
+    Returns:
+        List[TransferResult]: One result per serial, in the order of `serials`.
+    """
+    local_md5 = push_cache.local_digest(hap_path)
+    bundle_name = read_hap_info(hap_path).get("bundleName")
+    results = _run_all(serials, lambda s: _install_one(s, hap_path, local_md5, bundle_name, force),
+                       max_workers)
+    logger.info(f"install {hap_path}\n{format_report(results)}")
+    return results
+
+
+def push_many(serials: List[str], files: Union[Dict[str, str], List[Tuple[str, str]]],
+              max_workers: int = MAX_WORKERS, force: bool = False) -> List[TransferResult]:
+    """
+    Push a file set to many devices concurrently, skipping files whose remote MD5 already matches.
+
+    Args:
+        serials (List[str]): Device serials.
+        files: {local_path: remote_path} or a list of (local_path, remote_path), the same local file may
+               go to several remote paths.
+        max_workers (int): Max number of devices handled at the same time.
+        force (bool): Push even if the checksum matches.
+
+    Returns:
+        List[TransferResult]: One result per serial, in the order of `serials`.
+    """
+    # a list may send one local file to several remote paths, keep every pair
+    files = list(files.items()) if isinstance(files, dict) else list(files)
+    for lpath, _ in files:
+        push_cache.local_digest(lpath)  # hash once before fanning out
+    results = _run_all(serials, lambda s: _push_one(s, files, force), max_workers)
+    logger.info(f"push {len(files)} file(s)\n{format_report(results)}")
+    return results
+
+
+def format_report(results: List[TransferResult]) -> str:
+    """Render results as a text table: serial, status, size, duration and throughput."""
+    lines = [f"{'serial':<24}{'action':<9}{'status':<9}{'MB':>9}{'sec':>9}{'MB/s':>9}"]
+    for r in results:
+        status = "skipped" if r.skipped else ("ok" if r.ok else "failed")
+        lines.append(f"{r.serial:<24}{r.action:<9}{status:<9}"
+                     f"{r.size / 1024 / 1024:>9.2f}{r.duration:>9.2f}{r.throughput:>9.2f}")
+        if r.error:
+            lines.append(f"    {r.error}")
+    return "\n".join(lines)
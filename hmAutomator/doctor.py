@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+
+"""
+Link diagnostics: tells whether a slow device is slow because of hdc (USB hub, hdc server),
+the uitest daemon or the device itself.
+
+    python -m hmAutomator doctor --serial FMR0223C13000649
+    python -m hmAutomator doctor --json > report.json
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import socket
+import argparse
+import tempfile
+from typing import Callable, Dict, List, Optional
+
+from . import logger, _codec
+from .hdc import HdcWrapper, list_devices, _build_hdc_prefix, _execute_command
+from ._client import HmClient, UITEST_SERVICE_PORT
+from .utils import port_allocator, split_jpeg_frames
+from .exception import HdcError, RpcConnectionError, DeviceNotFoundError
+
+CHECKS = ("spawn", "fport", "rpc", "transfer", "layout", "capture")
+
+REMOTE_PROBE = "/data/local/tmp/hmat_doctor.bin"
+
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    """min/avg/percentiles of durations, in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))] * 1000
+
+    return {"count": len(ordered), "min": ordered[0] * 1000, "avg": sum(ordered) / len(ordered) * 1000,
+            "p50": pick(50), "p90": pick(90), "p99": pick(99), "max": ordered[-1] * 1000}
+
+
+def _timed(func: Callable[[], object], count: int) -> List[float]:
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def check_spawn(hdc: HdcWrapper, count: int = 10) -> Dict:
+    """Cost of starting hdc (`hdc version`, no device involved) and of a device round trip (`shell echo`)."""
+    argv = shlex.split(_build_hdc_prefix()) + ["version"]
+    return {"spawn_ms": _stats(_timed(lambda: _execute_command(argv), count)),
+            "shell_ms": _stats(_timed(lambda: hdc.shell("echo hmat", error_raise=False), count))}
+
+
+def check_fport(hdc: HdcWrapper, count: int = 3) -> Dict:
+    """Time of setting up and removing a port forward."""
+    setup, remove = [], []
+    for _ in range(count):
+        lport = port_allocator.allocate()
+        try:
+            start = time.perf_counter()
+            result = _execute_command(hdc._args("fport", f"tcp:{lport}", f"tcp:{UITEST_SERVICE_PORT}"))
+            setup.append(time.perf_counter() - start)
+            if result.exit_code != 0:
+                raise HdcError("HDC forward port error", result.error or result.output)
+            start = time.perf_counter()
+            hdc.rm_forward(lport, UITEST_SERVICE_PORT)
+            remove.append(time.perf_counter() - start)
+        finally:
+            port_allocator.release(lport)
+    return {"setup_ms": _stats(setup), "remove_ms": _stats(remove)}
+
+
+def check_rpc(client: HmClient, count: int = 100) -> Dict:
+    """Round trip time of `count` no-op uitest calls."""
+    samples = _timed(lambda: client.invoke("Driver.getDisplayRotation"), count)
+    return {"rtt_ms": _stats(samples), "calls_per_s": count / sum(samples) if sum(samples) else 0}
+
+
+def check_transfer(hdc: HdcWrapper, size_mb: float = 8) -> Dict:
+    """`file send` and `file recv` throughput of a `size_mb` file."""
+    size = int(size_mb * 1024 * 1024)
+    fd, lpath = tempfile.mkstemp(prefix="hmat_doctor_")
+    back = lpath + ".back"
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(size))
+        start = time.perf_counter()
+        hdc.send_file(lpath, REMOTE_PROBE)
+        send = time.perf_counter() - start
+        start = time.perf_counter()
+        hdc.recv_file(REMOTE_PROBE, back)
+        recv = time.perf_counter() - start
+        if os.path.getsize(back) != size:
+            raise HdcError("HDC receive file error", f"received {os.path.getsize(back)} of {size} bytes")
+    finally:
+        hdc.shell(f"rm -f {REMOTE_PROBE}", error_raise=False)
+        for path in (lpath, back):
+            if os.path.exists(path):
+                os.remove(path)
+    mb = size / 1024 / 1024
+    return {"size_mb": mb, "send_mb_s": mb / send if send else 0, "recv_mb_s": mb / recv if recv else 0,
+            "send_ms": send * 1000, "recv_ms": recv * 1000}
+
+
+def check_layout(hdc: HdcWrapper, count: int = 3) -> Dict:
+    """`uitest dumpLayout` + read back time."""
+    return {"dump_ms": _stats(_timed(hdc.dump_hierarchy, count))}
+
+
+class _CaptureProbe(HmClient):
+    """Reads the raw capture stream, counting frames and bytes, without decoding them."""
+    MULTIPLEXED = False
+
+    def measure(self, seconds: float) -> Dict:
+        self._connect_sock()
+        try:
+            self._send_raw(self._captures("startCaptureScreen"))
+            reply = self.sock.recv(1024)
+            if b"true" not in reply:
+                raise RpcConnectionError(f"startCaptureScreen failed: {reply[:200]!r}")
+            # the reply may already carry the first frame
+            buffer = bytearray(reply[reply.find(b"\xff\xd8"):]) if b"\xff\xd8" in reply else bytearray()
+            frames = received = 0
+            self.sock.settimeout(0.5)
+            start = time.perf_counter()
+            first = last = None
+            while time.perf_counter() - start < seconds:
+                try:
+                    chunk = self.sock.recv(1024 * 1024)
+                except socket.timeout:
+                    continue
+                if not chunk:
+                    break
+                received += len(chunk)
+                buffer += chunk
+                done, buffer = split_jpeg_frames(buffer)
+                if done:
+                    now = time.perf_counter()
+                    first = first or now
+                    last = now
+                    frames += len(done)
+            elapsed = time.perf_counter() - start
+            self._send_raw(self._captures("stopCaptureScreen"))
+        finally:
+            self._close_sock()
+        # fps over the frame arrivals, the first frame may take a while after start
+        fps = (frames - 1) / (last - first) if frames > 1 and last > first else 0.0
+        return {"seconds": elapsed, "frames": frames, "fps": fps,
+                "mb_s": received / 1024 / 1024 / elapsed if elapsed else 0,
+                "avg_frame_kb": received / 1024 / frames if frames else 0}
+
+    @staticmethod
+    def _captures(api: str) -> bytes:
+        return _codec.encode_captures(api, [], _codec.next_request_id())
+
+
+def check_capture(serial: str, seconds: float = 3) -> Dict:
+    """Frame rate and bandwidth of the screen capture stream."""
+    probe = _CaptureProbe(serial)
+    try:
+        return probe.measure(seconds)
+    finally:
+        probe.release()
+
+
+def run(serial: Optional[str] = None, calls: int = 100, transfer_mb: float = 8, capture_seconds: float = 3,
+        skip: List[str] = ()) -> Dict:
+    """
+    Run the diagnostics.
+
+    Args:
+        serial (Optional[str]): Device to check, the first one of `hdc list targets` by default.
+        calls (int): Number of no-op uitest calls of the RTT check.
+        transfer_mb (float): Size of the file sent and received.
+        capture_seconds (float): How long the capture stream is read.
+        skip (List[str]): Checks not to run, from CHECKS.
+
+    Returns:
+        Dict: {"serial", "checks": {name: result or {"error": ...}}, "duration"}.
+
+    Raises:
+        DeviceNotFoundError: No (such) device.
+    """
+    start = time.time()
+    if serial is None:
+        devices = list_devices()
+        if not devices:
+            raise DeviceNotFoundError("No devices found. Please connect a device.")
+        serial = devices[0]
+    hdc = HdcWrapper(serial)
+    report = {"serial": serial, "checks": {}}
+    client: Optional[HmClient] = None
+
+    def attempt(name: str, func: Callable[[], Dict]):
+        if name in skip:
+            return
+        logger.info(f"doctor: {name}")
+        try:
+            report["checks"][name] = func()
+        except Exception as e:
+            report["checks"][name] = {"error": repr(e)}
+
+    def ensure_client() -> HmClient:
+        # starts the uitest daemon, the capture stream needs it too
+        nonlocal client
+        if client is None:
+            client = HmClient(serial)
+            client.start()
+        return client
+
+    def rpc() -> Dict:
+        begin = time.perf_counter()
+        ensure_client()
+        result = {"uitest_start_ms": (time.perf_counter() - begin) * 1000}
+        result.update(check_rpc(client, calls))
+        return result
+
+    def capture() -> Dict:
+        ensure_client()
+        return check_capture(serial, capture_seconds)
+
+    try:
+        attempt("spawn", lambda: check_spawn(hdc))
+        attempt("fport", lambda: check_fport(hdc))
+        attempt("rpc", rpc)
+        attempt("transfer", lambda: check_transfer(hdc, transfer_mb))
+        attempt("layout", lambda: check_layout(hdc))
+        attempt("capture", capture)
+    finally:
+        if client is not None:
+            client.release()
+    report["duration"] = time.time() - start
+    return report
+
+
+def _fmt_stats(stats: Dict) -> str:
+    if not stats.get("count"):
+        return "-"
+    return f"p50 {stats['p50']:.1f}ms  p90 {stats['p90']:.1f}ms  p99 {stats['p99']:.1f}ms  " \
+           f"max {stats['max']:.1f}ms  (n={stats['count']})"
+
+
+def format_report(report: Dict) -> str:
+    """One line per measurement, like `distribute.format_report`."""
+    checks = report["checks"]
+    lines = [f"hmAutomator doctor: {report['serial']}  ({report['duration']:.1f}s)"]
+
+    def section(name: str, rows: Callable[[Dict], List[str]]):
+        if name not in checks:
+            return
+        result = checks[name]
+        if "error" in result:
+            lines.append(f"  {name:<10} ERROR {result['error']}")
+            return
+        for i, row in enumerate(rows(result)):
+            lines.append(f"  {name if i == 0 else '':<10} {row}")
+
+    section("spawn", lambda r: [f"hdc spawn        {_fmt_stats(r['spawn_ms'])}",
+                                f"shell round trip {_fmt_stats(r['shell_ms'])}"])
+    section("fport", lambda r: [f"fport setup      {_fmt_stats(r['setup_ms'])}",
+                                f"fport rm         {_fmt_stats(r['remove_ms'])}"])
+    section("rpc", lambda r: [f"uitest start     {r['uitest_start_ms']:.0f}ms",
+                              f"invoke rtt       {_fmt_stats(r['rtt_ms'])}  {r['calls_per_s']:.0f} calls/s"])
+    section("transfer", lambda r: [f"file send        {r['send_mb_s']:.1f} MB/s  ({r['size_mb']:.0f}MB)",
+                                   f"file recv        {r['recv_mb_s']:.1f} MB/s"])
+    section("layout", lambda r: [f"dumpLayout       {_fmt_stats(r['dump_ms'])}"])
+    section("capture", lambda r: [f"capture stream   {r['fps']:.1f} fps  {r['mb_s']:.2f} MB/s  "
+                                  f"{r['avg_frame_kb']:.0f}KB/frame  ({r['frames']} frames)"])
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m hmAutomator doctor",
+                                     description="Measure the hdc, uitest and capture stream link of a device.")
+    parser.add_argument("-s", "--serial", help="device serial, the first connected device by default")
+    parser.add_argument("-n", "--calls", type=int, default=100, help="no-op uitest calls for the RTT (default 100)")
+    parser.add_argument("--size", type=float, default=8, help="MB sent and received (default 8)")
+    parser.add_argument("--capture", type=float, default=3, help="seconds of capture stream (default 3)")
+    parser.add_argument("--skip", action="append", default=[], choices=CHECKS, help="skip a check")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    opts = parser.parse_args(argv)
+
+    try:
+        report = run(opts.serial, opts.calls, opts.size, opts.capture, opts.skip)
+    except Exception as e:
+        print(f"doctor: {e}", file=sys.stderr)
+        return 2
+    if opts.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+    return 1 if any("error" in r for r in report["checks"].values()) else 0
@@ -1,18 +1,23 @@
 # -*- coding: utf-8 -*-
 
-import json
-import uuid
 import re
-from typing import Type, Any, Tuple, Dict, Union, List, Optional
+from typing import TYPE_CHECKING, Type, Any, Tuple, Dict, Union, List, Optional
 from functools import cached_property  # python3.8+
 
 from . import logger
 from .utils import delay
-from ._client import HmClient
+from ._session import HmSession
+from ._props import DeviceProperties
+from ._state import DeviceState
+from ._appindex import AppIndex, parse_abilities, read_hap_info
+from ._pushcache import push_cache
 from ._uiobject import UiObject
 from .hdc import list_devices
 from .exception import DeviceNotFoundError
-from .proto import HypiumResponse, KeyCode, Point, DisplayRotation, DeviceInfo, CommandResult
+from .proto import HypiumResponse, Point, Bounds, DisplayRotation, DeviceInfo, CommandResult
+
+if TYPE_CHECKING:
+    from .proto import KeyCode
 
 
 class Driver:
@@ -45,8 +50,9 @@ class Driver:
             raise ValueError("Serial number is required for initialization.")
 
         self.serial = serial
-        self._client = HmClient(self.serial)
+        self._client = HmSession(self.serial)
         self.hdc = self._client.hdc
+        self._state = DeviceState(self._query_display_size, self._query_display_rotation)
         self._init_hmclient()
         self._initialized = True  # Mark the instance as initialized
         del self._serial_for_init  # Clean up temporary attribute
@@ -73,6 +79,8 @@ class Driver:
 
     def __del__(self):
         Driver._instance.clear()
+        if "ui_events" in self.__dict__:
+            self.ui_events.close()
         if hasattr(self, '_client') and self._client:
             self._client.release()
 
@@ -95,6 +103,7 @@ class Driver:
         if not page_name:
             page_name = self.get_app_main_ability(package_name).get('name', 'MainAbility')
         self.hdc.start_app(package_name, page_name)
+        self._state.invalidate()  # the new app may force its own orientation
 
     def force_start_app(self, package_name: str, page_name: Optional[str] = None):
         self.go_home()
@@ -103,6 +112,7 @@ class Driver:
 
     def stop_app(self, package_name: str):
         self.hdc.stop_app(package_name)
+        self._state.invalidate()
 
     def clear_app(self, package_name: str):
         """
@@ -113,15 +123,26 @@ class Driver:
 
     def install_app(self, apk_path: str):
         self.hdc.install(apk_path)
+        # only the installed bundle changed, fall back to dropping the whole index if the HAP is unreadable
+        self.app_index.invalidate(read_hap_info(apk_path).get("bundleName"))
 
     def uninstall_app(self, package_name: str):
         self.hdc.uninstall(package_name)
+        self.app_index.invalidate(package_name)
 
     def list_apps(self) -> List:
         return self.hdc.list_apps()
 
     def has_app(self, package_name: str) -> bool:
-        return self.hdc.has_app(package_name)
+        return self.app_index.has_app(package_name)
+
+    @cached_property
+    def app_index(self) -> AppIndex:
+        """
+        Cached index of installed apps, see `AppIndex`.
+        Call `d.app_index.invalidate()` after installing or removing apps without the driver.
+        """
+        return AppIndex(self.hdc)
 
     def current_app(self) -> Tuple[str, str]:
         """
@@ -145,18 +166,7 @@ class Driver:
             Dict: A dictionary containing the application information. If an error occurs during parsing,
                   an empty dictionary is returned.
         """
-        app_info = {}
-        data: CommandResult = self.hdc.shell(f"bm dump -n {package_name}")
-        output = data.output
-        try:
-            json_start = output.find("{")
-            json_end = output.rfind("}") + 1
-            json_output = output[json_start:json_end]
-
-            app_info = json.loads(json_output)
-        except Exception as e:
-            logger.error(f"An error occurred:{e}")
-        return app_info
+        return self.app_index.app_info(package_name)
 
     def get_app_abilities(self, package_name: str) -> List[Dict]:
         """
@@ -168,42 +178,11 @@ class Driver:
         Returns:
             List[Dict]: A list of dictionaries containing the abilities of the application.
         """
-        result = []
-        app_info = self.get_app_info(package_name)
-        hap_module_infos = app_info.get("hapModuleInfos")
-        main_entry = app_info.get("mainEntry")
-        for hap_module_info in hap_module_infos:
-            # 尝试读取moduleInfo
-            try:
-                ability_infos = hap_module_info.get("abilityInfos")
-                module_main = hap_module_info["mainAbility"]
-            except Exception as e:
-                logger.warning(f"Fail to parse moduleInfo item, {repr(e)}")
-                continue
-            # 尝试读取abilityInfo
-            for ability_info in ability_infos:
-                try:
-                    is_launcher_ability = False
-                    skills = ability_info['skills']
-                    if len(skills) > 0 or "action.system.home" in skills[0]["actions"]:
-                        is_launcher_ability = True
-                    icon_ability_info = {
-                        "name": ability_info["name"],
-                        "moduleName": ability_info["moduleName"],
-                        "moduleMainAbility": module_main,
-                        "mainModule": main_entry,
-                        "isLauncherAbility": is_launcher_ability
-                    }
-                    result.append(icon_ability_info)
-                except Exception as e:
-                    logger.warning(f"Fail to parse ability_info item, {repr(e)}")
-                    continue
-        logger.debug(f"all abilities: {result}")
-        return result
+        return parse_abilities(self.get_app_info(package_name))
 
     def get_app_main_ability(self, package_name: str) -> Dict:
         """
-        Get the main ability of an application.
+        Get the main ability of an application, resolved once per app version.
 
         Args:
             package_name (str): The package name of the application to retrieve information for.
@@ -212,18 +191,7 @@ class Driver:
             Dict: A dictionary containing the main ability of the application.
 
         """
-        if not (abilities := self.get_app_abilities(package_name)):
-            return {}
-        for item in abilities:
-            score = 0
-            if (name := item["name"]) and name == item["moduleMainAbility"]:
-                score += 1
-            if (module_name := item["moduleName"]) and module_name == item["mainModule"]:
-                score += 1
-            item["score"] = score
-        abilities.sort(key=lambda x: (not x["isLauncherAbility"], -x["score"]))
-        logger.debug(f"main ability: {abilities[0]}")
-        return abilities[0]
+        return self.app_index.main_ability(package_name)
 
     @cached_property
     def toast_watcher(self):
@@ -245,22 +213,35 @@ class Driver:
 
         return _Watcher()
 
+    @cached_property
+    def ui_events(self):
+        """
+        Background subscriber of toast/dialog events on its own uitest connection, started on first access.
+        See `UiEventStream` for the queries (since/latest/wait_for).
+        """
+        from ._events import UiEventStream
+        return UiEventStream(self.serial).start()
+
     @delay
     def go_back(self):
+        from .proto import KeyCode
         self.hdc.send_key(KeyCode.BACK)
 
     @delay
     def go_home(self):
+        from .proto import KeyCode
         self.hdc.send_key(KeyCode.HOME)
+        self._state.invalidate()
 
     @delay
-    def press_key(self, key_code: Union[KeyCode, int]):
+    def press_key(self, key_code: Union["KeyCode", int]):
         self.hdc.send_key(key_code)
 
     def screen_on(self):
         self.hdc.wakeup()
 
     def screen_off(self):
+        from .proto import KeyCode
         self.hdc.wakeup()
         self.press_key(KeyCode.POWER)
 
@@ -270,19 +251,34 @@ class Driver:
         w, h = self.display_size
         self.swipe(0.5 * w, 0.8 * h, 0.5 * w, 0.2 * h, speed=6000)
 
-    @cached_property
-    def display_size(self) -> Tuple[int, int]:
+    def _query_display_size(self) -> Tuple[int, int]:
         api = "Driver.getDisplaySize"
         resp: HypiumResponse = self._invoke(api)
         w, h = resp.result.get("x"), resp.result.get("y")
         return w, h
 
-    @cached_property
-    def display_rotation(self) -> DisplayRotation:
+    def _query_display_rotation(self) -> DisplayRotation:
         api = "Driver.getDisplayRotation"
         value = self._invoke(api).result
         return DisplayRotation.from_value(value)
 
+    @property
+    def display_size(self) -> Tuple[int, int]:
+        """Display size, cached in `state` until a rotation or app switch invalidates it."""
+        return self._state.display_size
+
+    @property
+    def display_rotation(self) -> DisplayRotation:
+        return self._state.display_rotation
+
+    @property
+    def state(self) -> DeviceState:
+        """
+        Cached display state. Call `d.state.invalidate()` after anything that may rotate the screen
+        behind the driver's back, or `d.state.add_listener(cb)` to be told about changes.
+        """
+        return self._state
+
     def set_display_rotation(self, rotation: DisplayRotation):
         """
         Sets the display rotation to the specified orientation.
@@ -292,23 +288,32 @@ class Driver:
         """
         api = "Driver.setDisplayRotation"
         self._invoke(api, args=[rotation.value])
+        self._state.update(rotation=rotation)
 
     @cached_property
+    def properties(self) -> DeviceProperties:
+        """
+        Immutable device properties, fetched with one `param get` and cached per serial on disk.
+        """
+        return DeviceProperties(self.hdc)
+
+    @property
     def device_info(self) -> DeviceInfo:
         """
         Get detailed information about the device.
+        Immutable properties come from `properties`, wlan ip and display state are read on every access.
 
         Returns:
             DeviceInfo: An object containing various properties of the device.
         """
-        hdc = self.hdc
+        props = self.properties
         return DeviceInfo(
-            productName=hdc.product_name(),
-            model=hdc.model(),
-            sdkVersion=hdc.sdk_version(),
-            sysVersion=hdc.sys_version(),
-            cpuAbi=hdc.cpu_abi(),
-            wlanIp=hdc.wlan_ip(),
+            productName=props.get("productName"),
+            model=props.get("model"),
+            sdkVersion=props.get("sdkVersion"),
+            sysVersion=props.get("sysVersion"),
+            cpuAbi=props.get("cpuAbi"),
+            wlanIp=self.hdc.wlan_ip(),
             displaySize=self.display_size,
             displayRotation=self.display_rotation
         )
@@ -332,31 +337,96 @@ class Driver:
         """
         self.hdc.recv_file(rpath, lpath)
 
-    def push_file(self, lpath: str, rpath: str):
+    def pull_dir(self, rdir: str, ldir: str, incremental: bool = True) -> List[str]:
+        """
+        Pull a remote directory (logs, traces, screenshots...) in one transfer.
+
+        Args:
+            rdir (str): The remote directory on the device.
+            ldir (str): The local directory.
+            incremental (bool): Only fetch files whose size or mtime changed since the last pull into `ldir`.
+
+        Returns:
+            List[str]: The relative paths fetched.
+        """
+        return self.hdc.sync_dir(rdir, ldir, incremental=incremental)
+
+    def push_file(self, lpath: str, rpath: str, force: bool = False) -> bool:
         """
         Push a file from the local machine to the device.
+        Skipped if the remote file already has the same MD5.
 
         Args:
             lpath (str): The local path of the file.
             rpath (str): The remote path where the file should be saved on the device.
+            force (bool): Push even if the remote file is identical.
+
+        Returns:
+            bool: True if the file was transferred.
         """
-        self.hdc.send_file(lpath, rpath)
+        return bool(push_cache.push(self.hdc, [(lpath, rpath)], force=force))
 
-    def screenshot(self, path: str) -> str:
+    def push_files(self, files: Dict[str, str], force: bool = False) -> List[Tuple[str, str]]:
+        """
+        Push many files, checking all remote MD5s with one shell call and sending only the changed ones.
+
+        Args:
+            files (Dict[str, str]): {local_path: remote_path}.
+            force (bool): Push everything.
+
+        Returns:
+            List[Tuple[str, str]]: The (local_path, remote_path) pairs that were transferred.
+        """
+        return push_cache.push(self.hdc, files, force=force)
+
+    def screenshot_bytes(self, max_age: float = 1.0) -> bytes:
+        """
+        Take a screenshot in memory.
+
+        A fresh frame of the running capture stream (`d.screenrecord.start_screen_server()`) is used when
+        available, otherwise the device streams a new shot with one hdc call.
+
+        Args:
+            max_age (float): Max age in seconds of a capture stream frame to reuse, 0 always takes a new shot.
+
+        Returns:
+            bytes: The JPEG data.
+        """
+        record_client = self.__dict__.get("screenrecord")
+        if record_client is not None and max_age > 0:
+            frame = record_client.latest_frame(max_age)
+            if frame is not None:
+                return frame
+        return self.hdc.screenshot_bytes()
+
+    def screenshot_array(self, region: Union[Bounds, Tuple[int, int, int, int], None] = None,
+                         scale: float = 1.0, max_age: float = 1.0):
+        """
+        Take a screenshot as a BGR numpy array (requires numpy and opencv-python).
+
+        Args:
+            region: Only return this box (full resolution pixels), e.g. `d(text="OK").info.bounds`.
+            scale (float): Output scale in (0, 1], 0.5/0.25/0.125 are decoded directly at the reduced size.
+            max_age (float): Max age in seconds of a capture stream frame to reuse.
+        """
+        from ._image import decode_jpeg
+        return decode_jpeg(self.screenshot_bytes(max_age), region=region, scale=scale)
+
+    def screenshot(self, path: str, max_age: float = 0) -> str:
         """
         Take a screenshot of the device display.
 
         Args:
             path (str): The local path to save the screenshot.
+            max_age (float): Accept a capture stream frame up to this many seconds old, see `screenshot_bytes`.
+                             By default a new shot is taken, so it shows the result of the last action.
 
         Returns:
             str: The path where the screenshot is saved.
         """
-        _uuid = uuid.uuid4().hex
-        _tmp_path = f"/data/local/tmp/_tmp_{_uuid}.jpeg"
-        self.shell(f"snapshot_display -f {_tmp_path}")
-        self.pull_file(_tmp_path, path)
-        self.shell(f"rm -rf {_tmp_path}")  # remove local path
+        data = self.screenshot_bytes(max_age)
+        with open(path, "wb") as f:
+            f.write(data)
         return path
 
     def shell(self, cmd) -> CommandResult:
@@ -459,6 +529,33 @@ class Driver:
         # return self._client.invoke_captures("captureLayout").result
         return self.hdc.dump_hierarchy()
 
+    def actions(self, settle=None):
+        """
+        Build an action script executed in as few uitest round trips as possible.
+
+        d.actions().click(0.5, 0.2).input_text("hello").key(KeyCode.BACK, settle=0.6).run()
+
+        Args:
+            settle: Default settle policy of the steps: None (no wait), "idle" (wait for idle on the device)
+                or seconds to sleep on the host.
+        """
+        from ._actions import ActionScript
+        return ActionScript(self, settle=settle)
+
+    def snapshot(self):
+        """
+        Dump the layout once and query it offline, only actions go to the device.
+
+        snap = d.snapshot()
+        snap(text="设置").click()
+        snap(type="Button", index=1).bounds
+
+        Returns:
+            LayoutSnapshot: Selectors accept the same fields as `d(...)`.
+        """
+        from ._hierarchy import LayoutSnapshot
+        return LayoutSnapshot(self.dump_hierarchy(), self)
+
     @cached_property
     def gesture(self):
         from ._gesture import _Gesture
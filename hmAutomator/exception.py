@@ -38,3 +38,7 @@ class InjectGestureError(Exception):
 
 class ScreenRecordError(Exception):
     pass
+
+
+class RpcConnectionError(Exception):
+    pass
@@ -1,40 +1,100 @@
 # -*- coding: utf-8 -*-
 import tempfile
+import base64
 import json
 import uuid
 import shlex
 import re
 import os
-import subprocess
-from typing import Union, List, Dict, Tuple
-
-from . import logger
-from .utils import FreePort
-from .proto import CommandResult, KeyCode
+import logging
+import time
+import tarfile
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional, Union, List, Dict, Tuple
+
+from . import logger, payload, metrics, trace
+from . import _record, _runner
+from ._runner import set_concurrency  # noqa: F401
+from .utils import port_allocator
+from .proto import CommandResult
 from .exception import HdcError, DeviceNotFoundError
 
+if TYPE_CHECKING:
+    from .proto import KeyCode
+
 
-def _execute_command(cmdargs: Union[str, List[str]]) -> CommandResult:
-    if isinstance(cmdargs, (list, tuple)):
-        cmdline: str = ' '.join(list(map(shlex.quote, cmdargs)))
-    elif isinstance(cmdargs, str):
-        cmdline = cmdargs
+def _execute_command(cmdargs: Union[str, List[str]], timeout: Optional[float] = _runner.DEFAULT_TIMEOUT,
+                     on_output: Optional[Callable[[bytes], None]] = None) -> CommandResult:
+    """
+    Run an hdc command without a shell, see `_runner.run`.
 
-    logger.debug(cmdline)
+    Args:
+        cmdargs (Union[str, List[str]]): argv, a string is split like a POSIX shell would.
+        timeout (Optional[float]): Deadline in seconds, None for no deadline (transfers, installs).
+        on_output (Optional[Callable[[bytes], None]]): Called with the stdout chunks as they arrive.
+    """
+    if isinstance(cmdargs, str):
+        argv: List[str] = shlex.split(cmdargs, posix=os.name != "nt")
+    else:
+        argv = list(cmdargs)
+    cmdline = " ".join(map(shlex.quote, argv))
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s", payload(cmdline))
+    if metrics.enabled or trace.enabled:
+        result = _run_instrumented(argv, cmdline, timeout, on_output)
+    else:
+        result = _run(argv, timeout, on_output)
+    if _record.active is not None:
+        _record.active.hdc(argv, result)
+    return result
+
+
+def _parse_cmdline(argv: List[str]) -> Tuple[str, str]:
+    """(serial, hdc sub command) of a command, e.g. ("FMR0223C13000649", "shell"), for metrics and traces."""
+    for i, token in enumerate(argv[:-1]):
+        if token == "-t":
+            return argv[i + 1], argv[i + 2] if i + 2 < len(argv) else ""
+    return "", argv[1] if len(argv) > 1 else ""
+
+
+def _run_instrumented(argv: List[str], cmdline: str, timeout: Optional[float],
+                      on_output: Optional[Callable[[bytes], None]]) -> CommandResult:
+    serial, subcommand = _parse_cmdline(argv)
+    start = time.perf_counter()
     try:
-        process = subprocess.Popen(cmdline, stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE, shell=True)
-        output, error = process.communicate()
-        output = output.decode('utf-8')
-        error = error.decode('utf-8')
-        exit_code = process.returncode
+        with trace.span(f"hdc {subcommand}", "hdc", serial=serial, cmd=cmdline[:200]):
+            return _run(argv, timeout, on_output)
+    finally:
+        if metrics.enabled:
+            metrics.observe("hdc.command", time.perf_counter() - start, cmd=subcommand)
+
+
+def _run(argv: List[str], timeout: Optional[float],
+         on_output: Optional[Callable[[bytes], None]]) -> CommandResult:
+    output, error, exit_code = _runner.run(argv, timeout, on_output)
+    if 'error:' in output.lower() or '[fail]' in output.lower():
+        return CommandResult("", output, -1)
+    return CommandResult(output, error, exit_code)
+
 
-        if 'error:' in output.lower() or '[fail]' in output.lower():
-            return CommandResult("", output, -1)
+def _md5sum_command(rpaths: List[str]) -> str:
+    return "md5sum " + " ".join(shlex.quote(p) for p in rpaths) + " 2>/dev/null"
 
-        return CommandResult(output, error, exit_code)
-    except Exception as e:
-        return CommandResult("", str(e), -1)
+
+def _parse_md5sums(output: str) -> Dict[str, str]:
+    """{remote_path: digest} of `md5sum` output lines, "<digest>  <path>"."""
+    digests = {}
+    for line in output.splitlines():
+        parts = line.strip().split(None, 1)
+        if len(parts) == 2 and re.fullmatch(r"[0-9a-f]{32}", parts[0]):
+            digests[parts[1]] = parts[0]
+    return digests
+
+
+# local manifest of `HdcWrapper.sync_dir`: {relative_path: [size, mtime]}
+SYNC_MANIFEST = ".hmat_sync.json"
 
 
 def _build_hdc_prefix() -> str:
@@ -51,8 +111,7 @@ def _build_hdc_prefix() -> str:
 
 def list_devices() -> List[str]:
     devices = []
-    hdc_prefix = _build_hdc_prefix()
-    result = _execute_command(f"{hdc_prefix} list targets")
+    result = _execute_command(shlex.split(_build_hdc_prefix()) + ["list", "targets"])
     if result.exit_code == 0 and result.output:
         lines = result.output.strip().split('\n')
         for line in lines:
@@ -74,19 +133,42 @@ class HdcWrapper:
         if not self.is_online():
             raise DeviceNotFoundError(f"Device [{self.serial}] not found")
 
+    def _args(self, *args: str) -> List[str]:
+        """argv of an hdc sub command on this device."""
+        return shlex.split(self.hdc_prefix) + ["-t", self.serial] + list(args)
+
     def is_online(self):
         _serials = list_devices()
         return True if self.serial in _serials else False
 
     def forward_port(self, rport: int) -> int:
-        lport: int = FreePort().get()
-        result = _execute_command(f"{self.hdc_prefix} -t {self.serial} fport tcp:{lport} tcp:{rport}")
-        if result.exit_code != 0:
-            raise HdcError("HDC forward port error", result.error)
-        return lport
+        """
+        Forward a local port to `rport` on the device.
+        An existing forward of this device to `rport` is reused instead of creating a new one.
+        """
+        for lport, _rport in self._list_forwards():
+            if _rport == rport:
+                logger.debug(f"Reuse fport tcp:{lport} tcp:{rport}")
+                return port_allocator.acquire(lport)
+
+        error = ""
+        for _ in range(3):
+            # another process may grab the port between allocation and `fport`, so retry with a new one
+            lport: int = port_allocator.allocate()
+            result = _execute_command(self._args("fport", f"tcp:{lport}", f"tcp:{rport}"))
+            if result.exit_code == 0:
+                return lport
+            port_allocator.release(lport)
+            error = result.error
+        raise HdcError("HDC forward port error", error)
+
+    def release_forward(self, lport: int, rport: int):
+        """Drop the lease taken by `forward_port`, the forward is removed once nobody in this process uses it."""
+        if port_allocator.release(lport):
+            self.rm_forward(lport, rport)
 
     def rm_forward(self, lport: int, rport: int) -> int:
-        result = _execute_command(f"{self.hdc_prefix} -t {self.serial} fport rm tcp:{lport} tcp:{rport}")
+        result = _execute_command(self._args("fport", "rm", f"tcp:{lport}", f"tcp:{rport}"))
         if result.exit_code != 0:
             raise HdcError("HDC rm forward error", result.error)
         return lport
@@ -95,46 +177,226 @@ class HdcWrapper:
         """
         eg.['tcp:10001 tcp:8012', 'tcp:10255 tcp:8012']
         """
-        result = _execute_command(f"{self.hdc_prefix} -t {self.serial} fport ls")
+        result = _execute_command(self._args("fport", "ls"))
         if result.exit_code != 0:
             raise HdcError("HDC forward list error", result.error)
         pattern = re.compile(r"tcp:\d+ tcp:\d+")
         return pattern.findall(result.output)
 
-    def send_file(self, lpath: str, rpath: str):
-        result = _execute_command(f"{self.hdc_prefix} -t {self.serial} file send {lpath} {rpath}")
+    def _list_forwards(self) -> List[Tuple[int, int]]:
+        """
+        Forwards of this device as (local port, remote port).
+        `fport ls` output lines look like: FMR0223C13000649    tcp:10001 tcp:8012    [Forward]
+        """
+        result = _execute_command(self._args("fport", "ls"))
+        if result.exit_code != 0:
+            return []
+        forwards = []
+        for line in result.output.splitlines():
+            match = re.search(r"tcp:(\d+) tcp:(\d+)", line)
+            if match and self.serial in line and "reverse" not in line.lower():
+                forwards.append((int(match.group(1)), int(match.group(2))))
+        return forwards
+
+    def send_file(self, lpath: str, rpath: str, timeout: Optional[float] = None):
+        # no deadline by default, the duration depends on the file size and the link
+        # hdc is run without a shell, expand `~` here
+        lpath = os.path.expanduser(lpath)
+        result = _execute_command(self._args("file", "send", lpath, rpath), timeout)
         if result.exit_code != 0:
             raise HdcError("HDC send file error", result.error)
+        if metrics.enabled and os.path.isfile(lpath):
+            metrics.incr("hdc.bytes_sent", os.path.getsize(lpath))
         return result
 
-    def recv_file(self, rpath: str, lpath: str):
-        result = _execute_command(f"{self.hdc_prefix} -t {self.serial} file recv {rpath} {lpath}")
+    def recv_file(self, rpath: str, lpath: str, timeout: Optional[float] = None):
+        lpath = os.path.expanduser(lpath)
+        result = _execute_command(self._args("file", "recv", rpath, lpath), timeout)
         if result.exit_code != 0:
             raise HdcError("HDC receive file error", result.error)
+        if metrics.enabled and os.path.isfile(lpath):
+            metrics.incr("hdc.bytes_received", os.path.getsize(lpath))
         return result
 
-    def shell(self, cmd: str, error_raise=True) -> CommandResult:
-        # ensure the command is wrapped in double quotes
-        if cmd[0] != '\"':
-            cmd = "\"" + cmd
-        if cmd[-1] != '\"':
-            cmd += '\"'
-        result = _execute_command(f"{self.hdc_prefix} -t {self.serial} shell {cmd}")
+    def list_files(self, rdir: str) -> Dict[str, Tuple[int, int]]:
+        """
+        List the regular files under a remote directory with one shell call.
+
+        Returns:
+            Dict[str, Tuple[int, int]]: {relative_path: (size, mtime)}, paths use "/".
+        """
+        rdir = rdir.rstrip("/") or "/"
+        output = self.shell(f"find {shlex.quote(rdir)} -type f -exec stat -c '%s %Y %n' {{}} + 2>/dev/null",
+                            error_raise=False).output
+        files = {}
+        for line in output.splitlines():
+            # line: "<size> <mtime> <path>"
+            parts = line.strip().split(" ", 2)
+            if len(parts) != 3 or not parts[0].isdigit() or not parts[1].isdigit():
+                continue
+            rel = posixpath.relpath(parts[2], rdir)
+            files[rel] = (int(parts[0]), int(parts[1]))
+        return files
+
+    def _pull_tar(self, rdir: str, rel_paths: List[str], ldir: str) -> List[str]:
+        """
+        Pack files on the device into one tar, transfer it once and unpack it into `ldir`.
+
+        Returns:
+            List[str]: The relative paths of the files unpacked.
+        """
+        rtar = f"/data/local/tmp/hmat_pull_{uuid.uuid4().hex}.tar"
+        ltar = os.path.join(tempfile.gettempdir(), os.path.basename(rtar))
+        names = " ".join(shlex.quote(p) for p in rel_paths) if rel_paths else "."
+        try:
+            result = self.shell(f"tar -cf {rtar} -C {shlex.quote(rdir)} {names}", error_raise=False, timeout=None)
+            if result.exit_code != 0:
+                raise HdcError("HDC tar error", result.error or result.output)
+            self.recv_file(rtar, ltar)
+            real_ldir = os.path.realpath(ldir)
+            with tarfile.open(ltar) as tar:
+                members = []
+                for member in tar.getmembers():
+                    target = os.path.realpath(os.path.join(ldir, member.name))
+                    if not (member.isfile() or member.isdir()) or \
+                            os.path.commonpath([real_ldir, target]) != real_ldir:
+                        continue
+                    members.append(member)
+                tar.extractall(ldir, members=members)
+            return [posixpath.normpath(m.name) for m in members if m.isfile()]
+        finally:
+            self.shell(f"rm -f {rtar}", error_raise=False)
+            if os.path.exists(ltar):
+                os.remove(ltar)
+
+    def _pull_each(self, rdir: str, rel_paths: List[str], ldir: str, max_workers: int):
+        """Fallback when the device has no usable tar: one `file recv` per file on parallel workers."""
+        def _recv(rel: str):
+            lpath = os.path.join(ldir, *rel.split("/"))
+            os.makedirs(os.path.dirname(lpath), exist_ok=True)
+            self.recv_file(posixpath.join(rdir, rel), lpath)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hmat-pull") as pool:
+            list(pool.map(_recv, rel_paths))
+
+    def pull_dir(self, rdir: str, ldir: str, rel_paths: Union[List[str], None] = None,
+                 max_workers: int = 4) -> List[str]:
+        """
+        Pull a remote directory (or some files in it) to a local directory in one transfer.
+
+        The files are packed with `tar` on the device; if that fails they are received one by one
+        with `max_workers` parallel `hdc file recv`.
+
+        Args:
+            rdir (str): Remote directory.
+            ldir (str): Local directory, created if missing.
+            rel_paths (List[str]): Paths relative to `rdir` to pull, None for the whole directory.
+            max_workers (int): Parallel workers of the fallback.
+
+        Returns:
+            List[str]: The relative paths pulled, or an empty list when `rel_paths` is empty.
+        """
+        rdir = rdir.rstrip("/") or "/"
+        ldir = os.path.expanduser(ldir)
+        os.makedirs(ldir, exist_ok=True)
+        if rel_paths is not None and not rel_paths:
+            return []
+        try:
+            # keep the tar command line short, very long file lists are packed in chunks
+            chunks = [rel_paths[i:i + 200] for i in range(0, len(rel_paths), 200)] if rel_paths else [[]]
+            pulled = []
+            for chunk in chunks:
+                pulled.extend(self._pull_tar(rdir, chunk, ldir))
+        except (HdcError, tarfile.TarError, OSError) as e:
+            logger.debug(f"tar pull of {rdir} failed, fall back to per-file recv: {e}")
+            if rel_paths is None:
+                rel_paths = list(self.list_files(rdir))
+            self._pull_each(rdir, rel_paths, ldir, max_workers)
+            return rel_paths
+        return rel_paths if rel_paths is not None else pulled
+
+    def sync_dir(self, rdir: str, ldir: str, incremental: bool = True, delete: bool = False,
+                 max_workers: int = 4) -> List[str]:
+        """
+        Mirror a remote directory into a local one.
+
+        The remote (size, mtime) of every file is kept in `<ldir>/.hmat_sync.json`; in incremental mode
+        only files that are new or whose size or mtime changed since the last sync are pulled.
+
+        Args:
+            rdir (str): Remote directory.
+            ldir (str): Local directory.
+            incremental (bool): Only fetch changed files.
+            delete (bool): Remove local files that no longer exist on the device.
+            max_workers (int): Parallel workers of the per-file fallback.
+
+        Returns:
+            List[str]: The relative paths fetched.
+        """
+        ldir = os.path.expanduser(ldir)
+        manifest_path = os.path.join(ldir, SYNC_MANIFEST)
+        manifest: Dict[str, List[int]] = {}
+        if incremental and os.path.isfile(manifest_path):
+            try:
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = {}
+
+        remote = self.list_files(rdir)
+        changed = [rel for rel, stat in remote.items()
+                   if list(stat) != manifest.get(rel)
+                   or not os.path.isfile(os.path.join(ldir, *rel.split("/")))]
+        fetched = self.pull_dir(rdir, ldir, changed, max_workers=max_workers)
+
+        if delete:
+            for rel in set(manifest) - set(remote):
+                lpath = os.path.join(ldir, *rel.split("/"))
+                if os.path.isfile(lpath):
+                    os.remove(lpath)
+
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump({rel: list(stat) for rel, stat in remote.items()}, f)
+        logger.debug(f"sync {rdir} -> {ldir}: {len(fetched)}/{len(remote)} file(s) fetched")
+        return fetched
+
+    def md5sums(self, rpaths: List[str]) -> Dict[str, str]:
+        """Get the MD5 checksums of many remote files with one shell call, missing files are left out."""
+        if not rpaths:
+            return {}
+        return _parse_md5sums(self.shell(_md5sum_command(rpaths), error_raise=False).output)
+
+    def md5sum(self, rpath: str) -> Union[str, None]:
+        """Get the MD5 checksum of a remote file, None if it does not exist."""
+        return self.md5sums([rpath]).get(rpath)
+
+    def shell(self, cmd: str, error_raise=True, timeout: Optional[float] = _runner.DEFAULT_TIMEOUT,
+              on_output: Optional[Callable[[bytes], None]] = None) -> CommandResult:
+        """
+        Run a command in the device shell, passed to hdc as one argument.
+
+        Args:
+            cmd (str): The device shell command line, surrounding double quotes are dropped.
+            error_raise (bool): Raise HdcError when the command fails.
+            timeout (Optional[float]): Deadline in seconds, None for no deadline.
+            on_output (Optional[Callable[[bytes], None]]): Called with the stdout chunks as they arrive,
+                                                           e.g. for hilog or long running scripts.
+        """
+        if len(cmd) > 1 and cmd[0] == '"' and cmd[-1] == '"':
+            cmd = cmd[1:-1]
+        result = _execute_command(self._args("shell", cmd), timeout, on_output)
         if result.exit_code != 0 and error_raise:
             raise HdcError("HDC shell error", f"{cmd}\n{result.output}\n{result.error}")
         return result
 
     def uninstall(self, bundlename: str):
-        result = _execute_command(f"{self.hdc_prefix} -t {self.serial} uninstall {bundlename}")
+        result = _execute_command(self._args("uninstall", bundlename))
         if result.exit_code != 0:
             raise HdcError("HDC uninstall error", result.output)
         return result
 
-    def install(self, apkpath: str):
-        # Ensure the path is properly quoted for Windows
-        quoted_path = f'"{apkpath}"'
-
-        result = _execute_command(f"{self.hdc_prefix} -t {self.serial} install {quoted_path}")
+    def install(self, apkpath: str, timeout: Optional[float] = None):
+        result = _execute_command(self._args("install", os.path.expanduser(apkpath)), timeout)
         if result.exit_code != 0:
             raise HdcError("HDC install error", result.error)
         return result
@@ -204,6 +466,30 @@ class HdcWrapper:
         matches = re.findall(r'inet addr:(?!127)(\d+\.\d+\.\d+\.\d+)', data)
         return matches[0] if matches else None
 
+    def get_params(self, keys: Union[List[str], None] = None) -> Dict[str, str]:
+        """
+        Read system parameters with a single hdc call.
+
+        Args:
+            keys: Parameter names to read. None dumps every parameter with `param get`.
+
+        Returns:
+            Dict[str, str]: parameter name -> value
+        """
+        if keys is None:
+            data = self.shell("param get", error_raise=False).output
+            params = {}
+            for line in data.splitlines():
+                key, sep, value = line.partition("=")
+                if sep and key.strip():
+                    params[key.strip()] = value.strip()
+            return params
+
+        # `param get <key>` prints one line per key, run them all in one shell
+        data = self.shell("; ".join(f"param get {k}" for k in keys), error_raise=False).output
+        values = data.splitlines()
+        return {k: v.strip() for k, v in zip(keys, values) if "fail" not in v.lower()}
+
     def __split_text(self, text: str) -> str:
         return text.split("\n")[0].strip() if text else None
 
@@ -241,7 +527,8 @@ class HdcWrapper:
             return (w, h)
         return (0, 0)
 
-    def send_key(self, key_code: Union[KeyCode, int]) -> None:
+    def send_key(self, key_code: Union["KeyCode", int]) -> None:
+        from .proto import KeyCode
         if isinstance(key_code, KeyCode):
             key_code = key_code.value
 
@@ -260,6 +547,33 @@ class HdcWrapper:
     def input_text(self, x: int, y: int, text: str):
         self.shell(f"uitest uiInput inputText {x} {y} {text}")
 
+    def screenshot_bytes(self) -> bytes:
+        """
+        Take a screenshot and return the JPEG bytes with one hdc call.
+
+        The shot is streamed as base64 on stdout (hdc shell is not binary safe) instead of the
+        snapshot -> file recv -> rm round trip, falling back to it if the device output is unusable.
+        """
+        _tmp_path = f"/data/local/tmp/_tmp_{uuid.uuid4().hex}.jpeg"
+        result = self.shell(f"snapshot_display -f {_tmp_path} >/dev/null && base64 {_tmp_path}; rm -f {_tmp_path}",
+                            error_raise=False)
+        try:
+            data = base64.b64decode(result.output)
+        except (ValueError, TypeError):
+            data = b""
+        if data[:2] == b"\xff\xd8":
+            return data
+
+        logger.debug("base64 screenshot failed, fall back to file recv")
+        fd, lpath = tempfile.mkstemp(suffix=".jpeg")
+        os.close(fd)
+        try:
+            self.screenshot(lpath)
+            with open(lpath, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(lpath)
+
     def screenshot(self, path: str) -> str:
         _uuid = uuid.uuid4().hex
         _tmp_path = f"/data/local/tmp/_tmp_{_uuid}.jpeg"
@@ -269,24 +583,24 @@ class HdcWrapper:
         return path
 
     def dump_hierarchy(self) -> Dict:
+        with metrics.timer("hierarchy.dump"):
+            hierarchy = self._dump_hierarchy()
+        if _record.active is not None:
+            _record.active.hierarchy(hierarchy)
+        return hierarchy
+
+    def _dump_hierarchy(self) -> Dict:
         _tmp_path = f"/data/local/tmp/{uuid.uuid4().hex}.json"
-        cmd = f"hdc -t {self.serial} shell uitest dumpLayout -p {_tmp_path}"
-        os.popen(cmd).readlines()  # 获取当前xml
-        cmd = f'hdc -t {self.serial} shell cat {_tmp_path}'
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE, shell=True)
-        output, error = process.communicate()
-        output = output.decode('utf-8')
-        error = error.decode('utf-8')
+        # dump, read back and remove in one hdc call; the raw output is used, layout text may contain "error:"
+        output, error, _ = _runner.run(self._args(
+            "shell", f"uitest dumpLayout -p {_tmp_path} > /dev/null && cat {_tmp_path}; rm -f {_tmp_path}"))
         if output:
-            self.shell(f"rm -rf {_tmp_path}")
             try:
                 return json.loads(output)
             except Exception as e:
                 logger.error(f"Error loading JSON file: {e}")
                 return {}
         else:
-            self.shell(f"rm -rf {_tmp_path}")
             return {}  # 当解析失败时返回空字典，避免json解析异常
 
         # with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as f:
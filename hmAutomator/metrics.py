@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+"""
+Process-wide counters and latency histograms.
+
+Counters (reconnects, retries, bytes...) are always kept. The latency instrumentation of the hot paths
+(hdc commands, RPC calls, JSON decode, dump_hierarchy, find_component, @delay) only runs when enabled,
+so that it costs a single attribute check otherwise:
+
+    from hmAutomator import metrics
+    metrics.enable()                 # or env HMAT_METRICS=1
+    ...
+    print(metrics.to_prometheus())   # or metrics.to_json()
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+
+# instrument the hot paths, see `enable`
+enabled: bool = bool(os.getenv("HMAT_METRICS"))
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_lock = threading.Lock()
+_counters: Dict[_Key, float] = defaultdict(int)
+_histograms: Dict[_Key, "Histogram"] = {}
+
+# Prometheus `le` bounds (seconds) the histograms are exported with
+EXPORT_BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def enable(on: bool = True) -> None:
+    """Turn the latency instrumentation of the hot paths on or off."""
+    global enabled
+    enabled = on
+
+
+def _key(name: str, labels: Dict[str, str]) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items())) if labels else ()
+
+
+def _format_key(key: _Key) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    """
+    Log-linear (HDR style) histogram: every power of two is split into SUB_BUCKETS buckets,
+    so any recorded value is known within ~9% whatever its magnitude, in constant memory.
+    """
+    SUB_BUCKETS = 8
+    MIN_VALUE = 1e-6  # values below go to the first bucket
+
+    __slots__ = ("buckets", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value <= self.MIN_VALUE:
+            return 0
+        return int(math.log2(value / self.MIN_VALUE) * self.SUB_BUCKETS) + 1
+
+    def _upper(self, index: int) -> float:
+        return self.MIN_VALUE * 2 ** (index / self.SUB_BUCKETS)
+
+    def record(self, value: float):
+        self.buckets[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (q in [0, 100])."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self._upper(index), self.max)
+        return self.max
+
+    def cumulative(self, bounds=EXPORT_BOUNDS) -> List[Tuple[float, int]]:
+        """(le, count of values <= le) for every bound, bucket upper bounds decide the side."""
+        items = sorted((self._upper(index), n) for index, n in self.buckets.items())
+        result, seen, i = [], 0, 0
+        for bound in bounds:
+            while i < len(items) and items[i][0] <= bound * (1 + 1e-9):
+                seen += items[i][1]
+                i += 1
+            result.append((bound, seen))
+        return result
+
+    def summary(self) -> Dict[str, float]:
+        if not self.count:
+            return {"count": 0, "total": 0.0, "min": 0.0, "max": 0.0, "avg": 0.0, "p50": 0.0, "p90": 0.0, "p99": 0.0}
+        return {"count": self.count, "total": self.total, "min": self.min, "max": self.max,
+                "avg": self.total / self.count, "p50": self.percentile(50),
+                "p90": self.percentile(90), "p99": self.percentile(99)}
+
+
+def incr(name: str, value: float = 1, **labels) -> None:
+    """Increase the counter `name` by `value`."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] += value
+
+
+def get(name: str, **labels) -> float:
+    """Return the current value of counter `name`, 0 if never incremented."""
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def snapshot() -> Dict[str, float]:
+    """Return a copy of all counters, labelled ones as 'name{label="value"}'."""
+    with _lock:
+        return {_format_key(key): value for key, value in _counters.items()}
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record one sample (e.g. a duration in seconds) of `name`."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.record(value)
+
+
+def histogram(name: str, **labels) -> Optional[Histogram]:
+    with _lock:
+        return _histograms.get(_key(name, labels))
+
+
+def timings() -> Dict[str, Dict[str, float]]:
+    """Return {name: {"count", "total", "min", "max", "avg", "p50", "p90", "p99"}} of all observed samples."""
+    with _lock:
+        return {_format_key(key): h.summary() for key, h in _histograms.items()}
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name: str, labels: Dict[str, str]):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name: str, **labels):
+    """Context manager observing the duration of the block, a no-op while the instrumentation is disabled."""
+    if not enabled:
+        return _NULL_TIMER
+    return _Timer(name, labels)
+
+
+def to_json(indent: Optional[int] = None) -> str:
+    """Export counters and histogram summaries as JSON."""
+    return json.dumps({"counters": snapshot(), "histograms": timings()}, indent=indent)
+
+
+def _prom_name(name: str) -> str:
+    return "hmat_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def _prom_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    items = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        items.append(extra)
+    return "{" + ",".join(items) + "}" if items else ""
+
+
+def to_prometheus() -> str:
+    """Export counters and histograms in the Prometheus text format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, h.cumulative(), h.count, h.total) for key, h in _histograms.items())
+    lines, typed = [], set()
+    for (name, labels), value in counters:
+        metric = _prom_name(name) + "_total"
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_prom_labels(labels)} {value}")
+    for (name, labels), buckets, count, total in histograms:
+        metric = _prom_name(name)
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        for bound, n in buckets + [("+Inf", count)]:
+            le = 'le="%s"' % bound
+            lines.append(f"{metric}_bucket{_prom_labels(labels, le)} {n}")
+        lines.append(f"{metric}_sum{_prom_labels(labels)} {total}")
+        lines.append(f"{metric}_count{_prom_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""
+Record/replay harness: run the whole stack (hdc, uitest RPC, capture stream) without a device.
+
+Record a session on a real device:
+
+    from hmAutomator import testing
+    with testing.record("login.session.jsonl"):
+        d = Driver("FMR0223C13000649")
+        d(text="登录").click()
+
+Replay it on a plain Linux box (no hdc, no device):
+
+    with testing.FakeDevice("login.session.jsonl", latency=0.005) as device:
+        d = Driver(device.serial)
+        d(text="登录").click()
+"""
+
+import os
+import shutil
+import tempfile
+import contextlib
+from typing import Optional
+
+from .. import _record
+from .session import Session
+from .mock_server import MockUitestServer, blank_frame
+from .fake_hdc import FakeHdc, DEFAULT_SERIAL, install as install_fake_hdc
+
+
+@contextlib.contextmanager
+def record(path: str):
+    """Record every RPC request/reply, hdc command, hierarchy dump and capture frame of the block to `path`."""
+    recorder = _record.start(path)
+    try:
+        yield recorder
+    finally:
+        _record.stop()
+
+
+class FakeDevice:
+    """
+    A `MockUitestServer` plus the fake `hdc` first on PATH, for the duration of a with block.
+
+    Args:
+        session_path (Optional[str]): Recorded session to replay, None for the neutral defaults only.
+        serial (str): Serial of the fake device.
+        latency (float): Seconds the mock server waits before each RPC reply.
+        fps (float): Frame rate of the capture stream.
+        workdir (Optional[str]): Where the launcher and the device file system go, a temp dir by default.
+    """
+    def __init__(self, session_path: Optional[str] = None, serial: str = DEFAULT_SERIAL,
+                 latency: float = 0.0, fps: float = 30, workdir: Optional[str] = None):
+        self.session_path = session_path
+        self.serial = serial
+        session = Session.load(session_path) if session_path else None
+        self.server = MockUitestServer(session, latency=latency, fps=fps)
+        self._workdir = workdir
+        self._tmpdir: Optional[str] = None
+        self._saved_path: Optional[str] = None
+
+    @property
+    def root(self) -> str:
+        """Local directory standing in for the device file system."""
+        return os.path.join(self.workdir, "device", self.serial)
+
+    def __enter__(self) -> "FakeDevice":
+        if self._workdir is None:
+            self._tmpdir = tempfile.mkdtemp(prefix="hmat_fake_")
+        self.workdir = self._workdir or self._tmpdir
+        self.server.start()
+        bin_dir = os.path.join(self.workdir, "bin")
+        install_fake_hdc(bin_dir, self.server.control_port, self.serial,
+                         os.path.join(self.workdir, "device"), self.session_path)
+        self._saved_path = os.environ.get("PATH", "")
+        os.environ["PATH"] = bin_dir + os.pathsep + self._saved_path
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        os.environ["PATH"] = self._saved_path
+        self.server.stop()
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+
+__all__ = ["record", "Session", "MockUitestServer", "FakeHdc", "FakeDevice", "install_fake_hdc", "blank_frame"]
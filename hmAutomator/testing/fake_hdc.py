@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fake `hdc` executable for running the whole stack without a device.
+
+`install()` writes an `hdc` launcher script that runs this module; put its directory first on PATH.
+Answers `list targets`, `fport`, `file send/recv`, `install/uninstall` and `shell`. Shell commands are
+looked up in the recorded session first, then emulated on a directory standing in for the device
+file system (md5sum, base64, cat, rm, tar, snapshot_display, uitest dumpLayout, param get, bm, hidumper...).
+Every `fport` opens the forwarded port on the `MockUitestServer` given by its control port.
+
+Configuration is read from the environment, set by the launcher:
+    HMAT_FAKE_HDC_SERIAL    serial(s) of the fake device, comma separated
+    HMAT_FAKE_HDC_ROOT      directory holding the device file system of each serial
+    HMAT_FAKE_HDC_CONTROL   control port of the MockUitestServer
+    HMAT_FAKE_HDC_SESSION   recorded session file (optional)
+"""
+
+import os
+import sys
+import json
+import stat
+import shlex
+import base64
+import shutil
+import socket
+import hashlib
+import tarfile
+from typing import Dict, List, Optional, Tuple
+
+from .session import Session
+from .mock_server import blank_frame
+
+DEFAULT_SERIAL = "FAKE0000000001"
+
+ENV_SERIAL = "HMAT_FAKE_HDC_SERIAL"
+ENV_ROOT = "HMAT_FAKE_HDC_ROOT"
+ENV_CONTROL = "HMAT_FAKE_HDC_CONTROL"
+ENV_SESSION = "HMAT_FAKE_HDC_SESSION"
+
+DISPLAY_SIZE = (1260, 2720)
+
+DEFAULT_PARAMS = {
+    "const.product.model": "FAKE-AL00",
+    "const.product.brand": "FAKE",
+    "const.product.name": "Fake Device",
+    "const.product.cpu.abilist": "arm64-v8a",
+    "const.ohos.apiversion": "12",
+    "const.product.software.version": "FAKE 5.0.0.100",
+}
+
+# {"attributes": ...} of the layout dumped when the session recorded none
+DEFAULT_HIERARCHY = {
+    "attributes": {"bounds": "[0,0][1260,2720]", "type": "root", "id": "", "key": "", "text": "",
+                   "description": "", "clickable": "false", "enabled": "true"},
+    "children": [],
+}
+
+_REDIRECTIONS = (">", "2>", "1>", "&>")
+
+Result = Tuple[str, int]
+
+
+class FakeHdc:
+    def __init__(self, serial: str, root: str, control_port: Optional[int] = None,
+                 session: Optional[Session] = None):
+        self.serial = serial
+        self.root = os.path.join(root, serial)
+        self.control_port = control_port
+        self.session = session or Session()
+
+    # -- device file system --
+
+    def local(self, rpath: str) -> str:
+        return os.path.join(self.root, rpath.lstrip("/"))
+
+    def _read(self, rpath: str) -> Optional[bytes]:
+        path = self.local(rpath)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _write(self, rpath: str, data: bytes):
+        path = self.local(rpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    # -- control port of the mock server --
+
+    def _control(self, request: Dict) -> Dict:
+        if self.control_port is None:
+            return {"ok": False, "error": "no mock uitest server"}
+        with socket.create_connection(("127.0.0.1", self.control_port), timeout=5) as sock:
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+        return json.loads(data)
+
+    # -- hdc sub commands --
+
+    def run(self, args: List[str]) -> Result:
+        recorded = self._recorded(args)
+        if recorded is not None:
+            return recorded
+        if not args:
+            return "", 0
+        command, rest = args[0], args[1:]
+        if command in ("version", "-v"):
+            return "Ver: 3.1.0a (fake)", 0
+        if command == "fport":
+            return self.fport(rest)
+        if command == "file" and len(rest) == 3 and rest[0] in ("send", "recv"):
+            src, dst = rest[1], rest[2]
+            if rest[0] == "send":
+                return self.file_send(src, dst)
+            return self.file_recv(src, dst)
+        if command == "install":
+            return "install bundle successfully.", 0
+        if command == "uninstall":
+            return "uninstall bundle successfully.", 0
+        if command == "shell":
+            return self.shell(" ".join(rest))
+        return f"[Fail]Unknown command: {' '.join(args)}", 1
+
+    def _recorded(self, args: List[str]) -> Optional[Result]:
+        keys = [" ".join(args)]
+        if args and args[0] == "shell":
+            keys.append('shell "' + " ".join(args[1:]) + '"')
+        for key in keys:
+            entry = self.session.hdc(key)
+            if entry is not None:
+                return (entry.get("output") or "") + (entry.get("error") or ""), entry.get("exit_code", 0)
+        return None
+
+    def fport(self, args: List[str]) -> Result:
+        if args == ["ls"]:
+            ports = self._control({"op": "list"}).get("ports", [])
+            if not ports:
+                return "[Empty]", 0
+            return "\n".join(f"{self.serial}    tcp:{port} tcp:8012    [Forward]" for port in ports), 0
+        if args and args[0] == "rm":
+            lport = int(args[1].split(":")[1])
+            self._control({"op": "close", "port": lport})
+            return f"Remove forward ruler success, ruler:tcp:{lport} {args[2]}", 0
+        lport = int(args[0].split(":")[1])
+        reply = self._control({"op": "listen", "port": lport})
+        if not reply.get("ok"):
+            return f"[Fail]Forward tcp:{lport} failed: {reply.get('error')}", 1
+        return "Forwardport result:OK", 0
+
+    def file_send(self, lpath: str, rpath: str) -> Result:
+        if not os.path.isfile(lpath):
+            return f"[Fail]Error opening file: no such file or directory, path:{lpath}", 1
+        with open(lpath, "rb") as f:
+            data = f.read()
+        self._write(rpath, data)
+        return f"FileTransfer finish, Size:{len(data)}, File count = 1, time:1ms rate:0.00kB/s", 0
+
+    def file_recv(self, rpath: str, lpath: str) -> Result:
+        data = self._read(rpath)
+        if data is None:
+            return f"[Fail]Error opening file: no such file or directory, path:{rpath}", 1
+        if os.path.isdir(lpath):
+            lpath = os.path.join(lpath, os.path.basename(rpath))
+        with open(lpath, "wb") as f:
+            f.write(data)
+        return f"FileTransfer finish, Size:{len(data)}, File count = 1, time:1ms rate:0.00kB/s", 0
+
+    # -- device shell --
+
+    def shell(self, cmdline: str) -> Result:
+        lexer = shlex.shlex(cmdline, posix=True, punctuation_chars=";&|")
+        lexer.whitespace_split = True
+        try:
+            tokens = list(lexer)
+        except ValueError as e:
+            return f"/bin/sh: {e}", 2
+
+        outputs, status, operator, words = [], 0, ";", []
+        # redirections are dropped, a redirected stdout discards the output
+        discard, target = False, False
+        for token in tokens + [";"]:
+            if token not in (";", "&&", "||"):
+                if target:
+                    target = False
+                elif token.startswith(_REDIRECTIONS):
+                    discard = discard or not token.startswith("2>")
+                    target = token in _REDIRECTIONS
+                else:
+                    words.append(token)
+                continue
+            if words and (operator == ";" or (operator == "&&") == (status == 0)):
+                output, status = self.simple_command(words)
+                if output and not discard:
+                    outputs.append(output)
+            operator, words, discard, target = token, [], False, False
+        return "\n".join(outputs), status
+
+    def simple_command(self, words: List[str]) -> Result:
+        name, args = words[0], words[1:]
+        handler = getattr(self, "cmd_" + name.replace("-", "_"), None)
+        if name == "[":
+            handler = self.cmd_test
+        if handler is None:
+            return "", 0
+        return handler(args)
+
+    def cmd_test(self, args: List[str]) -> Result:
+        args = [a for a in args if a != "]"]
+        if len(args) == 2:
+            path = self.local(args[1])
+            checks = {"-f": os.path.isfile, "-d": os.path.isdir, "-e": os.path.exists}
+            return "", 0 if checks.get(args[0], os.path.exists)(path) else 1
+        return "", 1
+
+    def cmd_echo(self, args: List[str]) -> Result:
+        return " ".join(args), 0
+
+    def cmd_cat(self, args: List[str]) -> Result:
+        outputs = []
+        for rpath in args:
+            data = self._read(rpath)
+            if data is None:
+                return f"cat: {rpath}: No such file or directory", 1
+            outputs.append(data.decode("utf-8", "replace"))
+        return "".join(outputs), 0
+
+    def cmd_rm(self, args: List[str]) -> Result:
+        for rpath in (a for a in args if not a.startswith("-")):
+            path = self.local(rpath)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+        return "", 0
+
+    def cmd_mkdir(self, args: List[str]) -> Result:
+        for rpath in (a for a in args if not a.startswith("-")):
+            os.makedirs(self.local(rpath), exist_ok=True)
+        return "", 0
+
+    def cmd_md5sum(self, args: List[str]) -> Result:
+        lines = []
+        for rpath in args:
+            data = self._read(rpath)
+            if data is not None:
+                lines.append(f"{hashlib.md5(data).hexdigest()}  {rpath}")
+        return "\n".join(lines), 0 if len(lines) == len(args) else 1
+
+    def cmd_base64(self, args: List[str]) -> Result:
+        data = self._read(args[-1]) if args else None
+        if data is None:
+            return "", 1
+        return base64.encodebytes(data).decode("ascii").strip(), 0
+
+    def cmd_find(self, args: List[str]) -> Result:
+        top = self.local(args[0]) if args else self.root
+        lines = []
+        for dirpath, _, filenames in os.walk(top):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                rpath = "/" + os.path.relpath(path, self.root)
+                st = os.stat(path)
+                lines.append(f"{st.st_size} {int(st.st_mtime)} {rpath}" if "stat" in args else rpath)
+        return "\n".join(lines), 0
+
+    def cmd_tar(self, args: List[str]) -> Result:
+        if "-cf" not in args or "-C" not in args:
+            return "tar: only `tar -cf <file> -C <dir> <names>` is emulated", 1
+        rtar, rdir = args[args.index("-cf") + 1], args[args.index("-C") + 1]
+        names = args[args.index("-C") + 2:]
+        top = self.local(rdir)
+        if not os.path.isdir(top):
+            return f"tar: {rdir}: No such file or directory", 1
+        os.makedirs(os.path.dirname(self.local(rtar)), exist_ok=True)
+        with tarfile.open(self.local(rtar), "w") as tar:
+            for name in names:
+                tar.add(os.path.join(top, name), arcname=name)
+        return "", 0
+
+    def cmd_snapshot_display(self, args: List[str]) -> Result:
+        rpath = args[args.index("-f") + 1] if "-f" in args else "/data/local/tmp/snapshot.jpeg"
+        frame = self.session.frames[-1] if self.session.frames else blank_frame(*DISPLAY_SIZE)
+        self._write(rpath, frame)
+        return f"success: snapshot display 0 , write to {rpath} as jpeg, width {DISPLAY_SIZE[0]}, " \
+               f"height {DISPLAY_SIZE[1]}", 0
+
+    def cmd_uitest(self, args: List[str]) -> Result:
+        if args and args[0] == "dumpLayout":
+            rpath = args[args.index("-p") + 1] if "-p" in args else "/data/local/tmp/layout.json"
+            hierarchy = self.session.hierarchy() or DEFAULT_HIERARCHY
+            self._write(rpath, json.dumps(hierarchy, ensure_ascii=False).encode("utf-8"))
+            return f"DumpLayout saved to:{rpath}", 0
+        if args and args[0] == "start-daemon":
+            return "Start Daemon Success", 0
+        return "No Error", 0
+
+    def cmd_param(self, args: List[str]) -> Result:
+        if args[1:]:
+            value = DEFAULT_PARAMS.get(args[1])
+            return (value, 0) if value is not None else (f"get parameter {args[1]} fail! errNum is:106!", 1)
+        return "\n".join(f"{k} = {v}" for k, v in DEFAULT_PARAMS.items()), 0
+
+    def cmd_bm(self, args: List[str]) -> Result:
+        if args[:1] == ["install"]:
+            return "install bundle successfully.", 0
+        if args[:1] == ["clean"]:
+            return "clean bundle data files successfully.", 0
+        if args[:2] == ["dump", "-a"]:
+            return "ID: 100:\n\tcom.example.fake", 0
+        return "", 0
+
+    def cmd_aa(self, args: List[str]) -> Result:
+        if args[:1] == ["start"]:
+            return "start ability successfully.", 0
+        if args[:1] == ["force-stop"]:
+            return "force stop process successfully.", 0
+        return "", 0
+
+    def cmd_hidumper(self, args: List[str]) -> Result:
+        if "RenderService" in args:
+            return f"activeMode: {DISPLAY_SIZE[0]}x{DISPLAY_SIZE[1]}, refreshrate=60", 0
+        if "PowerManagerService" in args:
+            return "Current State: AWAKE", 0
+        return "", 0
+
+
+def install(bin_dir: str, control_port: Optional[int], serial: str = DEFAULT_SERIAL,
+            root: Optional[str] = None, session_path: Optional[str] = None) -> str:
+    """
+    Write an `hdc` launcher for the fake into `bin_dir` (POSIX shells only).
+
+    Args:
+        bin_dir (str): Directory to put first on PATH.
+        control_port (Optional[int]): `MockUitestServer.control_port`, None if `fport` is not needed.
+        serial (str): Serial(s) answered by `list targets`, comma separated.
+        root (Optional[str]): Device file system directory, `bin_dir`/device by default.
+        session_path (Optional[str]): Recorded session replayed for shell commands.
+
+    Returns:
+        str: Path of the launcher.
+    """
+    os.makedirs(bin_dir, exist_ok=True)
+    root = root or os.path.join(bin_dir, "device")
+    package_parent = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = {ENV_SERIAL: serial, ENV_ROOT: os.path.abspath(root)}
+    if control_port is not None:
+        env[ENV_CONTROL] = str(control_port)
+    if session_path:
+        env[ENV_SESSION] = os.path.abspath(session_path)
+    lines = ["#!/bin/sh"]
+    lines += [f"export {k}={shlex.quote(v)}" for k, v in env.items()]
+    lines.append(f"export PYTHONPATH={shlex.quote(package_parent)}${{PYTHONPATH:+:$PYTHONPATH}}")
+    # not `-m`: the package __init__ already imports this module
+    entry = "import sys; from hmAutomator.testing.fake_hdc import main; sys.exit(main())"
+    lines.append(f'exec {shlex.quote(sys.executable)} -c {shlex.quote(entry)} "$@"')
+    path = os.path.join(bin_dir, "hdc")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = list(sys.argv[1:] if argv is None else argv)
+    serials = [s for s in os.getenv(ENV_SERIAL, DEFAULT_SERIAL).split(",") if s]
+    if args[:1] == ["-s"]:
+        args = args[2:]  # the host:port of a remote hdc server means nothing here
+    if args[:2] == ["list", "targets"]:
+        print("\n".join(serials) if serials else "[Empty]")
+        return 0
+    serial = serials[0] if serials else DEFAULT_SERIAL
+    if args[:1] == ["-t"]:
+        serial, args = args[1], args[2:]
+        if serial not in serials:
+            print("[Fail]ExecuteCommand need connect-key? please confirm a device by help info")
+            return 1
+    session_path = os.getenv(ENV_SESSION)
+    control = os.getenv(ENV_CONTROL)
+    fake = FakeHdc(serial, os.getenv(ENV_ROOT, os.path.join(os.getcwd(), "fake_device")),
+                   int(control) if control else None,
+                   Session.load(session_path) if session_path else None)
+    output, status = fake.run(args)
+    if output:
+        print(output)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
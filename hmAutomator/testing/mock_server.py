@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import socket
+import itertools
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .. import logger
+from .session import Session
+
+
+def blank_frame(width: int, height: int) -> bytes:
+    """A minimal JPEG (SOI, baseline frame header, EOI) whose header reports width x height."""
+    sof = b"\xff\xc0\x00\x11\x08" + height.to_bytes(2, "big") + width.to_bytes(2, "big") \
+        + b"\x03\x01\x22\x00\x02\x11\x01\x03\x11\x01"
+    return b"\xff\xd8" + sof + b"\xff\xd9"
+
+
+class MockUitestServer:
+    """
+    Local stand-in for the uitest daemon: speaks the newline-JSON callHypiumApi and Captures protocol
+    on TCP ports of 127.0.0.1 and replays a recorded `Session`.
+
+    The fake hdc (`hmAutomator.testing.fake_hdc`) opens a uitest port here for every `hdc fport`,
+    through a control port speaking one JSON object per line:
+        {"op": "listen", "port": 10001}   {"op": "close", "port": 10001}   {"op": "list"}
+
+    Calls missing from the session get neutral replies: "Driver#0" for Driver.create, a new "On#n"
+    for On.*, the configured display size for Driver.getDisplaySize and null otherwise.
+    """
+    def __init__(self, session: Optional[Session] = None, latency: float = 0.0, fps: float = 30,
+                 display_size: Tuple[int, int] = (1260, 2720)):
+        """
+        Args:
+            session (Optional[Session]): Recorded replies, hierarchies and frames, empty by default.
+            latency (float): Seconds waited before each reply.
+            fps (float): Frame rate of the capture stream.
+            display_size (Tuple[int, int]): (width, height) reported when the session has none.
+        """
+        self.session = session or Session()
+        self.latency = latency
+        self.fps = fps
+        self.display_size = display_size
+        self.control_port: Optional[int] = None
+        self.requests: List[Dict] = []  # every request received, for assertions
+        self._lock = threading.Lock()
+        self._listeners: Dict[int, socket.socket] = {}
+        self._connections: List[socket.socket] = []
+        self._control: Optional[socket.socket] = None
+        self._stop_event = threading.Event()
+        self._objects = itertools.count()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self) -> "MockUitestServer":
+        self._stop_event.clear()
+        self._control = self._bind(0)
+        self.control_port = self._control.getsockname()[1]
+        self._spawn(self._accept_loop, self._control, self._serve_control)
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        with self._lock:
+            socks = list(self._listeners.values()) + self._connections + [self._control]
+            self._listeners.clear()
+            self._connections.clear()
+        for sock in socks:
+            self._close(sock)
+
+    @staticmethod
+    def _bind(port: int) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", port))
+        sock.listen(16)
+        return sock
+
+    @staticmethod
+    def _close(sock: Optional[socket.socket]):
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+    @staticmethod
+    def _spawn(target, *args):
+        threading.Thread(target=target, args=args, name="hmat-mock-uitest", daemon=True).start()
+
+    def listen(self, port: int = 0) -> int:
+        """Accept uitest connections on `port` (0 picks a free one), returns the port."""
+        with self._lock:
+            if port in self._listeners:
+                return port
+        sock = self._bind(port)
+        port = sock.getsockname()[1]
+        with self._lock:
+            self._listeners[port] = sock
+        self._spawn(self._accept_loop, sock, self._serve_uitest)
+        return port
+
+    def close_port(self, port: int):
+        with self._lock:
+            sock = self._listeners.pop(port, None)
+        self._close(sock)
+
+    def disconnect(self):
+        """Drop every open connection, like a killed uitest daemon. The ports keep accepting."""
+        with self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        for conn in connections:
+            self._close(conn)
+
+    def ports(self) -> List[int]:
+        with self._lock:
+            return sorted(self._listeners)
+
+    def _accept_loop(self, listener: socket.socket, handler):
+        while not self._stop_event.is_set():
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            with self._lock:
+                self._connections.append(conn)
+            self._spawn(handler, conn)
+
+    @staticmethod
+    def _lines(conn: socket.socket):
+        buffer = b""
+        while True:
+            try:
+                chunk = conn.recv(65536)
+            except OSError:
+                return
+            if not chunk:
+                return
+            buffer += chunk
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                if line.strip():
+                    yield line
+
+    def _serve_control(self, conn: socket.socket):
+        for line in self._lines(conn):
+            request = json.loads(line)
+            op = request.get("op")
+            try:
+                if op == "listen":
+                    reply = {"ok": True, "port": self.listen(int(request["port"]))}
+                elif op == "close":
+                    self.close_port(int(request["port"]))
+                    reply = {"ok": True}
+                elif op == "list":
+                    reply = {"ok": True, "ports": self.ports()}
+                else:
+                    reply = {"ok": False, "error": f"unknown op {op}"}
+            except OSError as e:
+                reply = {"ok": False, "error": str(e)}
+            conn.sendall(json.dumps(reply).encode() + b"\n")
+        self._close(conn)
+
+    def _serve_uitest(self, conn: socket.socket):
+        streaming: Optional[threading.Event] = None
+        write_lock = threading.Lock()
+        for line in self._lines(conn):
+            try:
+                message = json.loads(line)
+            except ValueError:
+                logger.debug(f"mock uitest: drop undecodable request {line[:100]!r}")
+                continue
+            with self._lock:
+                self.requests.append(message)
+            params = message.get("params", {})
+            if message.get("method") == "Captures":
+                if params.get("api") == "startCaptureScreen" and streaming is None:
+                    streaming = threading.Event()
+                    self._send(conn, write_lock, {"result": "true"})
+                    self._spawn(self._stream_frames, conn, write_lock, streaming)
+                    continue
+                if streaming is not None:
+                    streaming.set()
+                    streaming = None
+                self._send(conn, write_lock, {"result": "true"})
+                continue
+            if self.latency:
+                time.sleep(self.latency)
+            self._send(conn, write_lock, self._reply(params.get("api"), params.get("this"), params.get("args", [])))
+        if streaming is not None:
+            streaming.set()
+        self._close(conn)
+
+    @staticmethod
+    def _send(conn: socket.socket, write_lock: threading.Lock, reply: Dict):
+        with write_lock:
+            try:
+                conn.sendall(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+            except OSError:
+                pass
+
+    def _reply(self, api: str, this: Optional[str], args: List) -> Dict:
+        with self._lock:
+            reply = self.session.reply(api, this, args)
+        if reply is not None:
+            reply = dict(reply)
+            # the ids of the recorded requests mean nothing to this client
+            reply.pop("request_id", None)
+            return reply
+        if api == "Driver.create":
+            return {"result": "Driver#0"}
+        if api.startswith("On."):
+            return {"result": f"On#{next(self._objects)}"}
+        if api == "Driver.getDisplaySize":
+            return {"result": {"x": self.display_size[0], "y": self.display_size[1]}}
+        if api == "Driver.getDisplayRotation":
+            return {"result": 0}
+        if api == "Driver.getRecentUiEvent" and args:
+            # the device blocks until an event arrives or the timeout, never return busy
+            self._stop_event.wait(min(float(args[0]), 1.0))
+        return {"result": None}
+
+    def _stream_frames(self, conn: socket.socket, write_lock: threading.Lock, stopped: threading.Event):
+        frames = self.session.frames or [blank_frame(*self.display_size)]
+        interval = 1.0 / self.fps if self.fps > 0 else 0
+        for frame in itertools.cycle(frames):
+            if stopped.is_set() or self._stop_event.is_set():
+                return
+            with write_lock:
+                try:
+                    conn.sendall(frame)
+                except OSError:
+                    return
+            stopped.wait(interval)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import json
+import base64
+import collections
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+def _args_key(args: Any) -> str:
+    return json.dumps(args, sort_keys=True, ensure_ascii=False)
+
+
+class Session:
+    """
+    A recorded session (see `hmAutomator.testing.record`) loaded for replay.
+
+    Replies are served in recording order per (api, this, args); once the recorded ones are used up
+    the last is repeated. Calls never recorded with these args fall back to the replies of the same api.
+    """
+    def __init__(self, entries: Optional[List[Dict]] = None):
+        self._replies: Dict[Tuple, Deque[Dict]] = collections.defaultdict(collections.deque)
+        self._api_replies: Dict[str, Deque[Dict]] = collections.defaultdict(collections.deque)
+        self._last: Dict[Tuple, Dict] = {}
+        self._hdc: Dict[str, Deque[Dict]] = collections.defaultdict(collections.deque)
+        self._hdc_last: Dict[str, Dict] = {}
+        self.hierarchies: List[Dict] = []
+        self.frames: List[bytes] = []
+        for entry in entries or []:
+            self.add(entry)
+
+    @classmethod
+    def load(cls, path: str) -> "Session":
+        with open(path, encoding="utf-8") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def add(self, entry: Dict):
+        kind = entry.get("kind")
+        if kind == "rpc":
+            self._replies[(entry["api"], entry.get("this"), _args_key(entry.get("args", [])))].append(entry["reply"])
+            self._api_replies[entry["api"]].append(entry["reply"])
+        elif kind == "hdc":
+            self._hdc[entry["cmd"]].append(entry)
+        elif kind == "hierarchy":
+            self.hierarchies.append(entry["data"])
+        elif kind == "frame":
+            self.frames.append(base64.b64decode(entry["data"]))
+
+    def _take(self, queues: Dict, last: Dict, key) -> Optional[Dict]:
+        queue = queues.get(key)
+        if queue:
+            last[key] = queue.popleft()
+        return last.get(key)
+
+    def reply(self, api: str, this: Optional[str], args: Any) -> Optional[Dict]:
+        """The recorded reply of a call, None if the api was never recorded."""
+        reply = self._take(self._replies, self._last, (api, this, _args_key(args)))
+        if reply is None:
+            reply = self._take(self._api_replies, self._last, api)
+        return reply
+
+    def hdc(self, cmd: str) -> Optional[Dict]:
+        """The recorded {"output", "error", "exit_code"} of an hdc command line (without `hdc -t serial`)."""
+        return self._take(self._hdc, self._hdc_last, cmd)
+
+    def hierarchy(self) -> Optional[Dict]:
+        return self.hierarchies[-1] if self.hierarchies else None
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+"""
+Timeline tracer writing Chrome Trace Event JSON (open it in chrome://tracing or https://ui.perfetto.dev).
+
+Spans are recorded for Driver actions, settle sleeps, RPC calls, hdc commands, watcher polls and
+capture-stream frames, tagged with the thread and the device serial:
+
+    from hmAutomator import trace
+    trace.start()                    # or env HMAT_TRACE=1
+    ...
+    trace.save("session.trace.json")
+
+Every thread appends to its own buffer, the only lock is taken once per thread when its buffer is
+registered, so the tracer is cheap enough to stay on in CI. While stopped a span costs one attribute check.
+A buffer keeps the last `max_events` events of its thread (env HMAT_TRACE_MAX_EVENTS, 100000 by default),
+buffers of finished threads are dropped once saved.
+"""
+
+import os
+import json
+import time
+import itertools
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+
+enabled: bool = bool(os.getenv("HMAT_TRACE"))
+# events kept per thread, the oldest ones are dropped first
+max_events: int = int(os.getenv("HMAT_TRACE_MAX_EVENTS", "100000"))
+
+_local = threading.local()
+_buffers_lock = threading.Lock()
+# (trace tid, thread, events) of every thread that recorded something
+_buffers: List[tuple] = []
+# bumped by `reset`, so threads register a new buffer instead of appending to a dropped one
+_generation = 0
+_tids = itertools.count(1)
+_pid = os.getpid()
+# trace timestamps are microseconds relative to this point
+_epoch = time.perf_counter()
+
+
+def _buffer() -> Deque[Dict]:
+    if getattr(_local, "generation", None) == _generation:
+        return _local.events
+    events: Deque[Dict] = deque(maxlen=max_events)
+    with _buffers_lock:
+        # thread idents are reused once a thread exits, number the buffers instead
+        _buffers.append((next(_tids), threading.current_thread(), events))
+        _local.events, _local.generation = events, _generation
+    return events
+
+
+def _now() -> float:
+    return (time.perf_counter() - _epoch) * 1e6
+
+
+def start(clear: bool = True, max_events_per_thread: Optional[int] = None) -> None:
+    """
+    Start recording, dropping what was recorded before unless `clear` is False.
+
+    Args:
+        clear (bool): Drop the events recorded so far.
+        max_events_per_thread (Optional[int]): Change `max_events`, applies to the buffers created
+                                               after the next reset.
+    """
+    global enabled, max_events
+    if max_events_per_thread is not None:
+        max_events = max_events_per_thread
+    if clear:
+        reset()
+    enabled = True
+
+
+def stop() -> None:
+    global enabled
+    enabled = False
+
+
+def reset() -> None:
+    global _generation
+    with _buffers_lock:
+        _generation += 1
+        _buffers.clear()
+
+
+def _prune() -> None:
+    """Forget the buffers of finished threads, they can not record anything more."""
+    with _buffers_lock:
+        _buffers[:] = [item for item in _buffers if item[1].is_alive()]
+
+
+def _snapshot(events: Deque[Dict]) -> List[Dict]:
+    while True:
+        try:
+            return list(events)
+        except RuntimeError:  # the thread appended meanwhile
+            continue
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start")
+
+    def __init__(self, name: str, cat: str, args: Dict):
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        end = _now()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _buffer().append({"name": self.name, "cat": self.cat, "ph": "X",
+                          "ts": self.start, "dur": end - self.start, "args": self.args})
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, cat: str, **args):
+    """
+    Context manager recording a complete event, a no-op while the tracer is stopped.
+
+    Args:
+        name (str): Event name, e.g. the RPC api.
+        cat (str): Category: "action", "settle", "rpc", "hdc", "watcher"...
+        args: Extra values shown in the viewer, e.g. serial="FMR0223C13000649".
+    """
+    if not enabled:
+        return _NULL_SPAN
+    return _Span(name, cat, args)
+
+
+def instant(name: str, cat: str, **args) -> None:
+    """Record a point in time event (e.g. a capture-stream frame)."""
+    if enabled:
+        _buffer().append({"name": name, "cat": cat, "ph": "i", "s": "t", "ts": _now(), "args": args})
+
+
+def events() -> List[Dict]:
+    """All recorded events in the Trace Event format, with thread name metadata."""
+    with _buffers_lock:
+        buffers = list(_buffers)
+    result = []
+    for tid, thread, thread_events in buffers:
+        recorded = _snapshot(thread_events)
+        if not recorded:
+            continue
+        result.append({"name": "thread_name", "ph": "M", "pid": _pid, "tid": tid, "args": {"name": thread.name}})
+        for event in recorded:
+            event = dict(event)
+            event["pid"] = _pid
+            event["tid"] = tid
+            result.append(event)
+    return result
+
+
+def save(path: str, metadata: Optional[Dict] = None) -> str:
+    """
+    Write the recorded timeline as Chrome Trace Event JSON.
+    The buffers of threads that have finished are dropped afterwards.
+
+    Returns:
+        str: The path written.
+    """
+    data = {"traceEvents": events(), "displayTimeUnit": "ms"}
+    if metadata:
+        data["metadata"] = metadata
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    _prune()
+    return path
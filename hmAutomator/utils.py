@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
 
 
+import os
 import time
+import hashlib
 import socket
 import re
+import json
+import threading
 from functools import wraps
-from typing import Union
+from typing import Union, List, Tuple, Any, Dict, Set
 
+from . import metrics, trace
 from .proto import Bounds
 
 
@@ -19,25 +24,102 @@ def delay(func):
 
     @wraps(func)
     def wrapper(*args, **kwargs):
-        result = func(*args, **kwargs)
-        time.sleep(DELAY_TIME)
+        if trace.enabled:
+            serial = getattr(args[0], "serial", None) if args else None
+            with trace.span(func.__name__, "action", serial=serial):
+                result = func(*args, **kwargs)
+            with trace.span("settle", "settle", serial=serial, seconds=DELAY_TIME):
+                time.sleep(DELAY_TIME)
+        else:
+            result = func(*args, **kwargs)
+            time.sleep(DELAY_TIME)
+        if metrics.enabled:
+            metrics.observe("delay.sleep", DELAY_TIME, func=func.__name__)
         return result
     return wrapper
 
 
-class FreePort:
+def async_delay(func):
+    """
+    Coroutine version of `delay`, waits without blocking the event loop.
+    """
+    DELAY_TIME = 0.6
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        import asyncio  # only async users pay for importing asyncio
+        result = await func(*args, **kwargs)
+        await asyncio.sleep(DELAY_TIME)
+        return result
+    return wrapper
+
+
+class PortAllocator:
+    """
+    Process-wide allocator of local ports for `hdc fport`.
+
+    New ports come from binding port 0, so the OS picks a free one in a single call and two
+    processes are very unlikely to get the same port. Ports are leased with a reference count,
+    so several clients of the same device can share one forward. Only forwards created
+    by this process are handed back for removal.
+    """
     def __init__(self):
-        self._start = 10000
-        self._end = 20000
-        self._now = self._start - 1
+        self._lock = threading.Lock()
+        self._leases: Dict[int, int] = {}
+        self._owned: Set[int] = set()
 
+    @staticmethod
+    def _bind_free_port() -> int:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    def allocate(self) -> int:
+        """Lease a new free port."""
+        with self._lock:
+            while True:
+                port = self._bind_free_port()
+                if port not in self._leases:
+                    self._leases[port] = 1
+                    self._owned.add(port)
+                    return port
+
+    def acquire(self, port: int) -> int:
+        """Lease an already forwarded port, e.g. a mapping found in `hdc fport ls`."""
+        with self._lock:
+            self._leases[port] = self._leases.get(port, 0) + 1
+            return port
+
+    def release(self, port: int) -> bool:
+        """
+        Drop one lease of `port`.
+
+        Returns:
+            bool: True if this was the last lease of a port allocated here, i.e. the caller should remove the forward.
+        """
+        with self._lock:
+            count = self._leases.get(port, 0) - 1
+            if count > 0:
+                self._leases[port] = count
+                return False
+            self._leases.pop(port, None)
+            if port in self._owned:
+                self._owned.discard(port)
+                return True
+            return False
+
+    def leases(self) -> Dict[int, int]:
+        with self._lock:
+            return dict(self._leases)
+
+
+port_allocator = PortAllocator()
+
+
+class FreePort:
+    """Kept for compatibility, allocates from the process-wide `port_allocator`."""
     def get(self) -> int:
-        while True:
-            self._now += 1
-            if self._now > self._end:
-                self._now = self._start
-            if not self.is_port_in_use(self._now):
-                return self._now
+        return port_allocator.allocate()
 
     @staticmethod
     def is_port_in_use(port: int) -> bool:
@@ -45,6 +127,82 @@ class FreePort:
             return s.connect_ex(('localhost', port)) == 0
 
 
+# JPEG start-of-frame markers, excluding DHT (0xC4), JPG (0xC8) and DAC (0xCC)
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_size(data: Union[bytes, bytearray]) -> Union[Tuple[int, int], None]:
+    """
+    Read (width, height) from the frame header of a JPEG without decoding it.
+    Returns None if `data` is not a JPEG or the header is truncated.
+    """
+    if data[:2] != b'\xff\xd8':
+        return None
+    pos, size = 2, len(data)
+    while pos + 9 < size:
+        if data[pos] != 0xFF:
+            pos += 1
+            continue
+        marker = data[pos + 1]
+        if marker == 0xFF or marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # fill byte or a marker without payload
+            pos += 1 if marker == 0xFF else 2
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height = int.from_bytes(data[pos + 5:pos + 7], 'big')
+            width = int.from_bytes(data[pos + 7:pos + 9], 'big')
+            return width, height
+        pos += 2 + int.from_bytes(data[pos + 2:pos + 4], 'big')
+    return None
+
+
+_JPEG_SOI = b'\xff\xd8'
+_JPEG_EOI = b'\xff\xd9'
+
+
+def split_jpeg_frames(buffer: Union[bytes, bytearray]) -> Tuple[List[bytearray], bytearray]:
+    """
+    Cut the complete JPEG images (SOI .. EOI) out of a capture stream buffer.
+
+    Returns:
+        Tuple[List[bytearray], bytearray]: The frames, oldest first, and the bytes to keep for the next read.
+    """
+    frames, pos = [], 0
+    while True:
+        start = buffer.find(_JPEG_SOI, pos)
+        if start == -1:
+            # keep a trailing 0xFF, it may be the first half of the next SOI
+            pos = max(pos, len(buffer) - 1)
+            break
+        end = buffer.find(_JPEG_EOI, start + 2)
+        if end == -1:
+            pos = start
+            break
+        frames.append(bytearray(buffer[start:end + 2]))
+        pos = end + 2
+    return frames, bytearray(buffer[pos:])
+
+
+def file_md5(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Get the MD5 checksum of a local file."""
+    hash_md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def cache_dir(*parts: str) -> str:
+    """
+    Return (and create) a directory under the hmAutomator cache root,
+    `~/.cache/hmAutomator` unless overridden by the HMAT_CACHE_DIR environment variable.
+    """
+    root = os.getenv("HMAT_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "hmAutomator")
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
 def parse_bounds(bounds: str) -> Union[Bounds, None]:
     """
     Parse bounds string to Bounds.
@@ -57,4 +215,31 @@ def parse_bounds(bounds: str) -> Union[Bounds, None]:
                       int(g[1]),
                       int(g[2]),
                       int(g[3]))
-    return None
\ No newline at end of file
+    return None
+
+
+_json_decoder = json.JSONDecoder()
+
+
+def split_json_frames(buffer: str) -> Tuple[List[Any], str]:
+    """
+    Split the complete JSON documents off the front of `buffer`.
+    uitest replies are neither length prefixed nor reliably newline terminated,
+    so a reply is complete once it parses.
+
+    Returns:
+        Tuple[List[Any], str]: The decoded documents and the unparsed remainder.
+    """
+    frames = []
+    pos, size = 0, len(buffer)
+    while True:
+        while pos < size and buffer[pos] in " \t\r\n":
+            pos += 1
+        if pos >= size:
+            break
+        try:
+            obj, pos = _json_decoder.raw_decode(buffer, pos)
+        except ValueError:
+            break
+        frames.append(obj)
+    return frames, buffer[pos:]
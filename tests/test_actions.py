@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from hmAutomator._actions import ActionScript, IDLE, IDLE_TIMEOUT, LONG_CLICK_TIME
+from hmAutomator._client import SOCKET_TIMEOUT
+from hmAutomator.proto import KeyCode, Point
+
+
+class _FakeDriver:
+    def __init__(self):
+        self.round_trips = []
+        self.timeouts = []
+        self._client = self
+
+    def _to_abs_pos(self, x, y):
+        assert x >= 0 and y >= 0
+        return Point(int(x * 1000) if x < 1 else int(x), int(y * 2000) if y < 1 else int(y))
+
+    def invoke_many(self, calls, timeout=None):
+        self.round_trips.append([api for api, _, _ in calls])
+        self.timeouts.append(timeout)
+
+
+def test_steps_are_pipelined_until_a_host_settle():
+    d = _FakeDriver()
+    report = ActionScript(d) \
+        .click(0.5, 0.5).input_text("hi", settle=IDLE) \
+        .key(KeyCode.BACK, settle=0.01) \
+        .click(10, 20).run()
+    assert d.round_trips == [
+        ["Driver.click", "Driver.inputText", "Driver.waitForIdle", "Driver.triggerKey"],
+        ["Driver.click"],
+    ]
+    assert report.round_trips == 2
+    assert report.steps[0] == "click(500, 1000)"
+    assert len(report.step_times) == 4
+
+
+def test_invalid_arguments_fail_before_sending():
+    d = _FakeDriver()
+    with pytest.raises(AssertionError):
+        ActionScript(d).click(-1, 0)
+    with pytest.raises(ValueError):
+        ActionScript(d).click(0.1, 0.1, settle="later")
+    assert d.round_trips == []
+
+
+def test_round_trip_timeout_covers_the_device_side_waits():
+    d = _FakeDriver()
+    script = ActionScript(d, settle=IDLE)
+    for _ in range(10):
+        script.click(0.5, 0.5)
+    script.long_click(0.5, 0.5).swipe(0, 0, 0, 2000, speed=1000, settle=0.01)
+    script.click(0.1, 0.1, settle=0).run()
+    assert len(d.round_trips) == 2
+    assert d.timeouts[0] == pytest.approx(SOCKET_TIMEOUT + 11 * IDLE_TIMEOUT / 1000 + LONG_CLICK_TIME + 2)
+    assert d.timeouts[1] == SOCKET_TIMEOUT
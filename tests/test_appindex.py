@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import json
+import zipfile
+
+from hmAutomator import _appindex
+from hmAutomator._appindex import AppIndex, parse_abilities, pick_main_ability, read_hap_info
+from hmAutomator.proto import CommandResult
+
+
+def _app_info(version: int, main: str = "EntryAbility") -> dict:
+    return {
+        "mainEntry": "entry",
+        "versionCode": version,
+        "hapModuleInfos": [
+            {"mainAbility": "EntryAbility", "abilityInfos": [
+                {"name": "EntryAbility", "moduleName": "entry", "skills": [{"actions": ["action.system.home"]}]},
+                {"name": "SettingsAbility", "moduleName": "entry", "skills": [{"actions": []}]},
+            ]},
+            {"mainAbility": main, "abilityInfos": [
+                {"name": "WidgetAbility", "moduleName": "widget", "skills": [{"actions": []}]},
+                {"name": "Broken"},  # no moduleName, skipped
+            ]},
+            {"abilityInfos": []},  # no mainAbility, skipped
+        ],
+    }
+
+
+class _StubHdc:
+    serial = "fake"
+
+    def __init__(self):
+        self.infos = {"com.example.app": _app_info(1)}
+        self.commands = []
+
+    def shell(self, cmd, error_raise=True):
+        self.commands.append(cmd)
+        if cmd == "bm dump -a":
+            return CommandResult("ID: 100:\n\t" + "\n\t".join(self.infos) + "\n", "", 0)
+        bundle = cmd.split()[-1]
+        if bundle in self.infos:
+            return CommandResult(f"{bundle}:\n" + json.dumps(self.infos[bundle]), "", 0)
+        return CommandResult("error: bundle not found", "", 1)
+
+
+def test_parse_abilities():
+    abilities = parse_abilities(_app_info(1))
+    assert [a["name"] for a in abilities] == ["EntryAbility", "SettingsAbility", "WidgetAbility"]
+    assert abilities[0] == {"name": "EntryAbility", "moduleName": "entry", "moduleMainAbility": "EntryAbility",
+                            "mainModule": "entry", "isLauncherAbility": True}
+    assert parse_abilities({}) == []
+
+
+def test_pick_main_ability():
+    abilities = parse_abilities(_app_info(1))
+    assert pick_main_ability(list(reversed(abilities)))["name"] == "EntryAbility"
+    assert pick_main_ability([]) == {}
+
+
+def test_read_hap_info(tmp_path):
+    hap = tmp_path / "app.hap"
+    with zipfile.ZipFile(hap, "w") as f:
+        f.writestr("module.json", json.dumps({"app": {"bundleName": "com.example.app", "versionCode": 3}}))
+    assert read_hap_info(str(hap)) == {"bundleName": "com.example.app", "versionCode": 3}
+
+    not_a_hap = tmp_path / "a.txt"
+    not_a_hap.write_text("x")
+    assert read_hap_info(str(not_a_hap)) == {}
+    assert read_hap_info(str(tmp_path / "missing.hap")) == {}
+
+
+def test_index_caches_and_returns_copies():
+    hdc = _StubHdc()
+    index = AppIndex(hdc)
+    assert index.has_app("com.example.app") and not index.has_app("com.example.other")
+    index.app_info("com.example.app")["versionCode"] = 99
+    assert index.app_info("com.example.app")["versionCode"] == 1
+    assert index.main_ability("com.example.app")["name"] == "EntryAbility"
+    assert hdc.commands == ["bm dump -a", "bm dump -n com.example.app"]
+    assert index.app_info("com.example.missing") == {}
+
+
+def test_install_elsewhere_invalidates_the_index():
+    hdc = _StubHdc()
+    index = AppIndex(hdc)
+    assert index.main_ability("com.example.app")["name"] == "EntryAbility"
+
+    # a new version whose main module is "widget", installed without the driver
+    info = _app_info(2, main="WidgetAbility")
+    info["mainEntry"] = "widget"
+    hdc.infos["com.example.app"] = info
+    assert index.main_ability("com.example.app")["name"] == "EntryAbility"  # still cached
+
+    _appindex.invalidate_device("other-device", "com.example.app")
+    assert index.main_ability("com.example.app")["name"] == "EntryAbility"
+    _appindex.invalidate_device("fake", "com.example.app")
+    assert index.main_ability("com.example.app")["name"] == "WidgetAbility"
+    assert hdc.commands.count("bm dump -n com.example.app") == 2
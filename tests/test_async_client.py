@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+from hmAutomator import testing
+from hmAutomator.async_driver import AsyncDriver
+from hmAutomator._async_client import AsyncHmClient
+from hmAutomator._client import _UITestService
+from hmAutomator.exception import RpcConnectionError
+
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="the fake hdc launcher is a POSIX shell script")
+
+
+@pytest.fixture
+def device():
+    with testing.FakeDevice() as device:
+        yield device
+
+
+def test_async_driver(device):
+    async def run():
+        d = await AsyncDriver.connect(device.serial)
+        try:
+            assert await d.display_size() == (1260, 2720)
+            await d.click(0.5, 0.5)
+        finally:
+            await d.close()
+
+    asyncio.run(run())
+    apis = [r["params"]["api"] for r in device.server.requests]
+    assert apis[:2] == ["Driver.create", "Driver.getDisplaySize"] and "Driver.click" in apis
+    assert device.server.ports() == []
+
+
+def test_concurrent_invokes_share_one_stream(device):
+    async def run():
+        async with AsyncHmClient(device.serial) as client:
+            replies = await asyncio.gather(*(client.invoke("On.text", "On#seed", [f"t{i}"]) for i in range(20)))
+            return [r.result for r in replies]
+
+    results = asyncio.run(run())
+    assert len(set(results)) == 20 and all(r.startswith("On#") for r in results)
+
+
+def test_clients_reuse_the_forward(device):
+    async def run():
+        first, second = AsyncHmClient(device.serial), AsyncHmClient(device.serial)
+        await first.start()
+        await second.start()
+        assert first.local_port == second.local_port and len(device.server.ports()) == 1
+        await first.release()
+        assert len(device.server.ports()) == 1
+        assert (await second.invoke("Driver.getDisplayRotation")).result == 0
+        await second.release()
+
+    asyncio.run(run())
+    assert device.server.ports() == []
+
+
+def test_dead_stream_fails_fast(device):
+    async def run():
+        async with AsyncHmClient(device.serial) as client:
+            device.server.disconnect()
+            await asyncio.sleep(0.2)  # let the reader see the close
+            start = time.perf_counter()
+            with pytest.raises(RpcConnectionError):
+                await client.invoke("Driver.getDisplayRotation", timeout=5)
+            return time.perf_counter() - start
+
+    assert asyncio.run(run()) < 1
+
+
+def test_outdated_agent_is_replaced(device):
+    stale = os.path.join(device.root, "data", "local", "tmp", "agent.so")
+    os.makedirs(os.path.dirname(stale), exist_ok=True)
+    with open(stale, "wb") as f:
+        f.write(b"old agent")
+
+    async def run():
+        async with AsyncHmClient(device.serial):
+            pass
+
+    asyncio.run(run())
+    with open(stale, "rb") as f, open(_UITestService._get_local_agent_path(), "rb") as agent:
+        assert f.read() == agent.read()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import pytest
+
+from hmAutomator import _codec
+from hmAutomator.proto import HypiumResponse
+
+
+@pytest.fixture(params=["json", "orjson", "ujson"])
+def codec(request):
+    try:
+        _codec.set_codec(request.param)
+    except ImportError:
+        pytest.skip(f"{request.param} is not installed")
+    yield _codec.get_codec()
+    _codec.set_codec()
+
+
+def test_encode_hypium(codec):
+    args = ["精选", {"x": 1, "y": 2}, None, True]
+    data = _codec.encode_hypium("On.text", "On#seed", args, "42")
+    expected = {
+        "module": "com.ohos.devicetest.hypiumApiHelper",
+        "method": "callHypiumApi",
+        "params": {
+            "api": "On.text",
+            "this": "On#seed",
+            "args": args,
+            "message_type": "hypium"
+        },
+        "request_id": "42"
+    }
+    assert data.endswith(b"\n")
+    assert data.rstrip(b"\n") == json.dumps(expected, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def test_encode_captures(codec):
+    data = _codec.encode_captures("startCaptureScreen", [], "7")
+    assert json.loads(data) == {
+        "module": "com.ohos.devicetest.hypiumApiHelper",
+        "method": "Captures",
+        "params": {"api": "startCaptureScreen", "args": []},
+        "request_id": "7"
+    }
+
+
+def test_decode(codec):
+    reply = _codec.decode(b'{"result":{"x":1260,"y":2720},"request_id":"1"}')
+    assert _codec.to_response(reply) == HypiumResponse({"x": 1260, "y": 2720})
+    with pytest.raises(ValueError):
+        _codec.decode(b'{"result":["Component#7","Comp')
+
+
+def test_request_id_unique_across_threads():
+    ids = []
+
+    def worker():
+        ids.extend(_codec.next_request_id() for _ in range(1000))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(ids)) == 8000
+
+
+def test_frame_reader_decodes_each_frame_once(codec, monkeypatch):
+    big = {"result": ["Component#%d" % i for i in range(50000)]}
+    stream = json.dumps(big).encode() + b"\n" + '{"result":"精选"}\n{"res'.encode()
+    calls = []
+    decode = _codec.decode
+    monkeypatch.setattr(_codec, "decode", lambda data: calls.append(len(data)) or decode(data))
+
+    reader, frames = _codec.FrameReader(), []
+    for i in range(0, len(stream), 4096):
+        frames.extend(reader.feed(stream[i:i + 4096]))
+    assert frames == [big, {"result": "精选"}]
+    assert len(calls) == 2
+    assert reader.feed(b'ult":null}\n') == [{"result": None}]
+
+
+def test_frame_reader_without_delimiter():
+    reader = _codec.FrameReader()
+    assert reader.feed(b'{"result":{"a":1}') == []
+    assert reader.feed(b'}{"result":2}') == [{"result": {"a": 1}}, {"result": 2}]
+    assert reader.feed(b'{"res') == []
+    assert reader.feed(b'ult":3}') == [{"result": 3}]
+
+
+def test_frame_reader_raises_on_an_undecodable_frame():
+    reader = _codec.FrameReader()
+    with pytest.raises(ValueError):
+        reader.feed(b'{"result": "A\n{"result": "B"}\n')
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import zipfile
+
+import pytest
+
+from hmAutomator import testing
+from hmAutomator.distribute import STAGING_DIR, format_report, install_many, push_many
+from hmAutomator.proto import TransferResult
+
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="the fake hdc launcher is a POSIX shell script")
+
+BAD_HAP_INSTALL = f"shell bm install -p {STAGING_DIR}/bad.hap"
+
+
+def _hap(path, bundle_name: str) -> str:
+    with zipfile.ZipFile(path, "w") as f:
+        f.writestr("module.json", json.dumps({"app": {"bundleName": bundle_name, "versionCode": 1}}))
+        f.writestr("libs/payload.so", os.urandom(4096))
+    return str(path)
+
+
+@pytest.fixture
+def device(tmp_path):
+    session_path = tmp_path / "session.jsonl"
+    entry = {"kind": "hdc", "cmd": BAD_HAP_INSTALL, "exit_code": 0,
+             "output": "error: install failed due to grant request permissions failed.\n"}
+    session_path.write_text(json.dumps(entry) + "\n")
+    with testing.FakeDevice(str(session_path)) as device:
+        yield device
+
+
+def _staged(device, name: str) -> str:
+    return os.path.join(device.root, STAGING_DIR.lstrip("/"), name)
+
+
+def test_install_skips_when_staged_hap_matches_and_bundle_is_installed(device, tmp_path):
+    hap = _hap(tmp_path / "fake.hap", "com.example.fake")  # the fake lists com.example.fake as installed
+    first, = install_many([device.serial], hap)
+    assert first.ok and not first.skipped and first.size == os.path.getsize(hap)
+    assert os.path.isfile(_staged(device, "fake.hap"))
+
+    second, = install_many([device.serial], hap)
+    assert second.ok and second.skipped and second.size == 0
+
+    forced, = install_many([device.serial], hap, force=True)
+    assert forced.ok and not forced.skipped
+
+    _hap(tmp_path / "fake.hap", "com.example.fake")  # new content, same name
+    changed, = install_many([device.serial], hap)
+    assert changed.ok and not changed.skipped
+
+
+def test_install_again_when_the_bundle_is_gone(device, tmp_path):
+    hap = _hap(tmp_path / "other.hap", "com.example.other")  # staged but not listed by `bm dump -a`
+    install_many([device.serial], hap)
+    again, = install_many([device.serial], hap)
+    assert again.ok and not again.skipped
+
+
+def test_failed_install_drops_the_staged_copy(device, tmp_path):
+    hap = _hap(tmp_path / "bad.hap", "com.example.fake")
+    result, = install_many([device.serial], hap)
+    assert not result.ok and "grant request permissions failed" in result.error
+    assert not os.path.exists(_staged(device, "bad.hap"))
+    # nothing staged, so the next run installs again instead of skipping
+    assert not install_many([device.serial], hap)[0].skipped
+
+
+def test_results_follow_the_serials_order(device, tmp_path):
+    hap = _hap(tmp_path / "fake.hap", "com.example.fake")
+    results = install_many(["MISSING0000001", device.serial], hap)
+    assert [r.serial for r in results] == ["MISSING0000001", device.serial]
+    assert "DeviceNotFoundError" in results[0].error and results[1].ok
+
+
+def test_push_skips_files_already_on_the_device(device, tmp_path):
+    files = {}
+    for name in ("a.bin", "b.bin"):
+        local = tmp_path / name
+        local.write_bytes(os.urandom(1024))
+        files[str(local)] = f"/data/local/tmp/push/{name}"
+
+    first, = push_many([device.serial], files)
+    assert first.ok and not first.skipped and first.size == 2048
+    for rpath in files.values():
+        assert os.path.isfile(os.path.join(device.root, rpath.lstrip("/")))
+
+    second, = push_many([device.serial], list(files.items()))
+    assert second.ok and second.skipped and second.size == 0
+
+    (tmp_path / "b.bin").write_bytes(os.urandom(512))
+    third, = push_many([device.serial], files)
+    assert not third.skipped and third.size == 512
+
+    forced, = push_many([device.serial], files, force=True)
+    assert forced.size == 1536
+
+
+def test_push_one_local_file_to_several_remote_paths(device, tmp_path):
+    local = tmp_path / "config.json"
+    local.write_bytes(b"{}")
+    rpaths = ["/data/local/tmp/a/config.json", "/data/local/tmp/b/config.json"]
+    result, = push_many([device.serial], [(str(local), rpath) for rpath in rpaths])
+    assert result.ok and result.size == 4
+    for rpath in rpaths:
+        assert os.path.isfile(os.path.join(device.root, rpath.lstrip("/")))
+
+
+def test_format_report():
+    results = [
+        TransferResult("SERIAL1", "install", size=4 * 1024 * 1024, duration=2.0),
+        TransferResult("SERIAL2", "install", skipped=True),
+        TransferResult("SERIAL3", "install", duration=0.5, error="error: install failed"),
+    ]
+    lines = format_report(results).splitlines()
+    assert lines[0].split() == ["serial", "action", "status", "MB", "sec", "MB/s"]
+    assert lines[1].split() == ["SERIAL1", "install", "ok", "4.00", "2.00", "2.00"]
+    assert lines[2].split() == ["SERIAL2", "install", "skipped", "0.00", "0.00", "0.00"]
+    assert lines[3].split() == ["SERIAL3", "install", "failed", "0.00", "0.50", "0.00"]
+    assert lines[4] == "    error: install failed"
+    assert format_report([]) == lines[0]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+import pytest
+
+from hmAutomator import doctor, testing
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the fake hdc launcher is a POSIX shell script")
+def test_doctor_against_fake_device():
+    with testing.FakeDevice() as device:
+        report = doctor.run(device.serial, calls=10, transfer_mb=0.5, capture_seconds=0.5)
+    checks = report["checks"]
+    assert set(checks) == set(doctor.CHECKS)
+    assert not [name for name, result in checks.items() if "error" in result]
+    assert checks["rpc"]["rtt_ms"]["count"] == 10
+    assert checks["transfer"]["send_mb_s"] > 0
+    assert checks["capture"]["frames"] > 0
+    assert device.serial in doctor.format_report(report)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+
+from hmAutomator import _events
+from hmAutomator._events import UiEventStream
+from hmAutomator.proto import HypiumResponse, UiEvent
+
+
+def test_ring_buffer_queries():
+    events = UiEventStream("fake", capacity=2)
+    for i in range(3):
+        events._push(UiEvent(100.0 + i, {"type": "Toast", "text": str(i)}))
+    assert [e.text for e in events.since(0)] == ["1", "2"]  # oldest evicted
+    assert [e.text for e in events.since(101.0)] == ["2"]
+    assert events.latest(lambda e: e.text == "1").time == 101.0
+
+
+def test_wait_for_wakes_up_on_new_event():
+    events = UiEventStream("fake")
+    t = time.time()
+    timer = threading.Timer(0.05, events._push, [UiEvent(time.time() + 0.05, {"type": "Dialog"})])
+    timer.start()
+    event = events.wait_for(lambda e: e.type == "Dialog", timeout=2, since=t)
+    assert event is not None and event.type == "Dialog"
+    assert events.wait_for(lambda e: e.type == "Toast", timeout=0.05) is None
+
+
+class _StubEventClient:
+    """Replays scripted getRecentUiEvent results, then reports no event until the stream stops."""
+    instances = []
+    script = []
+
+    def __init__(self, serial):
+        self.calls = []
+        self.released = False
+        self.script = list(_StubEventClient.script)
+        _StubEventClient.instances.append(self)
+
+    def connect(self):
+        return "Driver#1"
+
+    def invoke(self, api, this="Driver#0", args=[]):
+        self.calls.append((api, this, args))
+        if api == "Driver.getRecentUiEvent":
+            if self.script:
+                return HypiumResponse(self.script.pop(0))
+            time.sleep(0.01)
+        return HypiumResponse(True)
+
+    def invoke_many(self, calls):
+        return [self.invoke(*call) for call in calls]
+
+    def release(self):
+        self.released = True
+
+    def armed(self):
+        return [args[0] for api, _, args in self.calls if api == "Driver.uiEventObserverOnce"]
+
+
+def test_only_the_fired_observer_is_armed_again_and_close_frees_them(monkeypatch):
+    monkeypatch.setattr(_events, "_EventClient", _StubEventClient)
+    monkeypatch.setattr(_StubEventClient, "instances", [])
+    monkeypatch.setattr(_StubEventClient, "script", [
+        {"type": "Toast", "text": "saved"},
+        {"type": "Dialog", "text": "confirm"},
+        {"type": "Popup", "text": "unknown"},
+    ])
+    events = UiEventStream("fake").start()
+    assert events.wait_for(lambda e: e.type == "Popup", timeout=2) is not None
+    events.close()
+
+    client, = _StubEventClient.instances
+    assert client.armed() == ["toastShow", "dialogShow",  # on connect
+                              "toastShow",                 # after the toast
+                              "dialogShow",                # after the dialog
+                              "toastShow", "dialogShow"]   # unknown type, every observer
+    assert client.calls[-1] == ("BackendObjectsCleaner", None, ["Driver#1"])
+    assert client.released and not events.running
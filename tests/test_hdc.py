@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import hashlib
+
+import pytest
+
+from hmAutomator import testing
+from hmAutomator.hdc import HdcWrapper
+
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="the fake hdc launcher is a POSIX shell script")
+
+RDIR = "/data/log/it's here"
+
+
+@pytest.fixture
+def device():
+    with testing.FakeDevice() as device:
+        top = os.path.join(device.root, RDIR.lstrip("/"))
+        os.makedirs(os.path.join(top, "sub"))
+        for rel, data in (("a.log", b"a"), ("sub/o'clock.log", b"bb")):
+            with open(os.path.join(top, *rel.split("/")), "wb") as f:
+                f.write(data)
+        yield device
+
+
+def _count_shell(hdc, monkeypatch, word):
+    calls = []
+    shell = hdc.shell
+    monkeypatch.setattr(hdc, "shell", lambda cmd, **kwargs: calls.append(cmd) or shell(cmd, **kwargs))
+    return lambda: sum(word in cmd for cmd in calls)
+
+
+def test_pull_dir_with_quotes_in_paths(device, tmp_path, monkeypatch):
+    hdc = HdcWrapper(device.serial)
+    finds = _count_shell(hdc, monkeypatch, "find ")
+    assert sorted(hdc.pull_dir(RDIR, str(tmp_path / "all"))) == ["a.log", "sub/o'clock.log"]
+    assert finds() == 0  # the tar lists what it unpacked
+    assert (tmp_path / "all" / "sub" / "o'clock.log").read_bytes() == b"bb"
+
+    assert hdc.pull_dir(RDIR, str(tmp_path / "one"), rel_paths=["sub/o'clock.log"]) == ["sub/o'clock.log"]
+    assert os.listdir(tmp_path / "one" / "sub") == ["o'clock.log"]
+
+
+def test_sync_dir_and_md5sums_with_quotes_in_paths(device, tmp_path):
+    hdc = HdcWrapper(device.serial)
+    assert sorted(hdc.list_files(RDIR)) == ["a.log", "sub/o'clock.log"]
+    assert sorted(hdc.sync_dir(RDIR, str(tmp_path))) == ["a.log", "sub/o'clock.log"]
+    assert hdc.sync_dir(RDIR, str(tmp_path)) == []
+    rpath = f"{RDIR}/sub/o'clock.log"
+    assert hdc.md5sums([rpath]) == {rpath: hashlib.md5(b"bb").hexdigest()}
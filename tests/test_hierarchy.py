@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from hmAutomator._hierarchy import LayoutSnapshot
+from hmAutomator.exception import ElementNotFoundError
+from hmAutomator.proto import Bounds, Point
+
+
+def _node(type, text="", bounds="[0,0][100,100]", clickable="false", children=()):
+    return {"attributes": {"type": type, "text": text, "bounds": bounds, "clickable": clickable,
+                           "id": "", "key": "", "description": ""},
+            "children": list(children)}
+
+
+HIERARCHY = _node("root", bounds="[0,0][1260,2720]", children=[
+    _node("Column", children=[
+        _node("Text", "标题", "[0,0][1260,200]"),
+        _node("Button", "确定", "[100,300][500,400]", clickable="true"),
+    ]),
+    _node("Button", "取消", "[600,300][1000,400]", clickable="true"),
+])
+
+
+class _FakeDriver:
+    def __init__(self):
+        self.clicks = []
+
+    def click(self, x, y):
+        self.clicks.append((x, y))
+
+
+def test_query_by_fields_and_index():
+    snap = LayoutSnapshot(HIERARCHY)
+    assert len(snap) == 5
+    assert snap(type="Button").count == 2
+    assert snap(type="Button", index=1).text == "取消"
+    assert snap(text="确定", clickable=True).bounds == Bounds(100, 300, 500, 400)
+    assert not snap(text="确定", clickable=False).exists()
+    with pytest.raises(ReferenceError):
+        snap(foo="bar")
+
+
+def test_is_before_is_after():
+    snap = LayoutSnapshot(HIERARCHY)
+    assert [n.type for n in snap.query(text="确定", isBefore=True)] == ["root", "Column", "Text"]
+    assert [n.text for n in snap.query(text="确定", isAfter=True)] == ["取消"]
+
+
+def test_click_goes_to_bounds_center():
+    d = _FakeDriver()
+    snap = LayoutSnapshot(HIERARCHY, d)
+    snap(text="取消").click()
+    assert d.clicks == [(800, 350)]
+    assert snap(text="取消").boundsCenter == Point(800, 350)
+    with pytest.raises(ElementNotFoundError):
+        snap(text="missing").click()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from hmAutomator._image import decode_jpeg, reduction_for, resize_frame
+from hmAutomator.proto import Bounds
+
+
+def test_reduction_for():
+    assert reduction_for(1.0) == 1
+    assert reduction_for(0.6) == 1
+    assert reduction_for(0.5) == 2
+    assert reduction_for(0.3) == 2
+    assert reduction_for(0.25) == 4
+    assert reduction_for(0.1) == 8
+
+
+# quadrant colors (BGR) of a 800x1600 test screen
+COLORS = {"top_left": (255, 0, 0), "top_right": (0, 255, 0), "bottom_left": (0, 0, 255), "bottom_right": (0, 255, 255)}
+
+
+@pytest.fixture(scope="module")
+def screen_jpeg():
+    np = pytest.importorskip("numpy")
+    cv2 = pytest.importorskip("cv2")
+    img = np.zeros((1600, 800, 3), np.uint8)
+    img[:800, :400] = COLORS["top_left"]
+    img[:800, 400:] = COLORS["top_right"]
+    img[800:, :400] = COLORS["bottom_left"]
+    img[800:, 400:] = COLORS["bottom_right"]
+    ok, data = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), 95])
+    assert ok
+    return data.tobytes()
+
+
+def _color_near(img, color, tolerance=12):
+    mean = img.reshape(-1, 3).mean(axis=0)
+    return all(abs(m - c) <= tolerance for m, c in zip(mean, color))
+
+
+def test_decode_full_and_reduced(screen_jpeg):
+    assert decode_jpeg(screen_jpeg).shape == (1600, 800, 3)
+    assert decode_jpeg(screen_jpeg, scale=0.5).shape == (800, 400, 3)
+    assert decode_jpeg(screen_jpeg, scale=0.125).shape == (200, 100, 3)
+
+
+def test_region_is_in_device_coordinates_after_reduction(screen_jpeg):
+    # the bottom right quadrant, inset so JPEG blocks at the edges do not blur the colors
+    region = Bounds(440, 840, 760, 1560)
+    full = decode_jpeg(screen_jpeg, region=region)
+    assert full.shape == (720, 320, 3) and _color_near(full, COLORS["bottom_right"])
+    reduced = decode_jpeg(screen_jpeg, region=region, scale=0.25)
+    assert reduced.shape == (180, 80, 3) and _color_near(reduced, COLORS["bottom_right"])
+    top_left = decode_jpeg(screen_jpeg, region=(40, 40, 360, 760), scale=0.125)
+    assert top_left.shape == (90, 40, 3) and _color_near(top_left, COLORS["top_left"])
+
+
+def test_scale_between_reductions_is_rounded(screen_jpeg):
+    # 0.3 decodes at 1/2 then resizes by 0.6: 333 // 2 = 166 -> round(99.6) = 100
+    img = decode_jpeg(screen_jpeg, region=(0, 0, 333, 1000), scale=0.3)
+    assert img.shape == (300, 100, 3)
+    assert decode_jpeg(screen_jpeg, scale=0.7).shape == (1120, 560, 3)
+
+
+def test_decode_errors(screen_jpeg):
+    with pytest.raises(ValueError):
+        decode_jpeg(screen_jpeg, scale=0)
+    with pytest.raises(ValueError):
+        decode_jpeg(b"not a jpeg")
+
+
+def test_resize_frame(screen_jpeg):
+    img = resize_frame(screen_jpeg, (200, 400), quality=60)
+    assert img.shape == (400, 200, 3)
+    assert _color_near(img[250:350, 120:180], COLORS["bottom_right"])
+    assert resize_frame(b"not a jpeg", (200, 400)) is None
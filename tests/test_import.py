@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import subprocess
+
+# generous, the import takes ~50ms on a laptop: it only catches a heavy dependency sneaking back in
+IMPORT_BUDGET = 0.5  # seconds
+LAZY_MODULES = ("numpy", "cv2", "lxml", "asyncio", "zipfile", "hmAutomator._keycode")
+
+
+def _importtime(statement: str) -> dict:
+    """{module: cumulative seconds} reported by `python -X importtime`."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    env.pop("HMAT_LOG_LEVEL", None)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          capture_output=True, text=True, env=env, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_heavy_dependencies_are_imported_lazily():
+    times = _importtime("import hmAutomator.driver, hmAutomator._screenrecord, hmAutomator._xpath")
+    assert "hmAutomator.driver" in times
+    assert [m for m in LAZY_MODULES if m in times] == []
+
+
+def test_import_time_budget():
+    times = _importtime("import hmAutomator.driver")
+    assert times["hmAutomator.driver"] < IMPORT_BUDGET, times["hmAutomator.driver"]
+
+
+def test_keycode_is_loaded_on_first_use():
+    from hmAutomator import proto
+    assert proto.KeyCode.BACK.value == 2
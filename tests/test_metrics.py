@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from hmAutomator import metrics
+
+
+@pytest.fixture(autouse=True)
+def _reset():
+    metrics.reset()
+    yield
+    metrics.enable(False)
+    metrics.reset()
+
+
+def test_histogram_percentiles_are_within_bucket_precision():
+    h = metrics.Histogram()
+    for i in range(1, 1001):
+        h.record(i / 1000)  # 1ms .. 1s
+    assert h.count == 1000
+    assert h.percentile(50) == pytest.approx(0.5, rel=0.1)
+    assert h.percentile(99) == pytest.approx(0.99, rel=0.1)
+    assert h.percentile(100) == 1.0
+
+
+def test_timer_is_noop_when_disabled():
+    metrics.enable(False)
+    with metrics.timer("rpc.invoke", api="Driver.click"):
+        pass
+    assert metrics.timings() == {}
+    metrics.enable()
+    with metrics.timer("rpc.invoke", api="Driver.click"):
+        pass
+    assert metrics.timings()['rpc.invoke{api="Driver.click"}']["count"] == 1
+
+
+def test_prometheus_export():
+    metrics.incr("session.recoveries")
+    metrics.observe("rpc.invoke", 0.002, api="Driver.click")
+    metrics.observe("rpc.invoke", 3, api="Driver.click")
+    text = metrics.to_prometheus()
+    assert "hmat_session_recoveries_total 1" in text
+    assert 'hmat_rpc_invoke_bucket{api="Driver.click",le="0.0025"} 1' in text
+    assert 'hmat_rpc_invoke_bucket{api="Driver.click",le="+Inf"} 2' in text
+    assert 'hmat_rpc_invoke_count{api="Driver.click"} 2' in text
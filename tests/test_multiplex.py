@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+import json
+import random
+import socket
+import threading
+import time
+
+import pytest
+
+from hmAutomator._client import HmClient
+from hmAutomator.exception import RpcConnectionError
+
+
+def _serve(server: socket.socket):
+    """Answer every request in order with its api and args, after a random delay."""
+    conn, _ = server.accept()
+    buffer = b""
+    with conn:
+        while True:
+            data = conn.recv(65536)
+            if not data:
+                return
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                params = json.loads(line)["params"]
+                time.sleep(random.random() / 1000)
+                if params["api"] == "Driver.hang":
+                    continue
+                conn.sendall(json.dumps({"result": [params["api"], params["args"]]}).encode())
+
+
+@pytest.fixture
+def client():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    threading.Thread(target=_serve, args=(server,), daemon=True).start()
+
+    c = HmClient.__new__(HmClient)  # skip HdcWrapper, it needs a device
+    c.serial = "fake"
+    c.sock = None
+    c._write_lock = threading.RLock()
+    c._pending_lock = threading.Lock()
+    c.__dict__["local_port"] = server.getsockname()[1]
+    c._connect_sock()
+    yield c
+    c._close_sock()
+    server.close()
+
+
+def test_concurrent_callers_get_their_own_replies(client):
+    errors = []
+
+    def worker(n):
+        for i in range(50):
+            result = client.invoke(f"Driver.call{n}", args=[i]).result
+            if result != [f"Driver.call{n}", [i]]:
+                errors.append(result)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+def test_invoke_many_and_connection_loss(client):
+    responses = client.invoke_many([("Driver.a", "Driver#0", [1]), ("Driver.b", "Driver#0", [2])])
+    assert [r.result[0] for r in responses] == ["Driver.a", "Driver.b"]
+
+    raised = []
+
+    def hang():
+        try:
+            client.invoke("Driver.hang")
+        except RpcConnectionError as e:
+            raised.append(e)
+
+    waiter = threading.Thread(target=hang)
+    waiter.start()
+    time.sleep(0.05)
+    client._close_sock()  # the pending caller is woken up with an error instead of waiting for the timeout
+    waiter.join(2)
+    assert len(raised) == 1
+
+
+def test_undecodable_reply_fails_every_pending_call():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+
+    def serve():
+        conn, _ = server.accept()
+        with conn:
+            buffer = b""
+            while buffer.count(b"\n") < 2:
+                buffer += conn.recv(65536)
+            # the first reply is cut, the second one is valid but must not be given to the first caller
+            conn.sendall(b'{"result": "A\n' + json.dumps({"result": "B"}).encode() + b"\n")
+            while conn.recv(65536):
+                pass
+
+    threading.Thread(target=serve, daemon=True).start()
+    c = HmClient.__new__(HmClient)
+    c.serial = "fake"
+    c.sock = None
+    c._write_lock = threading.RLock()
+    c._pending_lock = threading.Lock()
+    c.__dict__["local_port"] = server.getsockname()[1]
+    c._connect_sock()
+
+    results = {}
+
+    def call(name):
+        try:
+            results[name] = c.invoke(f"Driver.{name}").result
+        except RpcConnectionError as e:
+            results[name] = e
+
+    first = threading.Thread(target=call, args=("a",))
+    first.start()
+    time.sleep(0.05)
+    second = threading.Thread(target=call, args=("b",))
+    second.start()
+    first.join(5)
+    second.join(5)
+    try:
+        assert isinstance(results["a"], RpcConnectionError) and isinstance(results["b"], RpcConnectionError)
+        assert c.sock is None
+    finally:
+        c._close_sock()
+        server.close()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+
+import pytest
+
+from hmAutomator._props import IMMUTABLE_PARAMS, DeviceProperties
+
+
+class _StubHdc:
+    """Stub hdc answering `param get`, optionally without support for dumping every parameter."""
+    serial = "fake-serial"
+
+    def __init__(self, dump_all: bool = True):
+        self.dump_all = dump_all
+        self.values = {"const.product.model": "ALN-AL00", "const.ohos.apiversion": "12",
+                       "persist.sys.usb.config": "hdc"}
+        self.calls = []
+
+    def get_params(self, keys=None):
+        self.calls.append(keys)
+        if keys is None:
+            return dict(self.values) if self.dump_all else {}
+        return {k: self.values[k] for k in keys if k in self.values}
+
+
+@pytest.fixture(autouse=True)
+def cache_root(tmp_path, monkeypatch):
+    monkeypatch.setenv("HMAT_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _cache_file(cache_root) -> str:
+    return os.path.join(str(cache_root), "device_props", f"{_StubHdc.serial}.json")
+
+
+def test_params_keep_const_keys_and_are_cached_in_memory():
+    hdc = _StubHdc()
+    props = DeviceProperties(hdc)
+    assert props.params() == {"const.product.model": "ALN-AL00", "const.ohos.apiversion": "12"}
+    assert props.get("model") == "ALN-AL00"
+    assert props.get("const.ohos.apiversion") == "12"
+    assert props.get("brand") is None
+    assert hdc.calls == [None]
+
+
+def test_disk_cache_is_shared_between_instances(cache_root):
+    DeviceProperties(_StubHdc()).params()
+    with open(_cache_file(cache_root), encoding="utf-8") as f:
+        assert json.load(f)["params"]["const.product.model"] == "ALN-AL00"
+
+    hdc = _StubHdc()
+    assert DeviceProperties(hdc).get("model") == "ALN-AL00"
+    assert hdc.calls == []
+
+    assert DeviceProperties(hdc).params(refresh=True)["const.product.model"] == "ALN-AL00"
+    assert hdc.calls == [None]
+
+
+def test_disk_cache_expires_after_ttl(cache_root):
+    DeviceProperties(_StubHdc()).params()
+    path = _cache_file(cache_root)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    data["time"] = time.time() - DeviceProperties.TTL - 1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+    hdc = _StubHdc()
+    DeviceProperties(hdc, ttl=2 * DeviceProperties.TTL).params()
+    assert hdc.calls == []
+    DeviceProperties(hdc).params()
+    assert hdc.calls == [None]
+
+
+def test_known_keys_fallback():
+    hdc = _StubHdc(dump_all=False)
+    props = DeviceProperties(hdc)
+    assert props.params() == {"const.product.model": "ALN-AL00", "const.ohos.apiversion": "12"}
+    assert hdc.calls == [None, list(IMMUTABLE_PARAMS.values())]
+
+
+def test_empty_result_is_not_cached(cache_root):
+    hdc = _StubHdc(dump_all=False)
+    hdc.values = {}
+    assert DeviceProperties(hdc).params() == {}
+    assert not os.path.exists(_cache_file(cache_root))
+
+
+def test_invalidate_removes_the_disk_cache(cache_root):
+    hdc = _StubHdc()
+    props = DeviceProperties(hdc)
+    props.params()
+    props.invalidate()
+    assert not os.path.exists(_cache_file(cache_root))
+    hdc.values["const.product.model"] = "ALN-AL10"
+    assert props.get("model") == "ALN-AL10"
+    assert hdc.calls == [None, None]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+from hmAutomator._client import _UITestService
+from hmAutomator._pushcache import PushCache
+from hmAutomator.utils import file_md5
+
+
+class _FakeHdc:
+    serial = "fake"
+
+    def __init__(self):
+        self.files = {}
+        self.md5_calls = 0
+
+    def md5sums(self, rpaths):
+        self.md5_calls += 1
+        return {p: self.files[p] for p in rpaths if p in self.files}
+
+    def md5sum(self, rpath):
+        return self.md5sums([rpath]).get(rpath)
+
+    def send_file(self, lpath, rpath):
+        self.files[rpath] = file_md5(lpath)
+
+
+def test_push_skips_unchanged_files(tmp_path):
+    a, b = tmp_path / "a.bin", tmp_path / "b.bin"
+    a.write_bytes(b"a" * 100)
+    b.write_bytes(b"b" * 100)
+    cache, hdc = PushCache(), _FakeHdc()
+    files = {str(a): "/data/a.bin", str(b): "/data/b.bin"}
+
+    assert len(cache.push(hdc, files)) == 2
+    assert cache.push(hdc, files) == []
+    assert hdc.md5_calls == 2  # one remote check per batch
+
+    b.write_bytes(b"changed")
+    assert cache.push(hdc, files) == [(str(b), "/data/b.bin")]
+    assert cache.push(hdc, files, verify=False) == []
+    assert hdc.md5_calls == 3
+
+
+def test_push_expands_the_home_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    (tmp_path / "arch.png").write_bytes(b"png")
+    cache, hdc = PushCache(), _FakeHdc()
+    assert cache.push(hdc, [("~/arch.png", "/data/local/tmp/arch.png")]) == \
+        [(str(tmp_path / "arch.png"), "/data/local/tmp/arch.png")]
+    assert hdc.files["/data/local/tmp/arch.png"] == file_md5(str(tmp_path / "arch.png"))
+    assert cache.local_digest("~/arch.png") == hdc.files["/data/local/tmp/arch.png"]
+    assert cache.push(hdc, {"~/arch.png": "/data/local/tmp/arch.png"}) == []
+
+
+class _AgentHdc(_FakeHdc):
+    serial = "agent-device"
+
+    def __init__(self):
+        super().__init__()
+        self.commands = []
+
+    def shell(self, cmd, error_raise=True):
+        self.commands.append(cmd)
+        if cmd.startswith("rm -f "):
+            self.files.pop(cmd.split()[-1], None)
+
+    def send_file(self, lpath, rpath):
+        assert rpath not in self.files, "the outdated agent must be removed before the push"
+        self.commands.append(f"send {rpath}")
+        super().send_file(lpath, rpath)
+
+
+def test_outdated_device_agent_is_replaced(tmp_path):
+    agent = tmp_path / "agent.so"
+    agent.write_bytes(b"new agent")
+    rpath = "/data/local/tmp/agent.so"
+    hdc = _AgentHdc()
+    hdc.files[rpath] = "0" * 32  # an older agent
+    service = _UITestService(hdc)
+
+    service._setup_device_agent(str(agent), rpath)
+    assert hdc.commands == [f"rm -f {rpath}", f"send {rpath}", f"chmod +x {rpath}"]
+    assert hdc.files[rpath] == file_md5(str(agent))
+
+    hdc.commands.clear()
+    service._setup_device_agent(str(agent), rpath)
+    assert hdc.commands == [f"chmod +x {rpath}"]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import json
+import sys
+
+import pytest
+
+from hmAutomator import testing
+from hmAutomator.driver import Driver
+from hmAutomator.testing import Session
+
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="the fake hdc launcher is a POSIX shell script")
+
+HIERARCHY = {"attributes": {"bounds": "[0,0][1260,2720]", "type": "root", "text": ""},
+             "children": [{"attributes": {"bounds": "[100,200][300,400]", "type": "Button", "text": "OK"},
+                           "children": []}]}
+
+
+@pytest.fixture
+def session_path(tmp_path):
+    path = tmp_path / "recorded.jsonl"
+    entries = [
+        {"kind": "rpc", "method": "callHypiumApi", "api": "Driver.findComponents", "this": "Driver#0",
+         "args": ["On#0"], "reply": {"result": ["Component#3"]}},
+        {"kind": "hierarchy", "data": HIERARCHY},
+    ]
+    path.write_text("".join(json.dumps(e) + "\n" for e in entries), encoding="utf-8")
+    return str(path)
+
+
+def test_replay_whole_stack(session_path, tmp_path):
+    recorded = str(tmp_path / "replayed.jsonl")
+    with testing.FakeDevice(session_path) as device, testing.record(recorded):
+        d = Driver(device.serial)
+        try:
+            assert d.display_size == (1260, 2720)
+            assert d(text="OK").exists()
+            assert d.dump_hierarchy() == HIERARCHY
+            assert d.screenshot_bytes()[:2] == b"\xff\xd8"
+            assert d.hdc.get_params(["const.product.model"]) == {"const.product.model": "FAKE-AL00"}
+        finally:
+            d._client.release()
+            Driver._instance.clear()
+    apis = [r["params"]["api"] for r in device.server.requests]
+    assert apis[0] == "Driver.create" and "Driver.findComponents" in apis
+
+    # the replayed run was recorded again and replays the same way
+    session = Session.load(recorded)
+    assert session.reply("Driver.findComponents", "Driver#0", ["On#0"]) == {"result": ["Component#3"]}
+    assert session.hierarchy() == HIERARCHY
+    assert session.hdc("shell param get const.product.model")["output"].strip() == "FAKE-AL00"
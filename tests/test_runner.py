@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import asyncio
+import time
+import threading
+
+import pytest
+
+from hmAutomator import _runner
+from hmAutomator.hdc import HdcWrapper, _execute_command
+
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="uses POSIX commands")
+
+
+def test_argv_is_not_split_by_a_shell(tmp_path):
+    path = tmp_path / "dir with spaces" / "a b.txt"
+    path.parent.mkdir()
+    path.write_text("hello $HOME")
+    result = _execute_command(["cat", str(path)])
+    assert result.exit_code == 0 and result.output == "hello $HOME"
+
+
+def test_deadline_kills_the_process_group():
+    start = time.perf_counter()
+    # the grandchild sleep holds stdout open, only a process group kill ends the read
+    output, error, exit_code = _runner.run([sys.executable, "-c",
+                                            "import subprocess; print('up', flush=True); "
+                                            "subprocess.call(['sleep', '30'])"], timeout=0.5)
+    assert exit_code == -1 and "timed out" in error
+    assert output == "up\n"
+    assert time.perf_counter() - start < 5
+
+
+def test_output_is_streamed():
+    chunks = []
+    code = "import time\nfor i in range(3):\n    print(i, flush=True)\n    time.sleep(0.1)"
+    output, _, exit_code = _runner.run([sys.executable, "-c", code], timeout=10, on_output=chunks.append)
+    assert exit_code == 0 and output == "0\n1\n2\n"
+    assert len(chunks) > 1 and b"".join(chunks) == output.encode()
+
+
+def test_concurrency_limit_per_server():
+    running, peak, lock = [0], [0], threading.Lock()
+    original = _runner._popen
+
+    def popen(argv):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return original(argv)
+
+    _runner.set_concurrency(2)
+    _runner._popen = popen
+    try:
+        workers = [threading.Thread(target=_runner.run, args=(["true", "-s", "127.0.0.1:8710"],))
+                   for _ in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        _runner._popen = original
+        _runner.set_concurrency(None)
+    assert peak[0] == 2
+
+
+def test_slot_wait_counts_towards_the_deadline():
+    _runner.set_concurrency(1)
+    slot = _runner.slot_of(["sleep"])
+    slot.acquire()
+    threading.Timer(0.5, slot.release).start()
+    try:
+        start = time.perf_counter()
+        _, error, exit_code = _runner.run(["sleep", "5"], timeout=0.8)
+        elapsed = time.perf_counter() - start
+    finally:
+        _runner.set_concurrency(None)
+    assert exit_code == -1 and "timed out" in error
+    assert elapsed < 1.2
+
+
+def test_async_commands_share_the_slots():
+    from hmAutomator._async_client import _execute_command as execute_async
+
+    _runner.set_concurrency(1)
+    slot = _runner.slot_of(["true"])
+    slot.acquire()
+    try:
+        result = asyncio.run(execute_async(["true"], timeout=0.2))
+        assert result.exit_code == -1 and "no free hdc slot" in result.error
+        slot.release()
+        assert asyncio.run(execute_async(["echo", "a b"], timeout=5)).output == "a b\n"
+    finally:
+        _runner.set_concurrency(None)
+
+
+def test_async_deadline_kills_the_process_group():
+    from hmAutomator._async_client import _execute_command as execute_async
+
+    start = time.perf_counter()
+    result = asyncio.run(execute_async(["sh", "-c", "sleep 30 & wait"], timeout=0.3))
+    assert result.exit_code == -1 and "timed out" in result.error
+    assert time.perf_counter() - start < 5
+
+
+def test_async_output_with_invalid_utf8_is_replaced():
+    from hmAutomator._async_client import _execute_command as execute_async
+
+    result = asyncio.run(execute_async([sys.executable, "-c", "import sys; sys.stdout.buffer.write(b'caf\\xe9')"]))
+    assert result.exit_code == 0 and result.output == "caf\ufffd"
+    result = asyncio.run(execute_async(["/nonexistent/hdc", "list", "targets"]))
+    assert result.exit_code == -1 and result.error
+
+
+def test_local_paths_are_expanded_before_hdc_runs(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    argvs = []
+    monkeypatch.setattr(_runner, "run", lambda argv, timeout=None, on_output=None: argvs.append(argv) or ("", "", 0))
+    hdc = HdcWrapper.__new__(HdcWrapper)  # skip the online check
+    hdc.serial, hdc.hdc_prefix = "FAKE", "hdc"
+
+    hdc.send_file("~/x.hap", "/data/local/tmp/x.hap")
+    hdc.recv_file("/data/local/tmp/log.txt", "~/log.txt")
+    hdc.install("~/x.hap")
+    home = str(tmp_path)
+    assert argvs == [
+        ["hdc", "-t", "FAKE", "file", "send", f"{home}/x.hap", "/data/local/tmp/x.hap"],
+        ["hdc", "-t", "FAKE", "file", "recv", "/data/local/tmp/log.txt", f"{home}/log.txt"],
+        ["hdc", "-t", "FAKE", "install", f"{home}/x.hap"],
+    ]
+
+    argvs.clear()
+    # nothing is received by the fake runner, so the per-file fallback runs and receives into the expanded dir
+    assert hdc.pull_dir("/data/log", "~/logs", rel_paths=["a.log"]) == ["a.log"]
+    assert argvs[-1] == ["hdc", "-t", "FAKE", "file", "recv", "/data/log/a.log", f"{home}/logs/a.log"]
+    hdc.sync_dir("/data/log", "~/synced")
+    assert os.path.isfile(os.path.join(home, "synced", ".hmat_sync.json"))
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+import pytest
+
+from hmAutomator import testing
+from hmAutomator.driver import Driver
+from hmAutomator.proto import CommandResult
+
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="the fake hdc launcher is a POSIX shell script")
+
+STREAM_FRAME = b"\xff\xd8stream\xff\xd9"
+
+
+class _StubRecordClient:
+    def __init__(self):
+        self.max_ages = []
+
+    def latest_frame(self, max_age):
+        self.max_ages.append(max_age)
+        return STREAM_FRAME
+
+
+@pytest.fixture(scope="module")
+def driver():
+    with testing.FakeDevice() as device:
+        d = Driver(device.serial)
+        try:
+            yield d
+        finally:
+            d._client.release()
+            Driver._instance.clear()
+
+
+def test_base64_shot_takes_one_hdc_call(driver, monkeypatch):
+    commands = []
+    shell = driver.hdc.shell
+    monkeypatch.setattr(driver.hdc, "shell", lambda cmd, **kwargs: commands.append(cmd) or shell(cmd, **kwargs))
+    data = driver.screenshot_bytes()
+    assert data[:2] == b"\xff\xd8" and data[-2:] == b"\xff\xd9"
+    assert len(commands) == 1 and "base64" in commands[0]
+
+
+def test_file_recv_fallback(driver, monkeypatch):
+    shell = driver.hdc.shell
+
+    def broken_base64(cmd, **kwargs):
+        if "base64" in cmd:
+            return CommandResult("base64: applet not found", "", 0)
+        return shell(cmd, **kwargs)
+
+    monkeypatch.setattr(driver.hdc, "shell", broken_base64)
+    assert driver.screenshot_bytes()[:2] == b"\xff\xd8"
+
+
+def test_stream_frame_reuse(driver, tmp_path, monkeypatch):
+    record_client = _StubRecordClient()
+    monkeypatch.setitem(driver.__dict__, "screenrecord", record_client)
+    assert driver.screenshot_bytes() == STREAM_FRAME
+    assert driver.screenshot_bytes(max_age=0) != STREAM_FRAME
+
+    # an explicit screenshot shows the screen now, not a frame from before the last action
+    path = driver.screenshot(str(tmp_path / "now.jpeg"))
+    with open(path, "rb") as f:
+        assert f.read() != STREAM_FRAME
+    path = driver.screenshot(str(tmp_path / "recent.jpeg"), max_age=1)
+    with open(path, "rb") as f:
+        assert f.read() == STREAM_FRAME
+    assert record_client.max_ages == [1.0, 1]
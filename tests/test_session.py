@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from hmAutomator import _session
+from hmAutomator._session import HmSession
+from hmAutomator.proto import HypiumResponse
+from hmAutomator.exception import RpcConnectionError
+
+
+class _StubClient:
+    """Fails the first `failures` calls with a lost connection, then answers with the api name."""
+
+    def __init__(self, serial):
+        self.hdc = None
+        self.failures = 0
+        self.calls = []
+        self.restarts = 0
+
+    def invoke(self, api, this="Driver#0", args=[]):
+        self.calls.append((api, this, args))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionResetError("uitest daemon died")
+        return HypiumResponse(api)
+
+    def _drop_connection(self):
+        pass
+
+    def start(self):
+        self.restarts += 1
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(_session, "HmClient", _StubClient)
+    monkeypatch.setattr(HmSession, "BACKOFF_BASE", 0)
+    return HmSession("fake")
+
+
+def test_read_only_call_is_replayed_after_recovery(session):
+    session._client.failures = 1
+    assert session.invoke("Driver.getDisplaySize").result == "Driver.getDisplaySize"
+    assert session.generation == 1 and session._client.restarts == 1
+    assert len(session._client.calls) == 2
+
+
+def test_stale_handles_are_not_replayed(session):
+    for api, this, args in [("Driver.findComponents", "Driver#0", ["On#3"]),
+                            ("Driver.waitForComponent", "Driver#0", ["On#3", 1000]),
+                            ("Component.getText", "Component#2", []),
+                            ("Driver.createOn", "Driver#0", []),
+                            ("Driver.click", "Driver#0", [100, 200])]:
+        session._client.failures = 1
+        with pytest.raises(RpcConnectionError):
+            session.invoke(api, this, args)
+    assert session.generation == 5
+
+
+def test_seed_handle_is_stable(session):
+    session._client.failures = 1
+    assert session.invoke("Driver.findComponent", "Driver#0", ["On#seed"]).result == "Driver.findComponent"
+
+
+def test_recovery_gives_up_after_max_retries(session, monkeypatch):
+    def start():
+        raise ConnectionRefusedError()
+
+    session._client.failures = 1
+    monkeypatch.setattr(session._client, "start", start)
+    with pytest.raises(RpcConnectionError, match="Unable to reconnect"):
+        session.invoke("Driver.getDisplaySize")
+    assert session.generation == 0
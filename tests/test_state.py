@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from hmAutomator._state import DeviceState
+from hmAutomator.proto import DisplayRotation
+
+
+class _Loaders:
+    """Stub device queries counting their calls."""
+
+    def __init__(self, size=(1260, 2720), rotation=DisplayRotation.ROTATION_0):
+        self.size, self.rotation = size, rotation
+        self.calls = []
+
+    def load_size(self):
+        self.calls.append("size")
+        return self.size
+
+    def load_rotation(self):
+        self.calls.append("rotation")
+        return self.rotation
+
+
+def _state(loaders: _Loaders) -> DeviceState:
+    return DeviceState(loaders.load_size, loaders.load_rotation)
+
+
+def test_values_are_loaded_lazily_once():
+    loaders = _Loaders()
+    state = _state(loaders)
+    assert loaders.calls == []
+    assert state.display_size == (1260, 2720)
+    assert state.display_size == (1260, 2720)
+    assert state.display_rotation == DisplayRotation.ROTATION_0
+    assert loaders.calls == ["size", "rotation"]
+
+
+def test_update_rotation_swaps_the_size_when_the_parity_flips():
+    loaders = _Loaders()
+    state = _state(loaders)
+    state.display_size, state.display_rotation
+
+    state.update(rotation=DisplayRotation.ROTATION_90)
+    assert state.display_size == (2720, 1260)
+    state.update(rotation=DisplayRotation.ROTATION_270)  # same parity, no swap
+    assert state.display_size == (2720, 1260)
+    state.update(rotation=DisplayRotation.ROTATION_0)
+    assert state.display_size == (1260, 2720)
+    state.update(size=(1000, 2000), rotation=DisplayRotation.ROTATION_90)  # an explicit size wins
+    assert state.display_size == (1000, 2000)
+    assert loaders.calls == ["size", "rotation"]
+
+
+def test_update_rotation_with_unknown_previous_rotation_reloads_the_size():
+    loaders = _Loaders(size=(2720, 1260))
+    state = _state(loaders)
+    state.display_size  # rotation never loaded, the orientation of this size is unknown
+    state.update(rotation=DisplayRotation.ROTATION_90)
+    assert state.display_rotation == DisplayRotation.ROTATION_90
+    assert state.display_size == (2720, 1260)
+    assert loaders.calls == ["size", "size"]
+
+
+def test_invalidate_reloads():
+    loaders = _Loaders()
+    state = _state(loaders)
+    state.display_size, state.display_rotation
+    loaders.size, loaders.rotation = (2720, 1260), DisplayRotation.ROTATION_90
+    state.invalidate()
+    assert state.display_size == (2720, 1260)
+    assert state.display_rotation == DisplayRotation.ROTATION_90
+    assert loaders.calls == ["size", "rotation", "size", "rotation"]
+
+
+def test_listeners_are_called_after_every_change():
+    state = _state(_Loaders())
+    seen = []
+
+    def listener(s):
+        seen.append(s.display_size)
+
+    state.add_listener(listener)
+    state.update(size=(100, 200))
+    state.invalidate()
+    state.remove_listener(listener)
+    state.update(size=(300, 400))
+    assert seen == [(100, 200), (1260, 2720)]
+
+
+def test_a_load_running_across_invalidate_is_not_cached():
+    loaders = _Loaders(size=(1260, 2720))
+    state = _state(loaders)
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_size():
+        size = loaders.size
+        loading.set()
+        release.wait(5)
+        return size
+
+    state._size_loader = slow_size
+    reader = threading.Thread(target=lambda: state.display_size)
+    reader.start()
+    loading.wait(5)
+    loaders.size = (2720, 1260)  # the device rotated while the stale query was in flight
+    state.invalidate()
+    release.set()
+    reader.join(5)
+
+    state._size_loader = loaders.load_size
+    assert state.display_size == (2720, 1260)
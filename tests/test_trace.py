@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+
+from hmAutomator import trace
+
+
+def test_spans_from_several_threads_are_exported(tmp_path):
+    trace.start()
+    try:
+        def worker(n):
+            with trace.span("Driver.click", "rpc", serial=f"dev{n}"):
+                trace.instant("frame", "frame", size=n)
+
+        threads = [threading.Thread(target=worker, args=(n,), name=f"worker-{n}") for n in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        trace.stop()
+
+    path = trace.save(str(tmp_path / "session.trace.json"))
+    with open(path, encoding="utf-8") as f:
+        events = json.load(f)["traceEvents"]
+    spans = [e for e in events if e["ph"] == "X"]
+    assert sorted(e["args"]["serial"] for e in spans) == ["dev0", "dev1", "dev2"]
+    assert len({e["tid"] for e in spans}) == 3
+    assert all(e["dur"] >= 0 for e in spans)
+    assert len([e for e in events if e["ph"] == "i"]) == 3
+    assert {e["args"]["name"] for e in events if e["ph"] == "M"} >= {"worker-0", "worker-1", "worker-2"}
+
+
+def test_span_is_noop_when_stopped():
+    trace.stop()
+    trace.reset()
+    with trace.span("x", "rpc"):
+        pass
+    assert trace.events() == []
+
+
+def test_buffers_are_bounded_and_pruned_after_save(tmp_path, monkeypatch):
+    monkeypatch.setattr(trace, "max_events", 1000)
+    trace.start(max_events_per_thread=10)
+    try:
+        def worker():
+            for i in range(50):
+                trace.instant("frame", "frame", n=i)
+
+        thread = threading.Thread(target=worker, name="capture")
+        thread.start()
+        thread.join()
+        frames = [e for e in trace.events() if e["ph"] == "i"]
+        assert [e["args"]["n"] for e in frames] == list(range(40, 50))
+
+        trace.save(str(tmp_path / "a.json"))
+        assert trace.events() == []  # the finished thread's buffer is gone
+        trace.instant("main", "frame")
+        trace.save(str(tmp_path / "b.json"))
+        assert len([e for e in trace.events() if e["ph"] == "i"]) == 1  # live threads keep theirs
+    finally:
+        trace.stop()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from hmAutomator import _uiobject
+from hmAutomator._uiobject import UiObject
+from hmAutomator.proto import HypiumResponse
+
+
+class _Clock:
+    """Fake time module: sleeping and device-side waits only advance the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class _StubClient:
+    """Answers On.* with a selector, waitForComponent/findComponents from scripted results."""
+    generation = 0
+
+    def __init__(self, clock, found_after=None, counts=()):
+        self.clock = clock
+        self.found_after = found_after  # device-side wait seconds until the element appears
+        self.counts = list(counts)      # number of matches returned by successive findComponents
+        self.waited = 0.0
+        self.calls = []
+
+    def invoke(self, api, this="Driver#0", args=[]):
+        self.calls.append((api, args))
+        if api.startswith("On."):
+            return HypiumResponse("On#1")
+        if api == "Driver.waitForComponent":
+            wait = args[1] / 1000
+            if self.found_after is not None and self.waited + wait >= self.found_after:
+                self.clock.now += self.found_after - self.waited
+                return HypiumResponse("Component#7")
+            self.waited += wait
+            self.clock.now += wait
+            return HypiumResponse(None)
+        if api == "Driver.findComponents":
+            count = self.counts.pop(0) if len(self.counts) > 1 else self.counts[0]
+            return HypiumResponse([f"Component#{i}" for i in range(count)] or None)
+        raise AssertionError(api)
+
+    def timeouts(self, api):
+        return [args[1] for name, args in self.calls if name == api]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(_uiobject, "time", clock)
+    return clock
+
+
+def test_wait_is_split_into_device_chunks(clock):
+    client = _StubClient(clock)
+    assert not UiObject(client, text="OK").wait(timeout=25)
+    assert client.timeouts("Driver.waitForComponent") == [10000, 10000, 5000]
+    assert clock.now == 1025.0 and clock.sleeps == []
+
+
+def test_wait_returns_as_soon_as_the_element_appears(clock):
+    client = _StubClient(clock, found_after=12)
+    obj = UiObject(client, text="OK")
+    assert obj.wait(timeout=25)
+    assert client.timeouts("Driver.waitForComponent") == [10000, 10000]
+    assert clock.now == 1012.0
+    assert obj._component.value == "Component#7"
+    # the selector was built once and reused for every chunk
+    assert [api for api, _ in client.calls].count("On.text") == 1
+
+
+def test_wait_with_index_polls_find_components(clock):
+    client = _StubClient(clock, counts=[0, 1, 1, 2])
+    obj = UiObject(client, text="OK", index=1)
+    assert obj.wait(timeout=5)
+    assert "Driver.waitForComponent" not in [api for api, _ in client.calls]
+    assert [api for api, _ in client.calls].count("Driver.findComponents") == 4
+    assert clock.sleeps == pytest.approx([0.05, 0.075, 0.1125])
+    assert obj._component.value == "Component#1"
+
+
+def test_wait_with_index_times_out(clock):
+    client = _StubClient(clock, counts=[1])
+    assert not UiObject(client, text="OK", index=1).wait(timeout=2)
+    assert 1002.0 - 0.5 <= clock.now <= 1002.0
+    assert all(s <= 0.5 for s in clock.sleeps)
+
+
+def test_wait_gone(clock):
+    client = _StubClient(clock, counts=[2, 1, 0])
+    obj = UiObject(client, text="OK")
+    assert obj.wait_gone(timeout=5)
+    assert len(clock.sleeps) == 2
+
+    client = _StubClient(clock, counts=[2, 2, 1])
+    assert UiObject(client, text="OK", index=1).wait_gone(timeout=5)
+
+    client = _StubClient(clock, counts=[1])
+    assert not UiObject(client, text="OK").wait_gone(timeout=1)
+
+
+def test_find_component_does_not_sleep_after_the_last_attempt(clock):
+    client = _StubClient(clock, counts=[0])
+    assert UiObject(client, text="OK").find_component(retries=3, wait_time=1) is None
+    assert clock.sleeps == [1, 1]
+    assert [api for api, _ in client.calls].count("Driver.findComponents") == 3
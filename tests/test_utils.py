@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import socket
+
+from hmAutomator.utils import PortAllocator, split_json_frames, split_jpeg_frames
+
+
+def test_port_allocator_returns_bindable_ports():
+    allocator = PortAllocator()
+    ports = {allocator.allocate() for _ in range(20)}
+    assert len(ports) == 20
+    for port in ports:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind(("127.0.0.1", port))
+
+
+def test_port_allocator_leases():
+    allocator = PortAllocator()
+    port = allocator.allocate()
+    allocator.acquire(port)
+    assert allocator.leases() == {port: 2}
+    assert not allocator.release(port)
+    assert allocator.release(port)  # last lease of an owned port
+    assert allocator.leases() == {}
+
+
+def test_port_allocator_adopted_port_is_not_removed():
+    allocator = PortAllocator()
+    allocator.acquire(10001)  # forward created by someone else
+    assert not allocator.release(10001)
+
+
+def test_split_json_frames():
+    frames, rest = split_json_frames('{"result":"On#1"}{"result":null}\n{"result":["Compo')
+    assert frames == [{"result": "On#1"}, {"result": None}]
+    assert rest == '{"result":["Compo'
+    assert split_json_frames("") == ([], "")
+
+
+def test_split_jpeg_frames():
+    a, b = b"\xff\xd8aa\xff\xd9", b"\xff\xd8bb\xff\xd9"
+    frames, rest = split_jpeg_frames(bytearray(b"junk" + a + b + b"\xff\xd8cc"))
+    assert frames == [a, b]
+    assert rest == b"\xff\xd8cc"
+    # the tail of a previous frame before the next SOI is dropped, not taken as an end marker
+    frames, rest = split_jpeg_frames(rest + b"c\xff\xd9" + b"x\xff\xd9\xff")
+    assert frames == [b"\xff\xd8ccc\xff\xd9"]
+    assert rest == b"\xff"